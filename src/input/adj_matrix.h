@@ -3,7 +3,9 @@
 
 #define FLOAT_NEG_1 0xbf800000
 #define FLOAT_MAX   0x7f7fffff
+#ifndef UINT32_MAX
 #define UINT32_MAX  0xffffffff
+#endif
 
 #ifndef _NO_FLOATS_
 #define EDGE_MAX UINT32_MAX
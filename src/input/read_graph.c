@@ -25,6 +25,18 @@
 #  undef  GRAPH_TYPE
 #  define GRAPH_TYPE ADJACENCY_MATRIX
 #  include "read_graph_mmap.h"
+#elif INPUT_TYPE == BINARY
+#  define GRAPH_TYPE EDGE_LIST
+#  include "read_graph_binary.h"
+#  undef  GRAPH_TYPE
+#  define GRAPH_TYPE HEAPIFIED_EDGE_LIST
+#  include "read_graph_binary.h"
+#  undef  GRAPH_TYPE
+#  define GRAPH_TYPE ADJACENCY_LIST
+#  include "read_graph_binary.h"
+#  undef  GRAPH_TYPE
+#  define GRAPH_TYPE ADJACENCY_MATRIX
+#  include "read_graph_binary.h"
 #else
 #  error bad argument to INPUT_TYPE
 #endif
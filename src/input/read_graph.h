@@ -6,10 +6,12 @@
 
 #include <input/adj_list.h> /* edge_list */
 #include <mst.h> /* edge, foi */
+#include <stdint.h> /* uint32_t, uint64_t */
 
 /* INPUT_TYPE: ways to read in a graph */
-#define SCANF 1
-#define MMAP  2
+#define SCANF  1
+#define MMAP   2
+#define BINARY 3
 
 /* use the default value for INPUT_TYPE if one is not specified */
 #ifndef INPUT_TYPE
@@ -33,10 +35,48 @@
 #  define read_graph_to_heapified_edge_list read_graph_to_heapified_edge_list_mmap
 #  define read_graph_to_adjacency_list read_graph_to_adjacency_list_mmap
 #  define read_graph_to_adjacency_matrix read_graph_to_adjacency_matrix_mmap
+#elif INPUT_TYPE == BINARY
+#  define read_graph_to_edge_list read_graph_to_edge_list_binary
+#  define read_graph_to_heapified_edge_list read_graph_to_heapified_edge_list_binary
+#  define read_graph_to_adjacency_list read_graph_to_adjacency_list_binary
+#  define read_graph_to_adjacency_matrix read_graph_to_adjacency_matrix_binary
 #else
 #  error bad argument to INPUT_TYPE
 #endif
 
+/* binary graph format (see tools/binary_graph.py): a header followed by
+   num_edges records (binary_edge_fixed32 or binary_edge_float64) */
+#define BINARY_GRAPH_MAGIC "MSTGRAPH"
+#define BINARY_GRAPH_VERSION 1
+#define BINARY_WEIGHT_FLOAT64 0
+#define BINARY_WEIGHT_FIXED32 1
+
+typedef struct {
+    char magic[8];
+    uint32_t version;
+    uint32_t weight_type; /* BINARY_WEIGHT_* */
+    uint64_t num_verts;
+    uint64_t num_edges;
+    uint32_t prec;        /* fixed-point weights are the weight times 10^prec */
+    uint32_t dims;
+    double min;
+    double max;
+    uint64_t seed;
+    char about[448];      /* the footer line of the text format */
+} binary_graph_header;
+
+typedef struct {
+    uint32_t u;
+    uint32_t v;
+    uint32_t weight;
+} binary_edge_fixed32;
+
+typedef struct {
+    uint32_t u;
+    uint32_t v;
+    double weight;
+} binary_edge_float64;
+
 /**
  * Reads in a graph from filename into a data structure which is simply a list
  * of edges.  Returns via passed arguments the number of vertices (n), number
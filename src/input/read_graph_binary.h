@@ -0,0 +1,149 @@
+#include <fcntl.h> /* O_RDONLY */
+#include <stdio.h>  /* perror, fprintf */
+#include <sys/mman.h> /* mmap */
+#include <sys/stat.h> /* fstat */
+#include <unistd.h> /* close */
+#include <string.h> /* memcmp */
+#include <input/adj_list.h> /* edge_list, AL_EDGE_LIST_* */
+#include <input/adj_matrix.h> /* AM_INDEX */
+#include <input/initialize_graph.h> /* initialize_* */
+#include <input/pq_edge.h> /* pq_* */
+#include <input/read_graph.h>
+#include <mst.h> /* edge, foi */
+
+#ifndef READ_GRAPH_BINARY_HELPERS
+#define READ_GRAPH_BINARY_HELPERS
+/* converts a fixed-point weight with prec decimal places to a foi (whose
+   integer form is in tenths, like the text readers) */
+static inline foi binary_fixed_to_foi(uint32_t w, uint32_t prec, double scale) {
+#ifdef _NO_FLOATS_
+    return (foi)(prec == 0 ? w * 10 : w / (uint32_t)(scale / 10));
+#else
+    return (foi)(w / scale);
+#endif
+}
+
+static inline foi binary_float_to_foi(double w) {
+#ifdef _NO_FLOATS_
+    return (foi)(w * 10);
+#else
+    return (foi)w;
+#endif
+}
+#endif /* READ_GRAPH_BINARY_HELPERS */
+
+// read input file, store results in n, m, and G
+#if   GRAPH_TYPE == EDGE_LIST
+int read_graph_to_edge_list_binary(char *filename, int *n, int *m, edge **G)
+#elif GRAPH_TYPE == HEAPIFIED_EDGE_LIST
+int read_graph_to_heapified_edge_list_binary(char *filename, int *n, int *m, edge **G)
+#elif GRAPH_TYPE == ADJACENCY_LIST
+int read_graph_to_adjacency_list_binary(char *filename, int *n, int *m, edge_list **el)
+#elif GRAPH_TYPE == ADJACENCY_MATRIX
+int read_graph_to_adjacency_matrix_binary(char *filename, int *n, int *m, foi **weights)
+#else
+#  error unknown GRAPH_TYPE
+#endif
+{
+    struct stat sb;
+
+    int fd = open(filename, O_RDONLY);
+    if (fstat (fd, &sb) == -1) {
+        perror ("fstat");
+        return 0;
+    }
+    if (sb.st_size < sizeof(binary_graph_header)) {
+        fprintf(stderr, "%s is too short to be a binary graph\n", filename);
+        return 0;
+    }
+
+    char *start = (char *)mmap(0, sb.st_size, PROT_READ, MAP_SHARED, fd,
+                               0);
+    if (start == MAP_FAILED) {
+        perror ("mmap");
+        return 0;
+    }
+    posix_fadvise (fd, 0, sb.st_size,
+                   POSIX_FADV_SEQUENTIAL);
+
+    binary_graph_header *hdr = (binary_graph_header *)start;
+    if (memcmp(hdr->magic, BINARY_GRAPH_MAGIC, 8) != 0 ||
+        hdr->version != BINARY_GRAPH_VERSION) {
+        fprintf(stderr, "%s is not a binary graph (or has an unsupported version)\n", filename);
+        return 0;
+    }
+    *n = (int)hdr->num_verts;
+    *m = (int)hdr->num_edges;
+
+    int fixed = (hdr->weight_type == BINARY_WEIGHT_FIXED32);
+    size_t rec_size = fixed ? sizeof(binary_edge_fixed32) : sizeof(binary_edge_float64);
+    if (sb.st_size < sizeof(binary_graph_header) + (*m)*rec_size) {
+        fprintf(stderr, "%s is truncated\n", filename);
+        return 0;
+    }
+    binary_edge_fixed32 *fixed_recs = (binary_edge_fixed32 *)(start + sizeof(binary_graph_header));
+    binary_edge_float64 *float_recs = (binary_edge_float64 *)(start + sizeof(binary_graph_header));
+    uint32_t prec = hdr->prec;
+    double scale = 1.0;
+    uint32_t p;
+    for (p = 0; p < prec; p++)
+        scale *= 10;
+
+#if   GRAPH_TYPE == EDGE_LIST
+    initialize_edge_list(G, *m);
+#elif GRAPH_TYPE == HEAPIFIED_EDGE_LIST
+    pq_init(*m);
+    *G = pq;
+#elif GRAPH_TYPE == ADJACENCY_LIST
+    initialize_adjacency_list(el, *n, *m);
+#elif GRAPH_TYPE == ADJACENCY_MATRIX
+    initialize_adjacency_matrix(weights, *n);
+#endif
+    int u, v;
+    foi w;
+
+#if   GRAPH_TYPE == EDGE_LIST
+    edge *nextEdge = &((*G)[0]);
+#elif GRAPH_TYPE == HEAPIFIED_EDGE_LIST
+    edge *nextEdge = &((*G)[1]);
+#endif
+
+    int i;
+    for (i = 0; i < *m; i++)
+    {
+        /* the records are fixed-size, so there is nothing to parse */
+        if (fixed) {
+            u = fixed_recs[i].u;
+            v = fixed_recs[i].v;
+            w = binary_fixed_to_foi(fixed_recs[i].weight, prec, scale);
+        }
+        else {
+            u = float_recs[i].u;
+            v = float_recs[i].v;
+            w = binary_float_to_foi(float_recs[i].weight);
+        }
+
+#if   GRAPH_TYPE == EDGE_LIST || GRAPH_TYPE == HEAPIFIED_EDGE_LIST
+        nextEdge->u = u;
+        nextEdge->v = v;
+        nextEdge->weight = w;
+        nextEdge++;
+#endif
+
+#if GRAPH_TYPE == HEAPIFIED_EDGE_LIST
+        pq_heapify_insertion(); /* maintain the heap property */
+#elif GRAPH_TYPE == ADJACENCY_LIST
+        AL_EDGE_LIST_ADD(&(*el)[u], v, w);
+        AL_EDGE_LIST_ADD(&(*el)[v], u, w);
+#elif GRAPH_TYPE == ADJACENCY_MATRIX
+        (*weights)[AM_INDEX(*n, u, v)] = w;
+#       ifndef _HALF_ADJ_MATRIX_
+        (*weights)[AM_INDEX(*n, v, u)] = w;
+#       endif
+#endif
+    }
+
+    munmap(start, sb.st_size);
+    close(fd);
+    return 1;
+}
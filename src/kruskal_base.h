@@ -1,5 +1,6 @@
 #include <input/read_graph.h> /* read_graph */
 #include <mst.h> /* edge, foi */
+#include <phase_times.h> /* phase_end */
 #include <input/pq_edge.h> /* pq_pop_min */
 #include <sort.h> /* quicksort */
 #include <stdio.h> /* printf */
@@ -61,9 +62,12 @@ void runKruskals(int n, int m, edge *G)
         nextEdge++;
     }
 
+    phase_end("compute");
+
     printf("%f\n", FOI_TO_OUTPUT_WEIGHT(mstWeight));
     for (i = 0; i < n-1; i++)
         printf("%d %d\n", T[i].u, T[i].v);
+    phase_end("output");
 }
 
 void kruskal(char* fn)
@@ -72,10 +76,12 @@ void kruskal(char* fn)
     edge *G;
 #ifndef PARTIAL_SORT
     read_graph_to_edge_list(fn, &n, &m, &G);
+    phase_end("parse");
     qsort_edges(G, m);
 #else
 #ifdef _PARTIAL_QUICK_
     read_graph_to_edge_list(fn, &n, &m, &G);
+    phase_end("parse");
     int density = m/n;
     if (density >= 50)
     {
@@ -103,6 +109,7 @@ void kruskal(char* fn)
     quicksortPart(G, 0, m-1, sortAmt);
 #else
     read_graph_to_heapified_edge_list(fn, &n, &m, &G);
+    phase_end("parse");
 #endif
 #endif
     makeUnionFind(n);
@@ -1,5 +1,7 @@
 // mst main
 #include <mst.h>
+#include <input/read_graph.h> /* INPUT_TYPE, binary_graph_header */
+#include <phase_times.h> /* phase_times_init */
 #include <stdio.h> /* FILE, fopen, fprintf */
 
 static inline float get_packing_percent(int num_verts, int num_edges) {
@@ -19,12 +21,23 @@ int main(int argc, char **argv) {
         return 0;
     }
 #endif
+    phase_times_init();
 
 #if ALG == BEST_ALG
     FILE *input = fopen(argv[1], "r");
     unsigned num_verts, num_edges;
+#if INPUT_TYPE == BINARY
+    binary_graph_header hdr;
+    if (fread(&hdr, sizeof(hdr), 1, input) != 1) {
+        fprintf(stderr, "unable to read the binary graph header\n");
+        return -1;
+    }
+    num_verts = hdr.num_verts;
+    num_edges = hdr.num_edges;
+#else
     fscanf(input, "%u", &num_verts);
     fscanf(input, "%u", &num_edges);
+#endif
     fclose(input);
 
     float pom = get_packing_percent(num_verts, num_edges);
@@ -0,0 +1,26 @@
+#include <phase_times.h>
+#include <stdio.h> /* fflush, fprintf */
+#include <stdlib.h> /* getenv */
+#include <time.h> /* clock_gettime */
+
+static int phase_times_on = 0;
+static struct timespec phase_start;
+
+void phase_times_init(void) {
+    if(getenv(PHASE_TIMES_ENV) == NULL)
+        return;
+    phase_times_on = 1;
+    clock_gettime(CLOCK_MONOTONIC, &phase_start);
+}
+
+void phase_end(const char *name) {
+    if(!phase_times_on)
+        return;
+
+    fflush(stdout);
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    double sec = (now.tv_sec - phase_start.tv_sec) + (now.tv_nsec - phase_start.tv_nsec) / 1e9;
+    fprintf(stderr, "mst-phase %s %.9f\n", name, sec);
+    phase_start = now;
+}
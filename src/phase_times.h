@@ -0,0 +1,18 @@
+// phase timing: parse, compute and output times written to stderr
+#ifndef PHASE_TIMES_H
+#define PHASE_TIMES_H
+
+/** if this environment variable is set, phase times are written to stderr */
+#define PHASE_TIMES_ENV "MST_PHASE_TIMES"
+
+/** starts timing the first phase (a no-op unless PHASE_TIMES_ENV is set) */
+void phase_times_init(void);
+
+/**
+ * Ends the current phase and starts the next one.  Prints a line of the form
+ * "mst-phase <name> <seconds>" to stderr.  stdout is flushed first so output
+ * which is still buffered is charged to the phase which produced it.
+ */
+void phase_end(const char *name);
+
+#endif
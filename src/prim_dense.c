@@ -1,6 +1,7 @@
 #include <input/adj_matrix.h> /* FLOAT_MAX, AM_INDEX_NO_ADJ */
 #include <input/read_graph.h> /* read_graph */
 #include <mst.h> /* foi */
+#include <phase_times.h> /* phase_end */
 #include <stdio.h> /* printf */
 #include <stdlib.h> /* malloc */
 #include <string.h> /* memset */
@@ -77,10 +78,13 @@ static inline void run_prim_dense(int sz_v, foi *weights) {
             break;
     }
 
+    phase_end("compute");
+
     /* print the MST */
     printf("%f\n", FOI_TO_OUTPUT_WEIGHT(mst_weight));
     for(i=1; i<sz_v; i++)
         printf("%d %u\n", i+1, mst_edges[i]+1);
+    phase_end("output");
 
 #ifdef _DEBUG_
     /* be nice and free memory when we aren't going for performance */
@@ -95,5 +99,6 @@ void prim_dense(char* fn) {
     int n, m;
     foi *weights;
     read_graph_to_adjacency_matrix(fn, &n, &m, &weights);
+    phase_end("parse");
     run_prim_dense(n, weights);
 }
@@ -2,6 +2,7 @@
 #include <input/read_graph.h> /* read_graph */
 #include <mst.h> /* foi */
 #include <pairing_heap.h> /* heap_* */
+#include <phase_times.h> /* phase_end */
 #include <stdio.h> /* printf */
 #include <stdlib.h> /* malloc */
 #include <string.h> /* memset */
@@ -77,11 +78,14 @@ void run_prim_heap(int sz_v, edge_list *al) {
     }
     while(1);
 
+    phase_end("compute");
+
     /* print the MST */
     printf("%f\n", FOI_TO_OUTPUT_WEIGHT(mst_weight));
     int i = 0;
     for(i=2; i<=sz_v; i++)
         printf("%d %u\n", i, mst_edges[i]);
+    phase_end("output");
 
 #ifdef _DEBUG_
     /* be nice and free memory when we aren't going for performance */
@@ -96,5 +100,6 @@ void prim_heap(char* fn) {
     int n, m;
     edge_list *al;
     read_graph_to_adjacency_list(fn, &n, &m, &al);
+    phase_end("parse");
     run_prim_heap(n, al);
 }
@@ -0,0 +1,281 @@
+"""Reads and writes graphs in our binary format.
+
+The binary format is a compact sibling of the usual ASCII format (|V|, |E|,
+one 'u v w' line per edge and a footer comment).  It is laid out as:
+
+  * a HEADER_SIZE byte header (HEADER_FMT, little-endian) which holds |V|, |E|
+    and the metadata which the ASCII format keeps in its footer (including the
+    footer line itself)
+  * |E| fixed-size edge records: uint32 u, uint32 v and a weight which is
+    either a uint32 fixed-point value (the weight times 10^prec) or a float64
+
+Fixed-point weights are used whenever the maximum weight fits in 32 bits at
+the graph's precision, so an edge usually takes 12 bytes.  Since the records
+have a fixed size, the edges can be memory-mapped as arrays without parsing.
+"""
+
+from gzip_graph import open_graph
+from math import sqrt
+from struct import calcsize, pack, unpack
+import mmap, os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # arrays are only available when numpy is installed
+
+MAGIC = 'MSTGRAPH'
+VERSION = 1
+HEADER_FMT = '<8sIIQQIIddQ448s'
+HEADER_SIZE = calcsize(HEADER_FMT)
+
+# weight types
+WEIGHT_FLOAT64 = 0
+WEIGHT_FIXED32 = 1
+
+# number of edges buffered before they are packed and written
+WRITE_BATCH_SIZE = 1 << 16
+
+class BinaryGraphError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return self.msg
+
+def get_weight_type(prec, max_val):
+    """Returns the most compact weight type which can represent weights up to
+    max_val at the given precision."""
+    if round(max_val * 10 ** prec) < 2 ** 32:
+        return WEIGHT_FIXED32
+    else:
+        return WEIGHT_FLOAT64
+
+def get_record_fmt(weight_type):
+    """Returns the struct format of an edge record."""
+    return '<III' if weight_type == WEIGHT_FIXED32 else '<IId'
+
+def get_record_dtype(weight_type):
+    """Returns the numpy dtype of an edge record."""
+    w = '<u4' if weight_type == WEIGHT_FIXED32 else '<f8'
+    return numpy.dtype([('u', '<u4'), ('v', '<u4'), ('w', w)])
+
+def is_binary_graph(fn):
+    """Returns whether fn is a graph in the binary format."""
+    try:
+        fh = open(fn, 'rb')
+        magic = fh.read(len(MAGIC))
+        fh.close()
+        return magic == MAGIC
+    except IOError:
+        return False
+
+class BinaryGraphHeader:
+    """The contents of a binary graph's header."""
+    def __init__(self, weight_type, num_verts, num_edges, prec, dims, min_val, max_val, seed, about):
+        self.weight_type = weight_type
+        self.num_verts = num_verts
+        self.num_edges = num_edges
+        self.prec = prec
+        self.dims = dims
+        self.min = min_val
+        self.max = max_val
+        self.seed = seed
+        self.about = about
+
+    def pack(self):
+        return pack(HEADER_FMT, MAGIC, VERSION, self.weight_type, self.num_verts, self.num_edges,
+                    self.prec, self.dims, self.min, self.max, self.seed, self.about)
+
+    @staticmethod
+    def unpack(buf, fn='graph'):
+        if len(buf) < HEADER_SIZE:
+            raise BinaryGraphError('%s is too short to be a binary graph' % fn)
+        t = unpack(HEADER_FMT, buf[:HEADER_SIZE])
+        if t[0] != MAGIC:
+            raise BinaryGraphError('%s is not a binary graph (bad magic)' % fn)
+        if t[1] != VERSION:
+            raise BinaryGraphError('%s has unsupported binary graph version %u' % (fn, t[1]))
+        return BinaryGraphHeader(t[2], t[3], t[4], t[5], t[6], t[7], t[8], t[9], t[10].rstrip('\0'))
+
+def read_header(fn):
+    """Returns the BinaryGraphHeader of the binary graph fn."""
+    try:
+        fh = open(fn, 'rb')
+        buf = fh.read(HEADER_SIZE)
+        fh.close()
+    except IOError, e:
+        raise BinaryGraphError('unable to read %s: %s' % (fn, e))
+    return BinaryGraphHeader.unpack(buf, fn)
+
+class EdgeRecordWriter:
+    """Packs edges into binary edge records and writes them to a file."""
+    def __init__(self, fh, prec, weight_type):
+        self.fh = fh
+        self.prec = prec
+        self.weight_type = weight_type
+        self.scale = 10 ** prec
+        self.fmt = get_record_fmt(weight_type)
+        self.pending = []
+
+    def __pack_weight(self, w):
+        if self.weight_type == WEIGHT_FIXED32:
+            return int(round(w * self.scale))
+        else:
+            return round(w, self.prec)  # what the ASCII format would store
+
+    def add_edge(self, u, v, w):
+        self.pending.append(pack(self.fmt, u, v, self.__pack_weight(w)))
+        if len(self.pending) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def add_edges(self, us, vs, ws):
+        """Adds a batch of edges from (numpy) arrays."""
+        self.flush()
+        if numpy is None:
+            for (u, v, w) in zip(us, vs, ws):
+                self.add_edge(u, v, w)
+            return
+        recs = numpy.empty(len(us), get_record_dtype(self.weight_type))
+        recs['u'] = us
+        recs['v'] = vs
+        if self.weight_type == WEIGHT_FIXED32:
+            recs['w'] = numpy.rint(numpy.asarray(ws) * self.scale)
+        else:
+            recs['w'] = numpy.round(ws, self.prec)
+        self.fh.write(recs.tostring())
+
+    def flush(self):
+        if len(self.pending) > 0:
+            self.fh.write(''.join(self.pending))
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.fh.close()
+
+class BinaryGraphWriter(EdgeRecordWriter):
+    """Writes a graph in the binary format.  The header is written last (by
+    finish()) since the footer is only known once the graph is complete.
+    max_weight bounds the edge weights if it is not max_val (e.g., the
+    distance between vertex positions in the range [min_val, max_val])."""
+    def __init__(self, fh, prec, dims, min_val, max_val, seed, max_weight=None):
+        if max_weight is None:
+            max_weight = max_val
+        EdgeRecordWriter.__init__(self, fh, prec, get_weight_type(prec, max_weight))
+        self.header = BinaryGraphHeader(self.weight_type, 0, 0, prec, dims, min_val, max_val, seed, '')
+        self.fh.write('\0' * HEADER_SIZE)
+
+    def begin(self, num_verts, num_edges):
+        self.header.num_verts = num_verts
+        self.header.num_edges = num_edges
+
+    def append_records(self, fh):
+        """Appends edge records which were written to fh by an EdgeRecordWriter."""
+        self.flush()
+        while True:
+            buf = fh.read(1 << 20)
+            if not buf:
+                break
+            self.fh.write(buf)
+
+    def finish(self, about):
+        """Writes the header (including the footer line about)."""
+        self.flush()
+        if len(about) > 448:
+            raise BinaryGraphError('footer is too long for the binary graph header: ' + about)
+        self.header.about = about
+        self.fh.seek(0)
+        self.fh.write(self.header.pack())
+        self.fh.seek(0, os.SEEK_END)
+
+class BinaryGraph:
+    """A memory-mapped binary graph."""
+    def __init__(self, fn):
+        self.fn = fn
+        try:
+            fh = open(fn, 'rb')
+            self.mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            fh.close()
+        except (IOError, ValueError, mmap.error), e:
+            raise BinaryGraphError('unable to memory-map %s: %s' % (fn, e))
+        self.header = BinaryGraphHeader.unpack(self.mm[:HEADER_SIZE], fn)
+        self.record_size = calcsize(get_record_fmt(self.header.weight_type))
+        expected = HEADER_SIZE + self.header.num_edges * self.record_size
+        if len(self.mm) < expected:
+            raise BinaryGraphError('%s is truncated (%u bytes, expected %u)' % (fn, len(self.mm), expected))
+
+    def records(self):
+        """Returns the edge records as a numpy structured array (fields u, v and
+        w) which is backed directly by the memory-mapped file."""
+        if numpy is None:
+            raise BinaryGraphError('numpy is required to view a binary graph as arrays')
+        return numpy.frombuffer(self.mm, get_record_dtype(self.header.weight_type),
+                                self.header.num_edges, HEADER_SIZE)
+
+    def weights(self, recs=None):
+        """Returns the edge weights as a float64 array."""
+        if recs is None:
+            recs = self.records()
+        if self.header.weight_type == WEIGHT_FIXED32:
+            return recs['w'] / float(10 ** self.header.prec)
+        else:
+            return recs['w']
+
+    def iter_edges(self):
+        """Yields each edge as a (u, v, w) tuple (no numpy required)."""
+        fmt = get_record_fmt(self.header.weight_type)
+        scale = 10 ** self.header.prec
+        fixed = (self.header.weight_type == WEIGHT_FIXED32)
+        for i in xrange(self.header.num_edges):
+            (u, v, w) = unpack(fmt, self.mm[HEADER_SIZE + i*self.record_size:HEADER_SIZE + (i+1)*self.record_size])
+            yield (u, v, w / float(scale) if fixed else w)
+
+    def close(self):
+        self.mm.close()
+
+def binary_to_text(fn, out):
+    """Writes the binary graph fn to out in the ASCII format."""
+    bg = BinaryGraph(fn)
+    h = bg.header
+    out.write('%u\n%u\n' % (h.num_verts, h.num_edges))
+    fmt = '%u %u %.' + str(h.prec) + 'f\n'
+    if numpy is not None:
+        recs = bg.records()
+        ws = bg.weights(recs)
+        for s in xrange(0, h.num_edges, WRITE_BATCH_SIZE):
+            e = s + WRITE_BATCH_SIZE
+            rows = zip(recs['u'][s:e].tolist(), recs['v'][s:e].tolist(), ws[s:e].tolist())
+            out.write(''.join([fmt % r for r in rows]))
+        del recs, ws  # release the views of the map before closing it
+    else:
+        for r in bg.iter_edges():
+            out.write(fmt % r)
+    out.write(h.about + '\n')
+    bg.close()
+
+def text_to_binary(fn, out_fn, ti):
+    """Converts the ASCII graph fn to a binary graph out_fn.  ti is the Input
+    described by fn's footer.  fn may be compressed."""
+    try:
+        fh = open_graph(fn)
+    except IOError, e:
+        raise BinaryGraphError('unable to read %s: %s' % (fn, e))
+    # weights computed from vertex positions may be as long as the diagonal
+    max_weight = (ti.max - ti.min) * sqrt(ti.dims) if ti.dims > 0 else None
+    bgw = BinaryGraphWriter(open(out_fn, 'wb'), ti.prec, ti.dims, ti.min, ti.max, ti.seed, max_weight)
+    try:
+        num_verts = int(fh.readline())
+        num_edges = int(fh.readline())
+    except ValueError:
+        raise BinaryGraphError('%s does not start with the number of vertices and edges' % fn)
+    bgw.begin(num_verts, num_edges)
+    about = ''
+    for line in fh:
+        if line[0] == '#':
+            about = line.rstrip('\n')
+            break
+        (u, v, w) = line.split()
+        bgw.add_edge(int(u), int(v), float(w))
+    fh.close()
+    bgw.finish(about)
+    bgw.close()
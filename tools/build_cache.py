@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+"""A cache of mst binaries built from committed revisions.
+
+Binaries are keyed by the full SHA1 of the revision and the make arguments
+they were built with.  Each revision is built from a copy of its source
+exported with git archive into a temporary directory, so the working tree and
+the current branch are never touched and any number of revisions can be
+built at once.  Each entry in the cache directory consists of:
+
+  <sha1>-<flags key>/mst   the binary
+  <sha1>-<flags key>/args  the make arguments it was built with
+  <sha1>-<flags key>.lock  lock file (held while the entry is being built)
+
+A binary is built into a temporary file and renamed into place, so a binary
+in the cache is always complete.
+"""
+
+from mstutil import get_path_to_project_root, quiet_remove
+from optparse import OptionParser
+import fcntl, hashlib, os, shlex, shutil, subprocess, sys, tarfile, tempfile
+
+# the make arguments binaries are built with by default
+DEFAULT_MAKE_ARGS = 'BUILD_TYPE=release'
+
+class BuildCacheError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return self.msg
+
+def get_path_to_build_cache():
+    """Gets the path to the build cache directory, /tmp/<user>-build/ (it is
+    created if needed)."""
+    path = '/tmp/' + os.getlogin() + '-build/'
+    if not os.path.exists(path):
+        try:
+            os.mkdir(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise  # someone else did not create it first
+    return path
+
+def resolve_rev(rev):
+    """Returns the full SHA1 of the commit rev refers to."""
+    p = subprocess.Popen(['git', 'rev-parse', '--verify', '--quiet', rev + '^{commit}'],
+                         cwd=get_path_to_project_root(), stdout=subprocess.PIPE)
+    sha1 = p.communicate()[0].strip()
+    if p.returncode != 0 or len(sha1) != 40:
+        raise BuildCacheError('unknown revision: ' + rev)
+    return sha1
+
+def export_source(sha1, dst):
+    """Extracts the src directory of revision sha1 into the directory dst."""
+    p = subprocess.Popen(['git', 'archive', '--format=tar', sha1, 'src'],
+                         cwd=get_path_to_project_root(), stdout=subprocess.PIPE)
+    try:
+        tar = tarfile.open(fileobj=p.stdout, mode='r|')
+        tar.extractall(dst)
+        tar.close()
+    finally:
+        p.stdout.close()
+        if p.wait() != 0:
+            raise BuildCacheError('git archive failed for ' + sha1)
+
+class BuildCache:
+    def __init__(self, path=None):
+        self.path = get_path_to_build_cache() if path is None else path
+
+    def __get_entry(self, sha1, make_args):
+        return os.path.join(self.path, '%s-%s' % (sha1, hashlib.sha1(make_args).hexdigest()[:10]))
+
+    def __build(self, sha1, make_args, entry, quiet):
+        """Builds revision sha1 and moves the binary into entry."""
+        tmp_dir = tempfile.mkdtemp(prefix='mst-build-', dir=self.path)
+        try:
+            export_source(sha1, tmp_dir)
+            src = os.path.join(tmp_dir, 'src')
+            out = open(os.devnull, 'w') if quiet else None
+            try:
+                ret = subprocess.call(['make', '-C', src] + shlex.split(make_args) + ['mst'], stdout=out)
+            finally:
+                if out is not None:
+                    out.close()
+            if ret != 0:
+                raise BuildCacheError('unable to build %s (make %s mst)' % (sha1, make_args))
+
+            if not os.path.exists(entry):
+                os.mkdir(entry)
+            fh = open(os.path.join(entry, 'args'), 'w')
+            print >> fh, make_args
+            fh.close()
+            tmp_fn = os.path.join(entry, 'mst.tmp-%u' % os.getpid())
+            shutil.copy2(os.path.join(src, 'mst'), tmp_fn)
+            os.rename(tmp_fn, os.path.join(entry, 'mst'))
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def get(self, rev, make_args=DEFAULT_MAKE_ARGS, quiet=True):
+        """Returns the path to the mst binary built from rev with make_args,
+        building it if it is not already cached.  The binary must not be
+        modified or removed by the caller."""
+        sha1 = resolve_rev(rev)
+        entry = self.__get_entry(sha1, make_args)
+        binary = os.path.join(entry, 'mst')
+        if os.path.exists(binary):
+            return binary  # already built: no need to lock
+
+        lock_fh = open(entry + '.lock', 'a')
+        fcntl.flock(lock_fh, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(binary):  # someone may have built it while we waited
+                if not quiet:
+                    print 'building mst from %s (make %s)' % (sha1, make_args)
+                self.__build(sha1, make_args, entry, quiet)
+        finally:
+            lock_fh.close()
+        return binary
+
+    def get_entries(self):
+        """Returns a list of (sha1, make_args, binary) for each cached binary."""
+        entries = []
+        for fn in sorted(os.listdir(self.path)):
+            binary = os.path.join(self.path, fn, 'mst')
+            if os.path.exists(binary):
+                try:
+                    fh = open(os.path.join(self.path, fn, 'args'), 'r')
+                    make_args = fh.readline().rstrip('\n')
+                    fh.close()
+                except IOError:
+                    make_args = '?'
+                entries.append((fn.split('-', 1)[0], make_args, binary))
+        return entries
+
+    def clear(self):
+        """Removes every cached binary."""
+        for (_, _, binary) in self.get_entries():
+            entry = os.path.dirname(binary)
+            lock_fh = open(entry + '.lock', 'a')
+            fcntl.flock(lock_fh, fcntl.LOCK_EX)
+            try:
+                quiet_remove(binary)
+                shutil.rmtree(entry, True)
+            finally:
+                lock_fh.close()
+
+def main(argv=sys.argv[1:]):
+    usage = """usage: %prog [options]
+Manages the cache of mst binaries built from committed revisions."""
+    parser = OptionParser(usage)
+    parser.add_option("-a", "--make-args",
+                      metavar="ARGS", default=DEFAULT_MAKE_ARGS,
+                      help="arguments to pass to make when building with -b [default: %default]")
+    parser.add_option("-b", "--build",
+                      metavar="REV",
+                      help="print the path to the binary built from REV (building it if needed)")
+    parser.add_option("-c", "--clear",
+                      action="store_true", default=False,
+                      help="remove every binary from the cache")
+    parser.add_option("-l", "--list",
+                      action="store_true", default=False,
+                      help="list the binaries in the cache")
+    (options, args) = parser.parse_args(argv)
+    if len(args) > 0:
+        parser.error("too many arguments: none expected")
+
+    bc = BuildCache()
+    if options.clear:
+        bc.clear()
+    if options.list:
+        for (sha1, make_args, binary) in bc.get_entries():
+            print '%s\t%s\t%s' % (sha1, make_args, binary)
+    if options.build is not None:
+        try:
+            print bc.get(options.build, options.make_args, False)
+        except BuildCacheError, e:
+            print >> sys.stderr, e
+            return -1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
+from binary_graph import binary_to_text, is_binary_graph
 from data import DataError, DataSet, InputSolution, CorrResult, CORRECT, INCORRECT
 from data import extract_input_footer, ExtractInputFooterError, ppinput
-from mstutil import get_path_to_checker_binary, random_tmp_filename
+from gzip_graph import decompress_graph, is_gzip_graph
+from mstutil import get_path_to_checker_binary, quiet_remove, random_tmp_filename
 from optparse import OptionParser
 import os, sys
 
@@ -39,23 +41,45 @@ def compute_mst_weight(input_graph):
 def __compute_mst_weight(input_graph, corr_file):
     """Internal method to actual compute the MST weight of input_graph"""
     checker = get_path_to_checker_binary(True)
-    ret = os.system('%s %s > %s' % (checker, input_graph, corr_file))
+    if is_binary_graph(input_graph):
+        # the checker only reads text graphs
+        text_graph = random_tmp_filename(10, 'text')
+        try:
+            out = open(text_graph, 'w')
+            binary_to_text(input_graph, out)
+            out.close()
+            ret = os.system('%s %s > %s' % (checker, text_graph, corr_file))
+        finally:
+            quiet_remove(text_graph)
+    elif is_gzip_graph(input_graph):
+        text_graph = decompress_graph(input_graph)
+        try:
+            ret = os.system('%s %s > %s' % (checker, text_graph, corr_file))
+        finally:
+            quiet_remove(text_graph)
+    else:
+        ret = os.system('%s %s > %s' % (checker, input_graph, corr_file))
     if ret == 0:
         return extract_answer(corr_file)
     else:
         raise CheckerError("checker error: failed to generate output for " + ppinput(input_graph))
 
-def __get_ti(input_graph):
+def __get_ti(input_graph, allow_variant=False):
     try:
-        return extract_input_footer(input_graph)
+        return extract_input_footer(input_graph, allow_variant)
     except ExtractInputFooterError, e:
         raise CheckerError("checker error: unable to extract the input footer for %s: %s" % (ppinput(input_graph), e))
 
 def get_and_log_mst_weight_from_checker(input_graph, force_recompute=False, inputslogfn=None):
     """Returns the a 2-tuple of (input, weight).  If force_recompute is not
     True, then it will check the input log cache to see if we already know the
-    answer first.  Logs the result."""
-    ti = __get_ti(input_graph)
+    answer first.  Logs the result (unless input_graph's Input does not identify
+    it, e.g. it was generated by generate_input.py -b)."""
+    try:
+        ti = extract_input_footer(input_graph)
+    except ExtractInputFooterError:
+        ti = __get_ti(input_graph, True)
+        return (ti, compute_mst_weight(input_graph))
 
     # load in the inputs in the category of input_graph
     if inputslogfn is None:
@@ -79,7 +103,7 @@ def get_and_log_mst_weight_from_checker(input_graph, force_recompute=False, inpu
     w = compute_mst_weight(input_graph)
     if do_log:
         if input_soln.update_mst_weight(w):
-            ds.save_to_file(logfn)
+            DataSet.add_data_to_log_file(input_soln, logfn)
     return (ti, w)
 
 def check(input_graph, output_to_test, tolerance, force_recompute, rev=None, run=None, inputslogfn=None):
@@ -115,8 +139,11 @@ def check(input_graph, output_to_test, tolerance, force_recompute, rev=None, run
 
     # log the result of the correctness check
     if rev is not None and run is not None:
-        if ti is None:
-            ti = __get_ti(input_graph)
+        try:
+            ti = extract_input_footer(input_graph)
+        except ExtractInputFooterError, e:
+            print >> sys.stderr, "warning: not logging the correctness result for %s: %s" % (ppinput(input_graph), e)
+            return outcome
 
         data = CorrResult(ti.dims, ti.min, ti.max, ti.num_verts, ti.num_edges, ti.seed, rev, run, outcome)
         try:
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+from data import DataError, DataSet
+from data import get_journal_filename, get_log_dirs, is_log_filename
+from mstutil import get_path_to_project_root
+from optparse import OptionParser
+import os, sys
+
+def get_data_class(logfn):
+    """Returns the type of data logged in logfn (None if it is not a log file)."""
+    rel = os.path.abspath(logfn)[len(os.path.abspath(get_path_to_project_root())) + 1:]
+    (d, fn) = os.path.split(rel)
+    cls_data = get_log_dirs().get(d + '/')
+    if cls_data is None or not is_log_filename(cls_data, fn):
+        return None
+    return cls_data
+
+def get_log_files_with_journals():
+    """Returns a list of the log files which have a journal."""
+    ret = []
+    for (d, cls_data) in sorted(get_log_dirs().items()):
+        path = get_path_to_project_root() + d
+        if os.path.isdir(path):
+            for fn in sorted(os.listdir(path)):
+                logfn = path + fn
+                if is_log_filename(cls_data, fn) and os.path.exists(get_journal_filename(logfn)):
+                    ret.append(logfn)
+    return ret
+
+def main(argv=sys.argv[1:]):
+    usage = """usage: %prog [options] [LOG_FILE...]
+Merges the journal of each LOG_FILE (default: every log file in result/ and
+input/ which has one) into it.  Results are appended to a journal when they
+are logged; journals are only merged into their (sorted) log files once they
+grow large, so compact them before committing results."""
+    parser = OptionParser(usage)
+    parser.add_option("-q", "--quiet",
+                      action="store_true", default=False,
+                      help="do not list the log files which are compacted")
+    (options, args) = parser.parse_args(argv)
+    logfns = args if len(args) > 0 else get_log_files_with_journals()
+
+    ret = 0
+    for logfn in logfns:
+        cls_data = get_data_class(logfn)
+        if cls_data is None:
+            print >> sys.stderr, 'not a log file: ' + logfn
+            ret = -1
+            continue
+        try:
+            if DataSet.compact_log_file(cls_data, logfn) and not options.quiet:
+                print 'compacted ' + logfn
+        except DataError, e:
+            print >> sys.stderr, 'unable to compact %s: %s' % (logfn, str(e))
+            ret = -1
+    return ret
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+"""Compares the performance of two revisions on the inputs both were
+benchmarked on and flags statistically significant slowdowns.
+
+The runs of each revision on an input are summarized by a ResultAccumulator.
+The speedup of the new revision on the input is the ratio of the mean times
+(old / new) and its confidence interval is bounded by the ratios of the ends of
+the two means' confidence intervals.  This is conservative: a slowdown is only
+significant if the new revision is slower even when the old mean is at the
+bottom of its interval and the new mean is at the top of its interval.
+"""
+
+from data import DataError, Input, PerfResult, get_tracked_algs_and_revs, get_tracked_revs
+from result import ResultAccumulator
+from resultdb import get_log_name, get_result_db, read_dataset
+from optparse import OptionParser
+from math import exp, log
+import os, sys
+
+# exit code when a significant slowdown is found (errors exit with -1)
+SLOWDOWN_EXIT_CODE = 1
+
+# the fewest runs on an input which its confidence interval is computed from
+MIN_RUNS = 2
+
+def resolve_rev(name):
+    """Returns the revision name refers to: a tag in conf/tracked_revs (its
+    latest revision, or TAG~N for the revision N before that), a unique prefix
+    of a tracked revision's SHA1, or a revision which has perf results."""
+    tracked = get_tracked_algs_and_revs()
+    (tag, _, back) = name.partition('~')
+    if tracked.has_key(tag):
+        try:
+            n = int(back) if back else 0
+        except ValueError:
+            raise DataError('invalid revision: ' + name)
+        revs = tracked[tag]
+        if n < 0 or n >= len(revs):
+            raise DataError('%s has only %u tracked revisions' % (tag, len(revs)))
+        return revs[len(revs) - 1 - n]
+    matches = [rev for rev in get_tracked_revs() if rev.startswith(name)]
+    if len(set(matches)) == 1:
+        return matches[0]
+    elif len(set(matches)) > 1:
+        raise DataError('ambiguous revision: ' + name)
+    if os.path.exists(PerfResult.get_path_to(name)):
+        return name
+    raise DataError('no perf results for revision: ' + name)
+
+def get_times_by_input(rev):
+    """Returns a dict mapping each Input rev was benchmarked on to a list of
+    its times."""
+    times = {}
+    ds = read_dataset(PerfResult, PerfResult.get_path_to(rev), True)
+    for data in ds.dataset.values():
+        times.setdefault(data.input(), []).append(data.time_sec)
+    return times
+
+def get_times_on_common_inputs(old_rev, new_rev):
+    """Returns a 2-tuple of dicts mapping Inputs to lists of the times of
+    old_rev and new_rev on them.  The dicts may include inputs which only one
+    of them was benchmarked on, but if the result store is in use, it selects
+    just the results on inputs which both were benchmarked on."""
+    (oldfn, newfn) = (PerfResult.get_path_to(old_rev), PerfResult.get_path_to(new_rev))
+    db = get_result_db()
+    if db is None or not db.refresh(PerfResult, oldfn) or not db.refresh(PerfResult, newfn):
+        return (get_times_by_input(old_rev), get_times_by_input(new_rev))
+    times = {get_log_name(oldfn):{}, get_log_name(newfn):{}}
+    for (log, i, t) in db.select_values_on_common_inputs(PerfResult, oldfn, newfn, 'time_sec'):
+        times[log].setdefault(i, []).append(t)
+    return (times[get_log_name(oldfn)], times[get_log_name(newfn)])
+
+def summarize_times(times, ci):
+    """Returns a ResultAccumulator of times (a list of at least one time)."""
+    r = ResultAccumulator(times[0])
+    r.defaultCI = ci
+    for t in times[1:]:
+        r.add_data(t)
+    r.compute_stats()
+    return r
+
+class Comparison:
+    """The speedup of a new revision over an old one on one input."""
+    def __init__(self, input, old, new):
+        self.input = input
+        self.old = old
+        self.new = new
+        self.speedup = old.mean / new.mean
+        self.lower = old.lower99 / new.upper99
+        self.upper = old.upper99 / new.lower99 if new.lower99 > 0 else float('inf')
+
+    def is_slowdown(self, threshold):
+        """Returns whether the new revision is significantly slower by more
+        than the fraction threshold."""
+        return self.upper < 1.0 / (1.0 + threshold)
+
+    def is_speedup(self):
+        """Returns whether the new revision is significantly faster."""
+        return self.lower > 1.0
+
+    def __str__(self):
+        i = self.input
+        return '%u\t%u\t%u\t%.6f\t%.6f\t%.3f\t[%.3f, %.3f]' % (i.num_verts, i.num_edges, i.seed,
+                                                               self.old.mean, self.new.mean, self.speedup, self.lower, self.upper)
+
+def compare_revs(old_rev, new_rev, ci):
+    """Returns a 2-tuple: a list of the Comparisons of old_rev and new_rev on
+    each input both were benchmarked on enough times, and a list of the
+    inputs which were skipped (too few runs, or too fast to time)."""
+    (old_times, new_times) = get_times_on_common_inputs(old_rev, new_rev)
+    comparisons = []
+    skipped = []
+    for i in sorted(old_times.keys(), key=Input.sort_key):
+        if not new_times.has_key(i):
+            continue
+        (old, new) = (summarize_times(old_times[i], ci), summarize_times(new_times[i], ci))
+        if len(old.values) < MIN_RUNS or len(new.values) < MIN_RUNS or old.mean <= 0 or new.mean <= 0 or old.lower99 <= 0:
+            skipped.append(i)
+        else:
+            comparisons.append(Comparison(i, old, new))
+    return (comparisons, skipped)
+
+def main(argv=sys.argv[1:]):
+    usage = """usage: %%prog [options] OLD_REV NEW_REV
+Compares the times of NEW_REV to those of OLD_REV on each input both were
+benchmarked on.  A revision may be a tag from conf/tracked_revs (its latest
+revision; TAG~N is the revision N before that), a prefix of a tracked SHA1 or
+any revision with results in result/perf/.  Exits with code %u if NEW_REV is
+significantly slower than OLD_REV on any input.""" % SLOWDOWN_EXIT_CODE
+    parser = OptionParser(usage)
+    parser.add_option("-c", "--ci",
+                      metavar="PERCENT", type="int", default=95,
+                      help="confidence level of the intervals (90, 95 or 99) [default: %default]")
+    parser.add_option("-q", "--quiet",
+                      action="store_true", default=False,
+                      help="only list the inputs with a significant slowdown")
+    parser.add_option("-t", "--threshold",
+                      metavar="FRAC", type="float", default=0.0,
+                      help="ignore significant slowdowns of no more than FRAC (e.g., 0.05 for 5%) [default: %default]")
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 2:
+        parser.error("expected two revisions")
+    if options.ci not in (90, 95, 99):
+        parser.error("-c must be 90, 95 or 99")
+    if options.threshold < 0:
+        parser.error("-t must not be negative")
+
+    try:
+        (old_rev, new_rev) = (resolve_rev(args[0]), resolve_rev(args[1]))
+        (comparisons, skipped) = compare_revs(old_rev, new_rev, options.ci)
+    except DataError, e:
+        print >> sys.stderr, 'error: ' + str(e)
+        return -1
+    if len(comparisons) == 0:
+        print >> sys.stderr, 'error: %s and %s have no inputs in common with at least %u runs each' % (old_rev, new_rev, MIN_RUNS)
+        return -1
+
+    slowdowns = [c for c in comparisons if c.is_slowdown(options.threshold)]
+    speedups = [c for c in comparisons if c.is_speedup()]
+    print '#|V|\t|E|\tSeed\tOld(sec)\tNew(sec)\tSpeedup\t%u%% CI\t(old=%s new=%s)' % (options.ci, old_rev, new_rev)
+    for c in comparisons:
+        if c.is_slowdown(options.threshold):
+            print str(c) + '\tSLOWER'
+        elif not options.quiet:
+            print str(c) + ('\tfaster' if c.is_speedup() else '')
+
+    geomean = exp(sum([log(c.speedup) for c in comparisons]) / len(comparisons))
+    print 'compared %u inputs (%u skipped): %u significantly slower, %u significantly faster, geometric mean speedup %.3f' % \
+        (len(comparisons), len(skipped), len(slowdowns), len(speedups), geomean)
+    return SLOWDOWN_EXIT_CODE if len(slowdowns) > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+from binary_graph import binary_to_text, is_binary_graph, text_to_binary, BinaryGraphError
+from data import extract_input_footer, ExtractInputFooterError
+from optparse import OptionParser
+from mstutil import die
+import sys
+
+def main(argv=sys.argv[1:]):
+    usage = """usage: %prog [options] INPUT_GRAPH OUTPUT_GRAPH
+Converts a graph between the text format and the binary format (see
+binary_graph.py).  The direction is chosen based on the format of INPUT_GRAPH.
+OUTPUT_GRAPH may be 'stdout' when converting to text."""
+    parser = OptionParser(usage)
+    (options, args) = parser.parse_args(argv)
+    if len(args) < 2:
+        parser.error("missing argument: INPUT_GRAPH and OUTPUT_GRAPH are required")
+    elif len(args) > 2:
+        parser.error("too many arguments")
+    (input_graph, output_graph) = args
+
+    try:
+        if is_binary_graph(input_graph):
+            if output_graph == 'stdout':
+                binary_to_text(input_graph, sys.stdout)
+            else:
+                out = open(output_graph, 'w')
+                binary_to_text(input_graph, out)
+                out.close()
+        else:
+            if output_graph == 'stdout':
+                parser.error("binary graphs cannot be written to stdout")
+            text_to_binary(input_graph, output_graph, extract_input_footer(input_graph, True))
+    except (BinaryGraphError, ExtractInputFooterError), e:
+        die('convert_graph: error: ' + str(e))
+    except IOError, e:
+        die('convert_graph: error: ' + str(e))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
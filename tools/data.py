@@ -1,5 +1,7 @@
-from mstutil import compare_float, get_path_to_generated_inputs, get_path_to_project_root, get_path_to_tools_root
-import os, re, sys
+from binary_graph import BinaryGraphError, is_binary_graph, read_header
+from gzip_graph import is_gzip_graph, read_gzip_footer
+from mstutil import compare_float, get_path_to_generated_inputs, get_path_to_project_root, get_path_to_tools_root, quiet_remove
+import fcntl, os, re, sys
 
 # whether to return pretty-printed input paths quickly or with more helpful info
 FAST_INPUT_PATH_PRETTY_PRINT = False
@@ -10,6 +12,121 @@ class DataError(Exception):
     def __str__(self):
         return self.msg
 
+def get_lock_filename(logfn):
+    """Returns the name of the (hidden) lock file for the log file logfn."""
+    (d, fn) = os.path.split(logfn)
+    return os.path.join(d, '.' + fn + '.lock')
+
+def get_journal_filename(logfn):
+    """Returns the name of the (hidden) journal of the log file logfn.  New
+    data is appended to the journal and merged into the log file (which is
+    kept sorted) when the journal is compacted."""
+    (d, fn) = os.path.split(logfn)
+    return os.path.join(d, '.' + fn + '.journal')
+
+def __read_log_lines(fn, parse, get_key, dataset, is_journal):
+    """Adds the data parsed from each line of fn to dataset.  Lines of a
+    journal which are incomplete (e.g., left by a writer which died while
+    appending) are skipped.  Returns False if a journal is removed before it
+    is read."""
+    try:
+        fh = open(fn, "r")
+        lines = fh.readlines()
+        fh.close()
+    except IOError, e:
+        if is_journal and not os.path.exists(fn):
+            return False  # just compacted into its log file
+        raise DataError("I/O error while reading in %s: %s" % (fn, e))
+    for line in lines:
+        if line[0:1] == '#' or line.strip() == '':
+            continue
+        try:
+            if is_journal and line[-1:] != '\n':
+                raise ValueError('incomplete line')
+            fields = line.split()
+            data = parse(fields)
+            key = get_key(data)
+        except (ValueError, DataError), e:
+            if not is_journal:
+                raise DataError("Improper value encountered while reading in %s: %s" % (fn, e))
+            print >> sys.stderr, 'warning: skipping a corrupt line in %s: %s' % (fn, e)
+            continue
+        dataset[key] = data
+    return True
+
+def read_log_file(logfn, parse, get_key, mustExist=False):
+    """Returns a dict of the data in the log file logfn and its journal.
+    parse(fields) returns the data logged on a line (given its fields) and
+    get_key(data) the key it is stored under: later lines replace earlier ones
+    with the same key, and the journal's lines come after the log file's.  No
+    lock is needed: the journal is read first, so if it is compacted while we
+    read then its data is in the log file by the time we read that."""
+    dataset = {}
+    journal = {}
+    journalfn = get_journal_filename(logfn)
+    has_journal = os.path.exists(journalfn) and __read_log_lines(journalfn, parse, get_key, journal, True)
+    if os.path.exists(logfn) or (mustExist and not has_journal):
+        __read_log_lines(logfn, parse, get_key, dataset, False)
+    dataset.update(journal)
+    return dataset
+
+def get_log_stats(logfn):
+    """Returns the os.stat of logfn and of its journal (None for either
+    which does not exist)."""
+    ret = []
+    for fn in (logfn, get_journal_filename(logfn)):
+        try:
+            ret.append(os.stat(fn))
+        except OSError:
+            ret.append(None)
+    return tuple(ret)
+
+def make_log_stamp(log_st, journal_st):
+    """Returns a string which identifies the state of a log file and its
+    journal given their stats (None if neither exists).  It changes whenever
+    either of them does."""
+    if log_st is None and journal_st is None:
+        return None
+    return ' '.join([('-' if st is None else '%u:%r:%u' % (st.st_ino, st.st_mtime, st.st_size))
+                     for st in (log_st, journal_st)])
+
+def get_log_stamp(logfn):
+    """Returns the stamp (see make_log_stamp) of logfn and its journal."""
+    return make_log_stamp(*get_log_stats(logfn))
+
+def get_log_dirs():
+    """Returns a dict mapping each directory of log files (relative to the
+    project root) to the type of data logged in it."""
+    return {'result/corr/':CorrResult, 'result/counters/':CounterResult, 'result/mem/':MemResult,
+            'result/perf/':PerfResult, 'result/weight/':WeightResult, 'input/':InputSolution}
+
+def is_log_filename(cls_data, fn):
+    """Returns whether fn (the name of a file in the directory cls_data is
+    logged in) is a log file rather than a journal, lock or other file."""
+    if fn[0:1] == '.':
+        return False
+    return cls_data is not InputSolution or fn.endswith('.inputs')
+
+# a journal is compacted into its log file once it grows this big
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+def lock_log_file(logfn, shared=False, wait=True):
+    """Returns a file handle which holds a lock on logfn until it is closed
+    (None if wait is False and the lock is not available).  Appenders share
+    the lock; it is held exclusively while the log file is rewritten."""
+    try:
+        lock_fh = open(get_lock_filename(logfn), 'a')
+    except IOError, e:
+        raise DataError("unable to lock %s: %s" % (logfn, e))
+    try:
+        fcntl.flock(lock_fh, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if wait else fcntl.LOCK_NB))
+    except IOError:
+        lock_fh.close()
+        if wait:
+            raise
+        return None
+    return lock_fh
+
 class DataSet:
     """A collection of Data objects"""
     def __init__(self, dataset):
@@ -26,52 +143,140 @@ class DataSet:
         return True
 
     def save_to_file(self, logfn):
-        """Saves the dataset to the specified log file in sorted order"""
-        sorted_data = sorted(self.dataset.values())
+        """Saves the dataset to the specified log file in sorted order.  The
+        log file's journal is discarded, so the dataset should include it (as
+        it does if it was read with read_from_file).  The data is written to a
+        temporary file which is then renamed over the log file, so readers
+        never see a partially written log file."""
+        sorted_data = sorted(self.dataset.values(), key=lambda d : d.sort_key())
+        (path, fn) = os.path.split(logfn)
+        tmp_fn = os.path.join(path, '.%s.tmp-%u' % (fn, os.getpid()))
         try:
-            fh = open(logfn, "w")
+            fh = open(tmp_fn, "w")
             if len(sorted_data) > 0:
                 fh.write(sorted_data[0].header_row() + '\n')
             for d in sorted_data:
                 fh.write('%s\n' % str(d))
+            fh.flush()
+            os.fsync(fh.fileno())
             fh.close()
-        except IOError, e:
+            os.rename(tmp_fn, logfn)
+        except (IOError, OSError), e:
+            quiet_remove(tmp_fn)
             raise DataError("I/O error while writing to %s: %s" % (logfn, e))
+        # the journal's data is now in the log file too (so it does not matter
+        # if we die before removing it)
+        quiet_remove(get_journal_filename(logfn))
 
     @classmethod
     def read_from_file(cls, cls_data, logfn, mustExist=False):
         """Factory method which populates a DataSet composed of cls_data
-        type objects with the contents of a file."""
-        dataset = {}
-        if not mustExist and not os.path.exists(logfn):
-            return cls(dataset)
-        try:
-            fh = open(logfn, "r")
-            lines = fh.readlines()
-            for line in lines:
-                if line[0:1] != '#':
-                    s = line.split()
-                    t = cls_data.from_list(s)
-                    dataset[t.mykey()] = t
-            fh.close()
-        except IOError, e:
-            raise DataError("I/O error while reading in %s: %s" % (logfn, e))
-        except ValueError, e:
-            fh.close()
-            raise DataError("Improper value encountered while reading in %s: %s" % (logfn, e))
-        return cls(dataset)
+        type objects with the contents of a file (and its journal)."""
+        return cls(read_log_file(logfn, cls_data.from_list, lambda data : data.mykey(), mustExist))
 
     @classmethod
     def add_data_to_log_file(cls, data, logfn=None):
         """Adds data to the appropriate log file."""
         if logfn is None:
             logfn = data.get_path()
-        ds = cls.read_from_file(data.__class__, logfn)
-        if ds.add_data(data):
-            ds.save_to_file(logfn)
+        cls.__update_log_file(logfn, [data])
+
+    @classmethod
+    def add_data_list_to_log_files(cls, data_list):
+        """Adds each Data object in data_list to the appropriate log file."""
+        by_logfn = {}
+        for data in data_list:
+            by_logfn.setdefault(data.get_path(), []).append(data)
+        for (logfn, lst) in by_logfn.items():
+            cls.__update_log_file(logfn, lst)
+
+    @classmethod
+    def __update_log_file(cls, logfn, data_list):
+        """Appends the Data objects in data_list (which are all of one type) to
+        the journal of the log file logfn, compacting it if it is big.
+        Appenders only share the log file's lock (so they never wait on each
+        other): each appends its data with one O_APPEND write, which the OS
+        does not interleave with other writers' appends."""
+        lock_fh = lock_log_file(logfn, True)
+        try:
+            journalfn = get_journal_filename(logfn)
+            buf = ''.join(['%s\n' % str(data) for data in data_list])
+            try:
+                # the log file cannot change while we hold the lock, but others
+                # may append to the journal
+                (log_st, journal_st) = get_log_stats(logfn)
+                fd = os.open(journalfn, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0666)
+                try:
+                    # start a new line if a writer died partway through one
+                    if os.fstat(fd).st_size > 0:
+                        os.lseek(fd, -1, 2)
+                        if os.read(fd, 1) != '\n':
+                            buf = '\n' + buf
+                    n = os.write(fd, buf)
+                    new_journal_st = os.fstat(fd)
+                finally:
+                    os.close(fd)
+                if n != len(buf):
+                    raise OSError('short write (%u of %u bytes)' % (n, len(buf)))
+                is_big = new_journal_st.st_size >= JOURNAL_COMPACT_BYTES
+            except OSError, e:
+                raise DataError("I/O error while appending to %s: %s" % (journalfn, e))
+
+            # also add the data to the result store if one is in use; if the
+            # journal only changed by our append, the store stays up to date
+            # with the log file (if it was before)
+            if journal_st is None:
+                is_only_append = new_journal_st.st_size == len(buf)
+            else:
+                is_only_append = new_journal_st.st_ino == journal_st.st_ino and \
+                                 new_journal_st.st_size == journal_st.st_size + len(buf)
+            stamps = None
+            if is_only_append:
+                stamps = (make_log_stamp(log_st, journal_st), make_log_stamp(log_st, new_journal_st))
+            cls.__update_result_db(data_list[0].__class__, logfn, data_list, stamps)
+        finally:
+            lock_fh.close()
+        if is_big:
+            # unless someone else is already compacting it or appending to it
+            cls.compact_log_file(data_list[0].__class__, logfn, False)
+
+    @staticmethod
+    def __update_result_db(cls_data, logfn, data_list, stamps):
+        """Adds data_list (cls_data objects just added to logfn) to the result
+        store if one is in use.  stamps is None or the stamps of logfn before
+        and after the change (see ResultDB.add_data_list)."""
+        import resultdb
+        try:
+            db = resultdb.get_result_db()
+            if db is not None:
+                db.add_data_list(data_list, logfn, cls_data, stamps)
+        except resultdb.ResultDBError, e:
+            raise DataError(str(e))
+
+    @classmethod
+    def compact_log_file(cls, cls_data, logfn, wait=True):
+        """Merges the journal of logfn (of cls_data objects) into it.  Returns
+        whether it did so (it does not if logfn has no journal, or if wait is
+        False and logfn is locked)."""
+        lock_fh = lock_log_file(logfn, False, wait)
+        if lock_fh is None:
+            return False
+        try:
+            stamp = get_log_stamp(logfn)
+            if not os.path.exists(get_journal_filename(logfn)):
+                return False
+            cls.read_from_file(cls_data, logfn).save_to_file(logfn)
+
+            # the data did not change, so neither did the store's copy of it
+            cls.__update_result_db(cls_data, logfn, [], (stamp, get_log_stamp(logfn)))
+            return True
+        finally:
+            lock_fh.close()
+
+class Input(object):
+    """Data based on some input (immutable)"""
+    __slots__ = ('prec', 'dims', 'min', 'max', 'num_verts', 'num_edges', 'seed', '__key', '__hash')
 
-class Input:
-    """Data based on some input"""
     def __init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed):
         self.prec      = int(prec)
         self.dims      = int(dims)
@@ -80,6 +285,12 @@ class Input:
         self.num_verts = int(num_verts)
         self.num_edges = int(num_edges)
         self.seed      = int(seed)
+        # inputs are compared and hashed a lot (they key every DataSet)
+        self.__key = (self.prec, self.dims, self.min, self.max, self.num_verts, self.num_edges, self.seed)
+        self.__hash = hash(self.__key)
+
+    def sort_key(self):
+        return self.__key
 
     def get_wtype(self):
         if self.prec!=15 or self.min!=0 or self.max!=1:
@@ -100,33 +311,16 @@ class Input:
 
     def __cmp__(self, other):
         """Provides some ordering on Input"""
-        if self.prec != other.prec:
-            return self.prec - other.prec
-        if self.dims != other.dims:
-            return self.dims - other.dims
-        if self.min < other.min:
-            return -1
-        if self.min > other.min:
-            return 1
-        if self.max < other.max:
-            return -1
-        if self.max > other.max:
-            return 1
-        if self.num_verts != other.num_verts:
-            return self.num_verts - other.num_verts
-        if self.num_edges != other.num_edges:
-            return self.num_edges - other.num_edges
-        if self.seed < other.seed:
-            return -1
-        if self.seed > other.seed:
-            return 1
-        return 0
+        return cmp(self.__key, other.__key)
+
+    def __eq__(self, other):
+        return isinstance(other, Input) and self.__key == other.__key
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
     def __hash__(self):
-        """Simple hash on vertices, edges, and the seed"""
-        ret = self.num_verts
-        ret = ret * 31 + self.num_edges
-        return ret * 31 + self.seed
+        return self.__hash
 
     def __str__(self):
         fmt = "%s\t%u\t%s\t%s\t%u\t%u\t%s"
@@ -138,7 +332,9 @@ class Input:
         max_sp = ' ' * max_sp_len
         return "#Prec\tDim\tMin\tMax%s\t|V|\t|E|\tSeed               " % max_sp
 
-class AbstractData:
+class AbstractData(object):
+    __slots__ = ('__input',)
+
     def __init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed):
         self.__input = Input(prec, dims, min_val, max_val, num_verts, num_edges, seed)
 
@@ -148,8 +344,13 @@ class AbstractData:
     def mykey(self):
         return self.__input
 
+    def sort_key(self):
+        """Returns a key which sorts Data objects in the order __cmp__ does
+        (sorting on it is much faster than sorting with __cmp__)."""
+        return self.__input.sort_key()
+
     def __cmp__(self, other):
-        return self.input().__cmp__(other.input())
+        return self.__input.__cmp__(other.input())
 
     def __hash__(self):
         return self.input().__hash__()
@@ -162,6 +363,8 @@ class AbstractData:
 
 class InputSolution(AbstractData):
     """Data about about how to generate an input and the MST weight of that input (if known)."""
+    __slots__ = ('mst_weight',)
+
     def __init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed, mst_weight='-1'):
         AbstractData.__init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed)
         self.mst_weight = float(mst_weight)
@@ -182,6 +385,9 @@ class InputSolution(AbstractData):
         else:
             return False
 
+    def sort_key(self):
+        return (AbstractData.sort_key(self), self.mst_weight)
+
     def __cmp__(self, other):
         ret = AbstractData.__cmp__(self, other)
         if ret != 0:
@@ -224,18 +430,29 @@ class InputSolution(AbstractData):
 
 class AbstractResult(AbstractData):
     """Data about an input and a revision on which we ran a test on it."""
+    __slots__ = ('rev', 'run_num', '__key')
+
     def __init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed, rev, run_num):
         AbstractData.__init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed)
-        self.rev = str(rev)
+        # interned: a log file's results all share one revision
+        self.rev = intern(str(rev) or 'n/a')
         self.run_num = int(run_num)
-        if len(self.rev) == 0:
-            self.rev = 'n/a'
+        self.__key = (self.input(), self.run_num)
 
     def get_path(self):
         return self.get_path_to(self.rev)
 
     def mykey(self):
-        return (self.input(), self.run_num)
+        return self.__key
+
+    @staticmethod
+    def key_from_list(lst):
+        """Returns the mykey() of the result whose logged fields are lst
+        without creating the result."""
+        return (Input(lst[0], lst[1], lst[2], lst[3], lst[4], lst[5], lst[6]), int(lst[8]))
+
+    def sort_key(self):
+        return (AbstractData.sort_key(self), self.rev, self.run_num)
 
     def __cmp__(self, other):
         ret = AbstractData.__cmp__(self, other)
@@ -264,6 +481,8 @@ CORRECT = int(True)
 INCORRECT = int(False)
 class CorrResult(AbstractResult):
     """Data about an input, a revision, and whether mst correctly found the MST."""
+    __slots__ = ('corr',)
+
     def __init__(self, dims, min_val, max_val, num_verts, num_edges, seed, rev, run_num, corr, prec=1):
         AbstractResult.__init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed, rev, run_num)
         corr = int(corr)
@@ -276,6 +495,9 @@ class CorrResult(AbstractResult):
     def is_correct(self):
         return self.corr == CORRECT
 
+    def sort_key(self):
+        return (AbstractResult.sort_key(self), self.corr)
+
     def __cmp__(self, other):
         ret = AbstractResult.__cmp__(self, other)
         if ret != 0:
@@ -309,10 +531,34 @@ class CorrResult(AbstractResult):
 
 class PerfResult(AbstractResult):
     """Data about an input, a revision, and how quickly it found the MST."""
-    def __init__(self, num_verts, num_edges, seed, rev, run_num, time_sec, mst_weight, prec=1, dims=0, min_val=0, max_val=100000):
+    __slots__ = ('time_sec', 'mst_weight', 'wall_sec', 'sys_sec', 'maxrss_kb', 'minflt', 'majflt',
+                 'parse_sec', 'compute_sec', 'output_sec')
+
+    def __init__(self, num_verts, num_edges, seed, rev, run_num, time_sec, mst_weight, prec=1, dims=0, min_val=0, max_val=100000,
+                 wall_sec=None, sys_sec=None, maxrss_kb=None, minflt=None, majflt=None,
+                 parse_sec=None, compute_sec=None, output_sec=None):
+        """time_sec is user CPU time.  The remaining resource usage fields are
+        only known for results measured by timing.run_and_time (older results
+        only recorded time_sec to the hundredth of a second).  The phase times
+        (wall time spent reading the input, computing the MST and writing it)
+        are only known if mst reported them too."""
         AbstractResult.__init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed, rev, run_num)
         self.time_sec = float(time_sec)
         self.mst_weight = float(mst_weight)
+        if wall_sec is None:
+            self.wall_sec = self.sys_sec = self.maxrss_kb = self.minflt = self.majflt = None
+        else:
+            self.wall_sec = float(wall_sec)
+            self.sys_sec = float(sys_sec)
+            self.maxrss_kb = int(maxrss_kb)
+            self.minflt = int(minflt)
+            self.majflt = int(majflt)
+        if parse_sec is None:
+            self.parse_sec = self.compute_sec = self.output_sec = None
+        else:
+            self.parse_sec = float(parse_sec)
+            self.compute_sec = float(compute_sec)
+            self.output_sec = float(output_sec)
         i = self.input()
         if i.prec != 1:
             print >> sys.stderr, 'warning: performance result with precision %u (expected 1)' % i.prec
@@ -323,6 +569,9 @@ class PerfResult(AbstractResult):
         if i.max != 100000:
             print >> sys.stderr, 'warning: performance result with max_val %s (expected 100000)' % str(i.max)
 
+    def sort_key(self):
+        return (AbstractResult.sort_key(self), self.time_sec)
+
     def __cmp__(self, other):
         ret = AbstractResult.__cmp__(self, other)
         if ret != 0:
@@ -330,11 +579,30 @@ class PerfResult(AbstractResult):
         else:
             return compare_float(self.time_sec, other.time_sec)
 
+    def has_rusage(self):
+        """Returns whether wall time, sys time, max RSS and page faults are known."""
+        return self.wall_sec is not None
+
+    def has_phases(self):
+        """Returns whether the parse, compute and output times are known."""
+        return self.has_rusage() and self.parse_sec is not None
+
     def __str__(self):
-        return AbstractResult.__str__(self) + ('\t%.2f' % self.time_sec) + ('\t%.1f' % self.mst_weight)
+        if not self.has_rusage():
+            return AbstractResult.__str__(self) + ('\t%.2f' % self.time_sec) + ('\t%.1f' % self.mst_weight)
+        ret = AbstractResult.__str__(self) + ('\t%.6f' % self.time_sec) + ('\t%.1f' % self.mst_weight) + \
+            ('\t%.6f\t%.6f\t%u\t%u\t%u' % (self.wall_sec, self.sys_sec, self.maxrss_kb, self.minflt, self.majflt))
+        if self.has_phases():
+            ret += '\t%.6f\t%.6f\t%.6f' % (self.parse_sec, self.compute_sec, self.output_sec)
+        return ret
 
     def header_row(self):
-        return AbstractResult.header_row(self) + '\tTime(sec)\tMSTWeight'
+        ret = AbstractResult.header_row(self) + '\tTime(sec)\tMSTWeight'
+        if self.has_rusage():
+            ret += '\tWall(sec)\tSys(sec)\tMaxRSS(KB)\tMinFlt\tMajFlt'
+        if self.has_phases():
+            ret += '\tParse(sec)\tCompute(sec)\tOutput(sec)'
+        return ret
 
     @staticmethod
     def key(num_verts, num_edges, seed, run_num, prec=1, dims=0, min_val=0, max_val=100000):
@@ -342,10 +610,19 @@ class PerfResult(AbstractResult):
 
     @staticmethod
     def from_list(lst):
-        if(len(lst) != 11):
-            raise DataError('PerfResult expected 11 args, got %u: %s' % (len(lst), str(lst)))
-        return PerfResult(prec=lst[0], dims=lst[1], min_val=lst[2], max_val=lst[3], num_verts=lst[4],
-                          num_edges=lst[5], seed=lst[6], rev=lst[7], run_num=lst[8], time_sec=lst[9], mst_weight=lst[10])
+        if len(lst) == 11:
+            return PerfResult(prec=lst[0], dims=lst[1], min_val=lst[2], max_val=lst[3], num_verts=lst[4],
+                              num_edges=lst[5], seed=lst[6], rev=lst[7], run_num=lst[8], time_sec=lst[9], mst_weight=lst[10])
+        elif len(lst) == 16:
+            return PerfResult(prec=lst[0], dims=lst[1], min_val=lst[2], max_val=lst[3], num_verts=lst[4],
+                              num_edges=lst[5], seed=lst[6], rev=lst[7], run_num=lst[8], time_sec=lst[9], mst_weight=lst[10],
+                              wall_sec=lst[11], sys_sec=lst[12], maxrss_kb=lst[13], minflt=lst[14], majflt=lst[15])
+        elif len(lst) == 19:
+            return PerfResult(prec=lst[0], dims=lst[1], min_val=lst[2], max_val=lst[3], num_verts=lst[4],
+                              num_edges=lst[5], seed=lst[6], rev=lst[7], run_num=lst[8], time_sec=lst[9], mst_weight=lst[10],
+                              wall_sec=lst[11], sys_sec=lst[12], maxrss_kb=lst[13], minflt=lst[14], majflt=lst[15],
+                              parse_sec=lst[16], compute_sec=lst[17], output_sec=lst[18])
+        raise DataError('PerfResult expected 11, 16 or 19 args, got %u: %s' % (len(lst), str(lst)))
 
     @staticmethod
     def get_path_to(rev):
@@ -354,8 +631,134 @@ class PerfResult(AbstractResult):
             os.makedirs(path)
         return path + rev
 
+class CounterResult(AbstractResult):
+    """Data about an input, a revision, and the hardware counters (as counted
+    by perf stat) of a run which found the MST.  A counter which could not be
+    counted is -1."""
+    __slots__ = ('cycles', 'instructions', 'cache_misses', 'branch_misses')
+
+    def __init__(self, num_verts, num_edges, seed, rev, run_num, cycles, instructions, cache_misses, branch_misses,
+                 prec=1, dims=0, min_val=0, max_val=100000):
+        AbstractResult.__init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed, rev, run_num)
+        self.cycles = int(cycles)
+        self.instructions = int(instructions)
+        self.cache_misses = int(cache_misses)
+        self.branch_misses = int(branch_misses)
+
+    def get_counters(self):
+        """Returns a dict mapping each counter which was counted to its value
+        (counters are named as in timing.COUNTERS)."""
+        counts = {'cycles':self.cycles, 'instructions':self.instructions,
+                  'cache-misses':self.cache_misses, 'branch-misses':self.branch_misses}
+        for (c, v) in counts.items():
+            if v < 0:
+                del counts[c]
+        return counts
+
+    def sort_key(self):
+        return (AbstractResult.sort_key(self), self.cycles, self.instructions, self.cache_misses, self.branch_misses)
+
+    def __cmp__(self, other):
+        ret = AbstractResult.__cmp__(self, other)
+        if ret != 0:
+            return ret
+        else:
+            return cmp((self.cycles, self.instructions, self.cache_misses, self.branch_misses),
+                       (other.cycles, other.instructions, other.cache_misses, other.branch_misses))
+
+    def __str__(self):
+        return AbstractResult.__str__(self) + \
+            ('\t%d\t%d\t%d\t%d' % (self.cycles, self.instructions, self.cache_misses, self.branch_misses))
+
+    def header_row(self):
+        return AbstractResult.header_row(self) + '\tCycles\tInstructions\tCacheMisses\tBranchMisses'
+
+    @staticmethod
+    def key(num_verts, num_edges, seed, run_num, prec=1, dims=0, min_val=0, max_val=100000):
+        return (Input(prec, dims, min_val, max_val, num_verts, num_edges, seed), run_num)
+
+    @staticmethod
+    def from_list(lst):
+        if(len(lst) != 13):
+            raise DataError('CounterResult expected 13 args, got %u: %s' % (len(lst), str(lst)))
+        return CounterResult(prec=lst[0], dims=lst[1], min_val=lst[2], max_val=lst[3], num_verts=lst[4],
+                             num_edges=lst[5], seed=lst[6], rev=lst[7], run_num=lst[8], cycles=lst[9],
+                             instructions=lst[10], cache_misses=lst[11], branch_misses=lst[12])
+
+    @staticmethod
+    def get_path_to(rev):
+        path = get_path_to_project_root() + 'result/counters/'
+        if not os.path.exists(path):
+            os.makedirs(path)
+        return path + rev
+
+class MemResult(AbstractResult):
+    """Data about an input, a revision, and the memory used by a run which
+    found the MST: its max RSS and a timeline of (seconds since the start, RSS
+    in KB) samples."""
+    __slots__ = ('maxrss_kb', 'timeline')
+
+    def __init__(self, num_verts, num_edges, seed, rev, run_num, maxrss_kb, timeline,
+                 prec=1, dims=0, min_val=0, max_val=100000):
+        """timeline is a list of samples or a string formatted like
+        format_timeline's output."""
+        AbstractResult.__init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed, rev, run_num)
+        self.maxrss_kb = int(maxrss_kb)
+        if isinstance(timeline, str):
+            timeline = MemResult.parse_timeline(timeline)
+        self.timeline = [(round(t, 3), int(kb)) for (t, kb) in timeline]  # as precise as they are logged
+
+    def sort_key(self):
+        return (AbstractResult.sort_key(self), self.maxrss_kb, self.timeline)
+
+    def __cmp__(self, other):
+        ret = AbstractResult.__cmp__(self, other)
+        if ret != 0:
+            return ret
+        else:
+            return cmp((self.maxrss_kb, self.timeline), (other.maxrss_kb, other.timeline))
+
+    def __str__(self):
+        return AbstractResult.__str__(self) + ('\t%u\t%s' % (self.maxrss_kb, MemResult.format_timeline(self.timeline)))
+
+    def header_row(self):
+        return AbstractResult.header_row(self) + '\tMaxRSS(KB)\tTimeline(sec:KB,...)'
+
+    @staticmethod
+    def format_timeline(timeline):
+        """Formats timeline as a single field (- if it is empty)."""
+        if len(timeline) == 0:
+            return '-'
+        return ','.join(['%.3f:%u' % (t, kb) for (t, kb) in timeline])
+
+    @staticmethod
+    def parse_timeline(s):
+        if s == '-':
+            return []
+        return [(float(t), int(kb)) for (t, kb) in [sample.split(':') for sample in s.split(',')]]
+
+    @staticmethod
+    def key(num_verts, num_edges, seed, run_num, prec=1, dims=0, min_val=0, max_val=100000):
+        return (Input(prec, dims, min_val, max_val, num_verts, num_edges, seed), run_num)
+
+    @staticmethod
+    def from_list(lst):
+        if(len(lst) != 11):
+            raise DataError('MemResult expected 11 args, got %u: %s' % (len(lst), str(lst)))
+        return MemResult(prec=lst[0], dims=lst[1], min_val=lst[2], max_val=lst[3], num_verts=lst[4],
+                         num_edges=lst[5], seed=lst[6], rev=lst[7], run_num=lst[8], maxrss_kb=lst[9], timeline=lst[10])
+
+    @staticmethod
+    def get_path_to(rev):
+        path = get_path_to_project_root() + 'result/mem/'
+        if not os.path.exists(path):
+            os.makedirs(path)
+        return path + rev
+
 class WeightResult(AbstractResult):
     """Data about an input, a revision, and the weight of the MST."""
+    __slots__ = ('mst_weight',)
+
     def __init__(self, dims, num_verts, seed, rev, run_num, mst_weight, prec=15, min_val=0, max_val=1, num_edges=None):
         num_edges = num_edges if num_edges is not None else int(num_verts)*(int(num_verts)-1)/2
         AbstractResult.__init__(self, prec, dims, min_val, max_val, num_verts, num_edges, seed, rev, run_num)
@@ -374,6 +777,9 @@ class WeightResult(AbstractResult):
     def get_path(self):
         return self.get_path_to(self.input().get_wtype())
 
+    def sort_key(self):
+        return (AbstractResult.sort_key(self), self.mst_weight)
+
     def __cmp__(self, other):
         ret = AbstractResult.__cmp__(self, other)
         if ret != 0:
@@ -412,34 +818,158 @@ class ExtractInputFooterError(Exception):
     def __str__(self):
         return self.msg
 
-def __re_get_group(pattern, haystack, group_num=0):
-    """Returns the value associated with the requested group num in the result
-    from re.search, or raises an ExtractInputFooterError if it does not match"""
-    x = re.search(pattern, haystack)
+# matches each field of an input footer (d= is optional); the lookaheads let
+# one pass find the first occurrence of each field regardless of their order
+__FOOTER_RE = re.compile(r'(?=.*? m=(\d*))(?=.*? n=(\d*))(?=.*? min=(\d*.\d*))(?=.*? max=(\d*.\d*))' +
+                         r'(?=.*? prec=(\d*))(?=.*? seed=(\d*))(?:(?=.*? d=(\d*)))?')
+
+# matches the tags of graphs which the default generator would not reproduce
+# from their Input (e.g., those generated with generate_input.py -b)
+__VARIANT_RE = re.compile(r' ((?:gen|alg|rng)=\S*)')
+
+# number of bytes read from the end of a text graph to find its footer
+FOOTER_READ_SIZE = 1024
+
+def parse_input_footer(about, allow_variant=False):
+    """Returns the Input object described by the footer line about.  Unless
+    allow_variant is True, graphs whose footer says they were generated by a
+    non-default engine, algorithm or RNG are rejected since their Input does
+    not identify them (results on them must not be logged under it)."""
+    x = __FOOTER_RE.match(about)
     if x is None:
-        raise ExtractInputFooterError('pattern match failed for ' + pattern + ' in ' + haystack)
+        raise ExtractInputFooterError('footer is missing one of m, n, min, max, prec or seed: ' + about)
+    variant = __VARIANT_RE.findall(about)
+    if variant and not allow_variant:
+        raise ExtractInputFooterError('graph was generated with %s, so its Input does not identify it: %s' % (' '.join(variant), about))
+    (num_verts, num_edges, min_val, max_val, precision, seed, num_dims) = x.groups()
+    try:
+        num_dims = 0 if not num_dims else int(num_dims)
+        return Input(precision, num_dims, min_val, max_val, num_verts, num_edges, seed)
+    except ValueError, e:
+        raise ExtractInputFooterError('bad value in footer (%s): %s' % (e, about))
+
+def read_text_footer(input_graph):
+    """Returns the last line of the text graph input_graph (without reading
+    any more of it than necessary)."""
+    fh = open(input_graph, 'rb')
+    fh.seek(0, os.SEEK_END)
+    sz = fh.tell()
+    n = FOOTER_READ_SIZE
+    while True:
+        fh.seek(max(0, sz - n))
+        tail = fh.read().rstrip('\n')
+        i = tail.rfind('\n')
+        if i >= 0 or n >= sz:
+            fh.close()
+            return tail[i+1:]
+        n *= 4  # the last line is longer than we guessed
+
+def read_input_footer(input_graph, allow_variant=False):
+    """Reads the Input object described by input_graph's footer (see
+    parse_input_footer for allow_variant)."""
+    if is_binary_graph(input_graph):
+        # binary graphs keep the footer in their header
+        try:
+            about = read_header(input_graph).about
+        except BinaryGraphError, e:
+            raise ExtractInputFooterError(str(e))
+    elif is_gzip_graph(input_graph):
+        # compressed graphs end with the footer stored uncompressed
+        try:
+            about = read_gzip_footer(input_graph)
+        except IOError, e:
+            raise ExtractInputFooterError(str(e))
     else:
-        return x.groups()[group_num]
-
-def extract_input_footer(input_graph):
-    """Returns the Input object representing the footer info"""
-    lines = os.popen('tail -n 1 "%s" 2> /dev/null' % input_graph).readlines()
-    if len(lines) == 0:
+        try:
+            about = read_text_footer(input_graph)
+        except IOError, e:
+            raise ExtractInputFooterError(str(e))
+    if not about:
         raise ExtractInputFooterError("Failed to extract the footer from " + input_graph)
-    about = lines[0]
+    return parse_input_footer(about, allow_variant)
+
+class FooterIndex:
+    """Maps the path of an input graph to the Input described by its footer.
+    Entries are kept in memory and in an index file (one tab-separated line
+    per entry, later lines replace earlier ones) and are only used while the
+    graph's mtime and size are unchanged.  Graphs whose Input does not identify
+    them (see parse_input_footer) are never indexed."""
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.__load()
+
+    def __load(self):
+        try:
+            fh = open(self.path, 'r')
+        except IOError:
+            return  # no index yet
+        num_lines = 0
+        for line in fh:
+            num_lines += 1
+            try:
+                (fn, mtime, sz, prec, dims, min_val, max_val, num_verts, num_edges, seed) = line.rstrip('\n').split('\t')
+                self.entries[fn] = (float(mtime), int(sz), Input(prec, dims, min_val, max_val, num_verts, num_edges, seed))
+            except ValueError:
+                continue  # ignore partially written lines
+        fh.close()
 
-    try:
-        num_dims = int(__re_get_group(r' d=(\d*)', about))
-    except ExtractInputFooterError:
-        num_dims = 0
-
-    num_verts = int(__re_get_group(r' m=(\d*)', about))
-    num_edges = int(__re_get_group(r' n=(\d*)', about))
-    min_val = float(__re_get_group(r' min=(\d*.\d*)', about))
-    max_val = float(__re_get_group(r' max=(\d*.\d*)', about))
-    precision = int(__re_get_group(r' prec=(\d*)', about))
-    seed = int(__re_get_group(r' seed=(\d*)', about))
-    return Input(precision, num_dims, min_val, max_val, num_verts, num_edges, seed)
+        # rewrite the index if it is mostly stale entries
+        if num_lines > 2 * len(self.entries) + 100:
+            self.__save()
+
+    def __format_entry(self, fn, e):
+        (mtime, sz, i) = e
+        return '%s\t%r\t%u\t%u\t%u\t%r\t%r\t%u\t%u\t%u\n' % (fn, mtime, sz, i.prec, i.dims, i.min, i.max,
+                                                                  i.num_verts, i.num_edges, i.seed)
+
+    def __save(self):
+        try:
+            tmp = '%s.tmp-%u' % (self.path, os.getpid())
+            fh = open(tmp, 'w')
+            fh.write(''.join([self.__format_entry(fn, e) for (fn, e) in self.entries.iteritems()]))
+            fh.close()
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            pass  # the index is only a cache
+
+    def __append(self, fn, e):
+        try:
+            fh = open(self.path, 'a')
+            fh.write(self.__format_entry(fn, e))
+            fh.close()
+        except IOError:
+            pass  # the index is only a cache
+
+    def lookup(self, input_graph, allow_variant=False):
+        """Returns the Input described by input_graph's footer."""
+        fn = os.path.abspath(input_graph)
+        try:
+            st = os.stat(fn)
+        except OSError, e:
+            raise ExtractInputFooterError("Failed to extract the footer from %s: %s" % (input_graph, e))
+        e = self.entries.get(fn)
+        if e is not None and e[0] == st.st_mtime and e[1] == st.st_size:
+            return e[2]
+        if allow_variant:
+            return read_input_footer(input_graph, True)  # may be a variant: do not index it
+        e = (st.st_mtime, st.st_size, read_input_footer(input_graph))
+        self.entries[fn] = e
+        self.__append(fn, e)
+        return e[2]
+
+__footer_index = None
+def get_footer_index():
+    """Returns the FooterIndex which extract_input_footer uses."""
+    global __footer_index
+    if __footer_index is None:
+        __footer_index = FooterIndex(get_path_to_generated_inputs() + '.footer_index')
+    return __footer_index
+
+def extract_input_footer(input_graph, allow_variant=False):
+    """Returns the Input object representing the footer info (see
+    parse_input_footer for allow_variant)"""
+    return get_footer_index().lookup(input_graph, allow_variant)
 
 def ppinput_fast(path):
     """Returns the path to an input_graph in 'printy-printed' string."""
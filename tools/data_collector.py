@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
 from data import DataError, DataSet, InputSolution, CorrResult, PerfResult, WeightResult, get_tracked_revs
+from build_cache import BuildCache, BuildCacheError
 from data import extract_input_footer, ExtractInputFooterError
-from mstutil import get_path_to_tools_root
+from mstutil import get_path_to_mst_binary, get_path_to_tools_root, quiet_remove, random_tmp_filename
+from resultdb import read_dataset, read_keys
+from scheduler import Job, Scheduler, SchedulerError, get_default_timing_cpus, parse_cpu_list
 
 from optparse import OptionGroup, OptionParser
 import os, sys
@@ -17,7 +20,7 @@ def get_num_runs_missing_for_data(results, inpt, num_desired_runs, weight_test):
             key = (inpt, -1)
         else:
             key = (inpt, i)
-        if not results.has_key(key):
+        if key not in results:
             return num_desired_runs - i
     return 0
 
@@ -47,6 +50,40 @@ def collect_missing_weight_data(inpt, _, first_run_id, __):
     ret = os.system(get_path_to_tools_root() + cmd)
     return ret == 0
 
+def build_mst_binary(rev):
+    """Builds the mst binary for rev (None or 'current' for the working tree).
+    Returns a 2-tuple: the path to the binary (None if it could not be built)
+    and whether it is a temporary copy the caller should remove."""
+    if rev is not None and rev != 'current':
+        try:
+            return (BuildCache().get(rev), False)
+        except (BuildCacheError, IOError, OSError), e:
+            print >> sys.stderr, 'unable to build mst for %s: %s' % (rev, str(e))
+            return (None, False)
+    mst_binary = random_tmp_filename(10, 'mst')
+    cmd = 'copy_and_build_from_rev.sh %s %s > /dev/null' % (get_path_to_mst_binary(), mst_binary)
+    if os.system(get_path_to_tools_root() + cmd) != 0:
+        quiet_remove(mst_binary)
+        return (None, False)
+    return (mst_binary, True)
+
+def make_performance_jobs(inpt, rev, first_run_id, num_runs, mst_binary):
+    gen = inpt.make_args_for_generate_input()
+    cmd = get_path_to_tools_root() + 'run_test.py -k -g "%s" -r %s -B %s -n 1 -t %u'
+    return [Job(cmd % (gen, rev, mst_binary, r), 'performance rev=%s run=%u %s' % (rev, r, str(inpt)), True)
+            for r in range(first_run_id, first_run_id + num_runs)]
+
+def make_correctness_jobs(inpt, rev, first_run_id, num_runs, mst_binary, inputs_list_file_arg):
+    gen = inpt.make_args_for_generate_input()
+    cmd = get_path_to_tools_root() + 'run_test.py -k -g "%s" -r %s -B %s -n 1 -C -x -t %u%s'
+    return [Job(cmd % (gen, rev, mst_binary, r, inputs_list_file_arg), 'correctness rev=%s run=%u %s' % (rev, r, str(inpt)), False)
+            for r in range(first_run_id, first_run_id + num_runs)]
+
+def make_weight_jobs(inpt, _, first_run_id, __, mst_binary):
+    gen = inpt.make_args_for_generate_input()
+    cmd = get_path_to_tools_root() + 'run_test.py -k -g "%s" -B %s -n 1 -t %u'
+    return [Job(cmd % (gen, mst_binary, first_run_id), 'weight %s' % str(inpt), False)]
+
 def main():
     usage = """usage: %prog [options]
 Searches for missing results and uses run_test.py to collect it."""
@@ -87,6 +124,18 @@ Searches for missing results and uses run_test.py to collect it."""
                       help="collect weight data for random uniform edge weights in the range (0, 1] (requires -v)")
     parser.add_option_group(group2)
 
+    group3 = OptionGroup(parser, "Parallel Data Collection Options")
+    group3.add_option("-j", "--jobs",
+                      metavar="N", type="int",
+                      help="run N timing jobs at once, each pinned to its own CPU; correctness and weight jobs run concurrently on the remaining CPUs (at least one)")
+    group3.add_option("--cpus",
+                      metavar="LIST",
+                      help="CPUs to pin timing jobs to, e.g. 2,3 or 4-7 (implies -j) [default: N CPUs starting with CPU 1]")
+    group3.add_option("-a", "--also-correctness",
+                      action="store_true", default=False,
+                      help="collect correctness data concurrently with performance data (implies -j)")
+    parser.add_option_group(group3)
+
     (options, args) = parser.parse_args()
     if len(args) > 0:
         parser.error("too many arguments")
@@ -120,10 +169,11 @@ Searches for missing results and uses run_test.py to collect it."""
 
         input_path = InputSolution.get_path_to(15, options.dims, 0.0, 1.0)
         print 'reading inputs to run on from ' + input_path
-        input_solns = DataSet.read_from_file(InputSolution, input_path)
+        input_solns = read_dataset(InputSolution, input_path)
         revs = [None] # not revision-specific (assuming our alg is correct)
-        get_results_for_rev = lambda _ : DataSet.read_from_file(WeightResult, WeightResult.get_path_to(wtype))
+        get_results_for_rev = lambda _ : read_keys(WeightResult, WeightResult.get_path_to(wtype))
         collect_missing_data = collect_missing_weight_data
+        make_jobs = make_weight_jobs
     elif options.dims > 0 or options.edge:
         parser.error('-v is required whenever -d or -e is used')
 
@@ -142,24 +192,26 @@ Searches for missing results and uses run_test.py to collect it."""
     # prepare for a correctness data collection
     if options.correctness:
         num_on += 1
-        get_results_for_rev = lambda rev : DataSet.read_from_file(CorrResult, CorrResult.get_path_to(rev))
+        get_results_for_rev = lambda rev : read_keys(CorrResult, CorrResult.get_path_to(rev))
         options.inputs_list_file_arg = '' if options.inputs_list_file is None else ' -l ' + options.inputs_list_file
         collect_missing_data = lambda w,x,y,z: collect_missing_correctness_data(w,x,y,z,options.inputs_list_file_arg)
+        make_jobs = lambda v,w,x,y,z: make_correctness_jobs(v,w,x,y,z,options.inputs_list_file_arg)
 
     # make sure no more than 1 type of data collection was specified
     if num_on > 1:
         parser.error('at most one of -c, -d, and -e may be specified')
     elif num_on == 0:
         # prepare for a performance data collection (default if nothing else is specified)
-        get_results_for_rev = lambda rev : DataSet.read_from_file(PerfResult, PerfResult.get_path_to(rev))
+        get_results_for_rev = lambda rev : read_keys(PerfResult, PerfResult.get_path_to(rev))
         collect_missing_data = collect_missing_performance_data
+        make_jobs = make_performance_jobs
 
     # prepare the inputs and revisions for non-weight data collection schemes
     if options.num_vertices == 0:
         # get all performance inputs if we are not collecting for a single graph
         if input_solns is None:
             input_path = InputSolution.get_path_to(1, 0, 0, 100000)
-            input_solns = DataSet.read_from_file(InputSolution, input_path)
+            input_solns = read_dataset(InputSolution, input_path)
 
         # prepare the revisions to collect data for
         if options.rev is not None:
@@ -173,12 +225,82 @@ Searches for missing results and uses run_test.py to collect it."""
     # pull out just the Input object (results are keyed on these, not InputSolution)
     inputs = [i.input() for i in input_solns.dataset.values()]
 
+    # prepare to collect the data in parallel
+    if options.also_correctness:
+        if num_on > 0:
+            parser.error('-a may only be used when collecting performance data')
+        if options.jobs is None:
+            options.jobs = 1
+    if options.cpus is not None or options.jobs is not None:
+        try:
+            if options.cpus is not None:
+                cpus = parse_cpu_list(options.cpus)
+                if options.jobs is not None and options.jobs != len(cpus):
+                    parser.error('-j must match the number of CPUs given by --cpus')
+            else:
+                if options.jobs < 1:
+                    parser.error('-j must be at least 1')
+                cpus = get_default_timing_cpus(options.jobs)
+            scheduler = Scheduler(cpus)
+        except SchedulerError, e:
+            parser.error(str(e))
+        collections = [(get_results_for_rev, make_jobs)]
+        if options.also_correctness:
+            inputs_list_file_arg = '' if options.inputs_list_file is None else ' -l ' + options.inputs_list_file
+            collections.append((lambda rev : read_keys(CorrResult, CorrResult.get_path_to(rev)),
+                                lambda v,w,x,y,z: make_correctness_jobs(v,w,x,y,z,inputs_list_file_arg)))
+        if not options.list_only:
+            ret = collect_data_in_parallel(scheduler, collections, revs, inputs, options.num_runs, weight_test)
+            return 0 if ret else -1
+
     # collect the data!
     what_to_do = None if options.list_only else collect_missing_data
     ret = collect_data(revs, get_results_for_rev, inputs, what_to_do, options.num_runs, weight_test)
     return 0 if ret else -1
 
-def collect_data(revs, get_results_for_rev, inputs, collect_missing_data, num_runs, weight_test):
+def collect_data_in_parallel(scheduler, collections, revs, inputs, num_runs, weight_test):
+    """Queues a job for each missing result for each (get_results_for_rev,
+    make_jobs) in collections and then runs the jobs with scheduler.  Each
+    revision's binary is built once, before any job runs, so jobs never build
+    concurrently."""
+    binaries = {}
+    def queue_jobs(i, rev, first_run_id, n):
+        if not binaries.has_key(rev):
+            print 'building mst for rev=%s' % str(rev)
+            binaries[rev] = build_mst_binary(rev)
+        if binaries[rev][0] is None:
+            return False
+        for job in make_jobs(i, rev, first_run_id, n, binaries[rev][0]):
+            scheduler.add(job)
+        return True
+
+    try:
+        ok = True
+        for (get_results_for_rev, make_jobs) in collections:
+            ok = collect_data(revs, get_results_for_rev, inputs, queue_jobs, num_runs, weight_test, scheduler) and ok
+        if len(scheduler.jobs) == 0:
+            return ok
+
+        print 'running %u jobs (timing jobs on CPUs %s)' % (len(scheduler.jobs), ','.join([str(c) for c in scheduler.timing_cpus]))
+        failed = scheduler.run()
+    finally:
+        for (mst_binary, is_temporary) in binaries.values():
+            if is_temporary:
+                quiet_remove(mst_binary)
+
+    print INPUT_SEP
+    print 'Collected %u new results' % (len(scheduler.jobs) - len(failed))
+    if len(failed) > 0:
+        print 'Unable to collect %u results:' % len(failed)
+        for job in failed:
+            print '  ' + job.desc
+        return False
+    return ok
+
+def collect_data(revs, get_results_for_rev, inputs, collect_missing_data, num_runs, weight_test, scheduler=None):
+    """Looks for missing results and collects them with collect_missing_data.
+    If scheduler is given, collect_missing_data only queues jobs on it to
+    collect them, so the summary is left to the caller."""
     total_results_needed = 0
     results_collected = 0
     results_missing = 0
@@ -195,8 +317,8 @@ def collect_data(revs, get_results_for_rev, inputs, collect_missing_data, num_ru
                 # current rev tracks no results for non-weight data collection
                 results = {}
             else:
-                # get the previously results collected for this revision and test
-                results = get_results_for_rev(rev).dataset
+                # get the keys of the results collected for this revision and test
+                results = get_results_for_rev(rev)
             if first:
                 first = False
             else:
@@ -247,6 +369,11 @@ def collect_data(revs, get_results_for_rev, inputs, collect_missing_data, num_ru
         print out
         print INPUT_SEP
 
+    if scheduler is not None:
+        if results_collected > 0:
+            print 'Queued jobs to collect %u new results' % results_collected
+        return missing_none
+
     if results_collected > 0:
         print 'Collected %u new results' % results_collected
     if results_missing > 0:
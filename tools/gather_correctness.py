@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-from data import DataSet, InputSolution
+from data import DataSet, Input, InputSolution
 from check_output import get_and_log_mst_weight_from_checker
 from generate_input import main as generate_input
 import sys, time
@@ -15,7 +15,7 @@ ds = DataSet.read_from_file(InputSolution, logfn)
 
 # compute correctness for each input
 inputs = ds.dataset.keys() # Input objects
-inputs.sort()
+inputs.sort(key=Input.sort_key)
 on = 0
 for i in inputs:
     on += 1
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""Aggregates the hardware counters logged by run_test.py -p into dat files
+(one per tracked revision) for plotting."""
+
+from data import CounterResult, get_tracked_algs_and_revs
+from gather_data_perf import add_to_result, density_key, get_output_dat_name, make_latest, pom_key
+from gather_data_perf import DEFAULT_CI, IMPORTANT_VERTS
+from generate_input import get_density, get_percent_of_max
+from timing import COUNTERS
+from mstutil import get_path_to_project_root, quiet_remove
+from resultdb import read_dataset
+import os, sys
+
+DATA_PATH = get_path_to_project_root() + 'writeup/data/counters/'
+
+# figure out which revisions correspond to which algorithms
+TRACKED = get_tracked_algs_and_revs()
+
+# instructions per cycle is derived from each run which counted both
+IPC = 'ipc'
+
+def format_result(r):
+    """Formats the lower bound, mean and upper bound of r (NaN if r is None,
+    i.e. the counter was never counted, so gnuplot skips it)."""
+    if r is None:
+        return 'NaN\tNaN\tNaN'
+    return '%.1f\t%.1f\t%.1f' % (r.lower99, r.mean, r.upper99)
+
+def gather_counter_data(alg, rev, index, latest):
+    """Gathers counter data for a single revision of an algorithm"""
+    print 'gathering counter data for %s (rev=%s index=%u latest=%s)' % (alg, rev, index, str(latest))
+
+    # get the results
+    results = {} # maps (|V|, |E|) to a dict mapping each counter (and IPC) to a ResultAccumulator
+    num_runs = {} # maps (|V|, |E|) to the number of runs
+    ds = read_dataset(CounterResult, CounterResult.get_path_to(rev))
+    for data in ds.dataset.values():
+        key = (data.input().num_verts, data.input().num_edges)
+        num_runs[key] = num_runs.get(key, 0) + 1
+        cr = results.setdefault(key, {})
+        counts = data.get_counters()
+        for (c, v) in counts.items():
+            add_to_result(cr, c, v)
+        if counts.get('cycles', 0) > 0 and counts.has_key('instructions'):
+            add_to_result(cr, IPC, float(counts['instructions']) / counts['cycles'])
+    if len(results) == 0:
+        return 0
+
+    # compute stats for all the results
+    for cr in results.values():
+        for r in cr.values():
+            r.compute_stats()
+
+    # put the results in order
+    keys = {}
+    keys['density'] = sorted(results.keys(), key=density_key)
+    keys['pom'] = sorted(results.keys(), key=pom_key)
+
+    # generate dat files for each x-axis cross important vertex counts
+    for xaxis in keys:
+        if xaxis == 'pom':
+            computex = lambda v, e : get_percent_of_max(v, e)
+        else:
+            computex = lambda v, e : get_density(v, e)
+        header_txt = '#|V|\t|E|\t' + xaxis
+        for c in COUNTERS + (IPC,):
+            header_txt += '\t%sLower\t%s\t%sUpper' % (c, c, c)
+        header_txt += '\t#Runs  (Lower/Upper from ' + str(DEFAULT_CI) + '% CI)'
+
+        for vip in IMPORTANT_VERTS:
+            # open a file to output to
+            dat = get_output_dat_name(xaxis, alg, rev, index, vip, DATA_PATH)
+            print 'creating ' + dat
+            if latest:
+                latest_fn = make_latest(xaxis, alg, rev, index, vip, DATA_PATH)
+            try:
+                fh = open(dat, 'w')
+                print >> fh, header_txt
+                count = 0
+                for (v, e) in keys[xaxis]:
+                    if vip=='all' or vip==v:
+                        count += 1
+                        cr = results[(v, e)]
+                        line = '%u\t%u\t%.6f' % (v, e, computex(v, e))
+                        for c in COUNTERS:
+                            line += '\t' + format_result(cr.get(c))
+                        r = cr.get(IPC)
+                        line += '\tNaN\tNaN\tNaN' if r is None else '\t%.3f\t%.3f\t%.3f' % (r.lower99, r.mean, r.upper99)
+                        print >> fh, line + '\t%u' % num_runs[(v, e)]
+                fh.close()
+
+                # don't create empty files
+                if count == 0:
+                    quiet_remove(dat)
+                    if latest:
+                        quiet_remove(latest_fn)
+
+            except IOError, e:
+                print >> sys.stderr, "failed to write file: " + str(e)
+                return -1
+    return 0
+
+def main():
+    try:
+        os.makedirs(DATA_PATH + 'latest/')
+    except OSError:
+        pass
+    for alg in TRACKED.keys():
+        revs = TRACKED[alg]
+        for i in range(len(revs)):
+            gather_counter_data(alg, revs[i], i, i+1==len(revs))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""Aggregates the memory use logged by run_test.py -m into dat files (one per
+tracked revision) which can be plotted next to the perf data: the max RSS of
+each input and the RSS timeline of a run on each input."""
+
+from data import MemResult, get_tracked_algs_and_revs
+from gather_data_perf import add_to_result, density_key, get_output_dat_name, make_latest, pom_key
+from gather_data_perf import DEFAULT_CI, IMPORTANT_VERTS
+from generate_input import get_density, get_percent_of_max
+from mstutil import get_path_to_project_root, quiet_remove
+from resultdb import read_dataset
+import os, sys
+
+DATA_PATH = get_path_to_project_root() + 'writeup/data/mem/'
+TIMELINE_PATH = DATA_PATH + 'timeline/'
+
+# figure out which revisions correspond to which algorithms
+TRACKED = get_tracked_algs_and_revs()
+
+def get_timeline_dat_name(alg, rev, index, num_verts, num_edges):
+    """Gets the name of the timeline file for an input and a particular
+    revision of an algorithm"""
+    return TIMELINE_PATH + 'timeline-%s-%u-%u-%u-%s' % (alg, num_verts, num_edges, index, rev)
+
+def write_timeline_dat(alg, rev, index, data):
+    """Creates a dat file with the RSS timeline of the run data."""
+    i = data.input()
+    dat = get_timeline_dat_name(alg, rev, index, i.num_verts, i.num_edges)
+    try:
+        fh = open(dat, 'w')
+        print >> fh, '#Time(sec)\tRSS(KB)  (run %u of seed %u; max RSS %uKB)' % (data.run_num, i.seed, data.maxrss_kb)
+        for (t, kb) in data.timeline:
+            print >> fh, '%.3f\t%u' % (t, kb)
+        fh.close()
+    except IOError, e:
+        print >> sys.stderr, "failed to write file: " + str(e)
+        return -1
+    return 0
+
+def gather_mem_data(alg, rev, index, latest):
+    """Gathers memory data for a single revision of an algorithm"""
+    print 'gathering memory data for %s (rev=%s index=%u latest=%s)' % (alg, rev, index, str(latest))
+
+    # get the results
+    results = {} # maps (|V|, |E|) to ResultAccumulator of the max RSS
+    timelines = {} # maps (|V|, |E|) to the MemResult whose timeline to output
+    ds = read_dataset(MemResult, MemResult.get_path_to(rev))
+    for data in ds.dataset.values():
+        key = (data.input().num_verts, data.input().num_edges)
+        add_to_result(results, key, data.maxrss_kb)
+        # use the timeline of the first run (with the most samples, if tied)
+        old = timelines.get(key)
+        if old is None or (data.run_num, -len(data.timeline)) < (old.run_num, -len(old.timeline)):
+            timelines[key] = data
+    if len(results) == 0:
+        return 0
+
+    # compute stats for all the results
+    for r in results.values():
+        r.compute_stats()
+
+    # put the results in order
+    keys = {}
+    keys['density'] = sorted(results.keys(), key=density_key)
+    keys['pom'] = sorted(results.keys(), key=pom_key)
+
+    # generate dat files for each x-axis cross important vertex counts
+    for xaxis in keys:
+        if xaxis == 'pom':
+            computex = lambda v, e : get_percent_of_max(v, e)
+        else:
+            computex = lambda v, e : get_density(v, e)
+        header_txt = '#|V|\t|E|\t' + xaxis + '\tLower\tAverage\tUpper\t#Runs  (max RSS in KB; Lower/Upper from ' + str(DEFAULT_CI) + '% CI)'
+
+        for vip in IMPORTANT_VERTS:
+            # open a file to output to
+            dat = get_output_dat_name(xaxis, alg, rev, index, vip, DATA_PATH)
+            print 'creating ' + dat
+            if latest:
+                latest_fn = make_latest(xaxis, alg, rev, index, vip, DATA_PATH)
+            try:
+                fh = open(dat, 'w')
+                print >> fh, header_txt
+                count = 0
+                for (v, e) in keys[xaxis]:
+                    if vip=='all' or vip==v:
+                        count += 1
+                        r = results[(v, e)]
+                        x = computex(v, e)
+                        print >> fh, '%u\t%u\t%.6f\t%.1f\t%.1f\t%.1f\t%u' % (v, e, x, r.lower99, r.mean, r.upper99, len(r.values))
+                fh.close()
+
+                # don't create empty files
+                if count == 0:
+                    quiet_remove(dat)
+                    if latest:
+                        quiet_remove(latest_fn)
+
+            except IOError, e:
+                print >> sys.stderr, "failed to write file: " + str(e)
+                return -1
+
+    # the RSS timeline of each input
+    for data in timelines.values():
+        if write_timeline_dat(alg, rev, index, data) != 0:
+            return -1
+    return 0
+
+def main():
+    for path in (DATA_PATH + 'latest/', TIMELINE_PATH):
+        try:
+            os.makedirs(path)
+        except OSError:
+            pass
+    for alg in TRACKED.keys():
+        revs = TRACKED[alg]
+        for i in range(len(revs)):
+            gather_mem_data(alg, revs[i], i, i+1==len(revs))
+
+if __name__ == "__main__":
+    sys.exit(main())
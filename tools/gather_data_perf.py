@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
-from data import DataSet, PerfResult, get_tracked_algs_and_revs
+from data import PerfResult, get_tracked_algs_and_revs
 from generate_input import get_density, get_percent_of_max
 from result import ResultAccumulator
+from result_table import aggregate, load_table
+from timing import PHASES
 from mstutil import get_path_to_project_root, quiet_remove
 import os, sys
 
@@ -17,69 +19,56 @@ IMPORTANT_VERTS = [250, 700, 4473, 'all']
 # confidence interval to use
 DEFAULT_CI = 99
 
-def get_output_dat_name(xaxis, alg, rev, index, num_verts):
+# the columns to group results of the same size by
+BY_SIZE = ('num_verts', 'num_edges')
+
+def get_output_dat_name(xaxis, alg, rev, index, num_verts, data_path=DATA_PATH):
     """Gets the name of an output file for a particular revision of an algorithm"""
-    return DATA_PATH + '%s-%s-%s-%u-%s' % (xaxis, alg, str(num_verts), index, rev)
+    return data_path + '%s-%s-%s-%u-%s' % (xaxis, alg, str(num_verts), index, rev)
 
-def make_latest(xaxis, alg, rev, index, num_verts):
+def make_latest(xaxis, alg, rev, index, num_verts, data_path=DATA_PATH):
     """Updates the symlink which points to the latest data file for an algorithm"""
-    o = '../' + get_output_dat_name(xaxis, alg, rev, index, num_verts)[len(DATA_PATH):]
-    linkname = DATA_PATH + 'latest/%s-%s-%s-latest' % (xaxis, alg, str(num_verts))
+    o = '../' + get_output_dat_name(xaxis, alg, rev, index, num_verts, data_path)[len(data_path):]
+    linkname = data_path + 'latest/%s-%s-%s-latest' % (xaxis, alg, str(num_verts))
     quiet_remove(linkname)
     os.symlink(o, linkname)
     return linkname
 
-def numeric_compare(a, b):
-    if a < b:
-        return -1
-    elif b > a:
-        return 1
+def density_key(ve):
+    """Sort key which orders (|V|, |E|) pairs by density."""
+    return get_density(ve[0], ve[1])
+
+def pom_key(ve):
+    """Sort key which orders (|V|, |E|) pairs by percent of max edges."""
+    return get_percent_of_max(ve[0], ve[1])
+
+def add_to_result(results, key, value):
+    """Adds value to the ResultAccumulator for key in results."""
+    result = results.get(key)
+    if result is None:
+        result = ResultAccumulator(value)
+        result.defaultCI = DEFAULT_CI
+        results[key] = result
     else:
-        return 0
-
-def density_compare(a, b):
-    (av, ae) = a
-    (bv, be) = b
-    da = get_density(av, ae)
-    db = get_density(bv, be)
-    return numeric_compare(da, db)
-
-def pom_compare(a, b):
-    (av, ae) = a
-    (bv, be) = b
-    da = get_percent_of_max(av, ae)
-    db = get_percent_of_max(bv, be)
-    return numeric_compare(da, db)
+        result.add_data(value)
 
 def gather_perf_data(alg, rev, index, latest):
     """Gathers performance data for a single revision of an algorithm"""
     print 'gathering perf data for %s (rev=%s index=%u latest=%s)' % (alg, rev, index, str(latest))
 
-    # get the results
-    results = {} # maps (|V|, |E|) to ResultAccumulator
-    ds = DataSet.read_from_file(PerfResult, PerfResult.get_path_to(rev))
-    for data in ds.dataset.values():
-        key = (data.input().num_verts, data.input().num_edges)
-        result = results.get(key)
-        if result is None:
-            result = ResultAccumulator(data.time_sec)
-            result.defaultCI = DEFAULT_CI
-            results[key] = result
-        else:
-            result.add_data(data.time_sec)
+    # get the results and compute stats for them
+    table = load_table(PerfResult, PerfResult.get_path_to(rev))
+    results = aggregate(table, BY_SIZE, 'time_sec', DEFAULT_CI).to_dict() # maps (|V|, |E|) to GroupStats
+    phase_results = {} # maps (|V|, |E|) to a dict mapping each phase to a GroupStats
+    for phase in PHASES:
+        for (key, r) in aggregate(table, BY_SIZE, phase + '_sec', DEFAULT_CI, 'parse_sec').to_dict().items():
+            phase_results.setdefault(key, {})[phase] = r
 
-    # put the results in order
-    keys_density = results.keys()
-    keys_density.sort(density_compare)
-    keys_pom = results.keys()
-    keys_pom.sort(pom_compare)
+    # put the results in order (inputs with the same x value by |V| and |E|)
+    sizes = sorted(results.keys())
     keys = {}
-    keys['density'] = keys_density
-    keys['pom'] = keys_pom
-
-    # compute stats for all the results
-    for num_verts in results.keys():
-        results[num_verts].compute_stats()
+    keys['density'] = sorted(sizes, key=density_key)
+    keys['pom'] = sorted(sizes, key=pom_key)
 
     # generate dat files for each x-axis cross important vertex counts
     for xaxis in keys:
@@ -109,7 +98,7 @@ def gather_perf_data(alg, rev, index, latest):
                         count += 1
                         r = results[(v, e)]
                         x = computex(v, e)
-                        print >> fh, '%u\t%u\t%.6f\t%.3f\t%.3f\t%.3f\t%u' % (v, e, x, r.lower99, r.mean, r.upper99, len(r.values))
+                        print >> fh, '%u\t%u\t%.6f\t%.3f\t%.3f\t%.3f\t%u' % (v, e, x, r.lower, r.mean, r.upper, r.n)
                 fh.close()
 
                 # don't create empty files
@@ -121,6 +110,47 @@ def gather_perf_data(alg, rev, index, latest):
             except IOError, e:
                 print sys.stderr, "failed to write file: " + str(e)
                 return -1
+
+            # the time spent in each phase (when mst reported it)
+            if len(phase_results) > 0:
+                if write_phase_dat(xaxis, alg, rev, index, vip, latest, keys[xaxis], phase_results, computex) != 0:
+                    return -1
+    return 0
+
+def write_phase_dat(xaxis, alg, rev, index, vip, latest, keys, phase_results, computex):
+    """Creates a dat file with the parse, compute and output times of each
+    input for a single revision of an algorithm."""
+    pxaxis = 'phases-' + xaxis
+    dat = get_output_dat_name(pxaxis, alg, rev, index, vip)
+    print 'creating ' + dat
+    if latest:
+        latest_fn = make_latest(pxaxis, alg, rev, index, vip)
+    try:
+        fh = open(dat, 'w')
+        header_txt = '#|V|\t|E|\t' + xaxis
+        for phase in PHASES:
+            header_txt += '\t%sLower\t%s\t%sUpper' % (phase, phase, phase)
+        print >> fh, header_txt + '\t#Runs  (Lower/Upper from ' + str(DEFAULT_CI) + '% CI)'
+        count = 0
+        for (v, e) in keys:
+            if (vip=='all' or vip==v) and phase_results.has_key((v, e)):
+                count += 1
+                pr = phase_results[(v, e)]
+                line = '%u\t%u\t%.6f' % (v, e, computex(v, e))
+                for phase in PHASES:
+                    r = pr[phase]
+                    line += '\t%.6f\t%.6f\t%.6f' % (r.lower, r.mean, r.upper)
+                print >> fh, line + '\t%u' % pr[PHASES[0]].n
+        fh.close()
+
+        # don't create empty files
+        if count == 0:
+            quiet_remove(dat)
+            if latest:
+                quiet_remove(latest_fn)
+    except IOError, e:
+        print sys.stderr, "failed to write file: " + str(e)
+        return -1
     return 0
 
 def main():
@@ -1,23 +1,17 @@
 #!/usr/bin/env python
 
-from data import DataSet, WeightResult
-from result import ResultAccumulator
+from data import WeightResult
+from result_table import aggregate, load_table
 from mstutil import get_path_to_project_root
 import os, sys
 
 DATA_PATH = get_path_to_project_root() + 'writeup/data/weight/'
 
 def gather_weight_data(wtype):
-    # get the results
-    results = {} # maps |V| to ResultAccumulator
-    ds = DataSet.read_from_file(WeightResult, WeightResult.get_path_to(wtype))
-    for data in ds.dataset.values():
-        result = results.get(data.input().num_verts)
-        if result is None:
-            result = ResultAccumulator(data.mst_weight)
-            results[data.input().num_verts] = result
-        else:
-            result.add_data(data.mst_weight)
+    # get the results and compute stats for each |V| (with ResultAccumulator's
+    # default confidence level, which this script has always used)
+    table = load_table(WeightResult, WeightResult.get_path_to(wtype))
+    results = aggregate(table, ('num_verts',), 'mst_weight', 9995)
 
     try:
         # open a file to output to
@@ -25,13 +19,9 @@ def gather_weight_data(wtype):
 
         # compute relevant stats and output them
         print >> fh, '#|V|\tLower\tAverage\tUpper  (Lower/Upper from 99% CI)'
-        keys = results.keys()
-        keys.sort()
-        for num_verts in keys:
-            r = results[num_verts]
-            r.compute_stats()
-            if len(r.values) > 1:
-                print >> fh, '%u\t%.3f\t%.3f\t%.3f\t%u' % (num_verts, r.lower99, r.mean, r.upper99, len(r.values))
+        for i in range(len(results)):
+            if results.n[i] > 1:
+                print >> fh, '%u\t%.3f\t%.3f\t%.3f\t%u' % (results.keys[i][0], results.lower[i], results.mean[i], results.upper[i], results.n[i])
         fh.close()
         return 0
     except IOError, e:
@@ -1,19 +1,50 @@
 #!/usr/bin/env python
 
+from binary_graph import BinaryGraphWriter, EdgeRecordWriter
 from check_output import CheckerError, compute_mst_weight
 from data import DataSet, InputSolution, ppinput
-from math import sqrt
-from mstutil import die, get_path_to_generated_inputs
+from gzip_graph import DEFAULT_LEVEL, GzipGraphWriter, open_gzip_graph
+from itertools import imap, product
+from math import ceil, gamma, log, pi, sqrt
+from mstutil import die, get_path_to_generated_inputs, quiet_remove, random_tmp_filename
+from multiprocessing import Pool
 from optparse import OptionGroup, OptionParser
 from os import urandom
 from random import Random
+from rng import CounterRandom, CounterRng, get_stream_key, random_at
+from shutil import copyfileobj
 from struct import unpack
 from time import strftime
 import heapq, os, sys
 
+try:
+    import numpy
+except ImportError:
+    numpy = None  # only needed by the batched and sharded engines (-b, -j)
+
 __RND_SEED = None
+__RNG = 'legacy'
 __rnd = None
 
+# number of edges the batched engine formats and writes at a time
+BATCH_SIZE = 1 << 16
+
+# approximate number of edges in each shard generated by the sharded engine
+# (-j); shard boundaries depend only on the size of the graph
+SHARD_SIZE = 1 << 20
+
+# stream of the counter-based generator (--rng splitmix) which edge weights
+# are drawn from by the -b and -j engines (distinct from the shard streams)
+WEIGHT_STREAM = 1 << 32
+
+# version of the generators: bump this whenever a change alters the graph
+# generated for any given arguments (it is part of input_cache.py's keys)
+GENERATOR_VERSION = 1
+
+# cost of visiting one pair in the dense generation algorithm relative to the
+# cost of drawing one random pair in the sparse generation algorithm
+DENSE_VISIT_COST = 0.25
+
 def get_density(num_verts, num_edges):
     """Returns the edge to vertex ratio (float)"""
     return num_edges / float(num_verts)
@@ -29,20 +60,37 @@ def get_percent_of_max(num_verts, num_edges):
         return float(num_edges_scaled) / num_edge_choices
 
 def print_input_header(num_verts, num_edges, out):
+    if isinstance(out, BinaryGraphWriter):
+        out.begin(num_verts, num_edges)
+        return
     print >> out, '%u' % num_verts
     print >> out, '%u' % num_edges
 
 def print_input_footer(num_verts, num_edges, about, out):
     """End with a comment in the input file describing it.  It should not be
-    read by mst since it doesn't expect lines after the last edge."""
+    read by mst since it doesn't expect lines after the last edge.  Binary
+    graphs keep the comment in their header instead."""
     density = get_density(num_verts, num_edges)
     pom = get_percent_of_max(num_verts, num_edges)
-    print >> out, '# %s: %s density=%.2f pom=%.2f' % (strftime('%A %Y-%b-%d at %H:%M:%S'), about, density, pom)
+    footer = '# %s: %s density=%.2f pom=%.2f' % (strftime('%A %Y-%b-%d at %H:%M:%S'), about, density, pom)
+    if isinstance(out, BinaryGraphWriter):
+        out.finish(footer)
+    elif isinstance(out, GzipGraphWriter):
+        out.write_footer(footer)
+    else:
+        print >> out, footer
+
+def print_edge(u, v, w, fmt, out):
+    """Writes the edge (u, v) with weight w to out."""
+    if isinstance(out, EdgeRecordWriter):
+        out.add_edge(u, v, w)
+    else:
+        print >> out, fmt % (u, v, w)
 
 def edges_in_complete_undirected_graph(num_verts):
     return (num_verts * (num_verts - 1)) / 2
 
-def gen_random_edge_lengths(num_verts, num_edges, min_edge_len, max_edge_len, precision, out):
+def gen_random_edge_lengths(num_verts, num_edges, min_edge_len, max_edge_len, precision, out, alg='sparse'):
     about = "m=%d n=%d min=%.1f max=%.1f prec=%d seed=%s" % (num_verts, num_edges,
                                                              min_edge_len, max_edge_len, precision, str(__RND_SEED))
     print_input_header(num_verts, num_edges, out)
@@ -52,7 +100,7 @@ def gen_random_edge_lengths(num_verts, num_edges, min_edge_len, max_edge_len, pr
     if edges_in_complete_undirected_graph(num_verts) == num_edges:
         for i in range(0, num_verts):
             for j in range(i+1, num_verts):
-                print >> out, fmt % (i+1, j+1, __rnd.uniform(min_edge_len, max_edge_len))
+                print_edge(i+1, j+1, __rnd.uniform(min_edge_len, max_edge_len), fmt, out)
         return about
 
     # handle the non-complete graph case
@@ -67,7 +115,7 @@ def gen_random_edge_lengths(num_verts, num_edges, min_edge_len, max_edge_len, pr
         # pick a random vertex in the connected part of the graph to connect to
         j = __rnd.randint(0, i-1)
         spanning_tree[(i,j)] = True
-        print >> out, fmt % (i+1, j+1, __rnd.uniform(min_edge_len, max_edge_len))
+        print_edge(i+1, j+1, __rnd.uniform(min_edge_len, max_edge_len), fmt, out)
 
     # account for the edges we just added
     num_edges -= (num_verts - 1)
@@ -76,96 +124,578 @@ def gen_random_edge_lengths(num_verts, num_edges, min_edge_len, max_edge_len, pr
 
     # 2) randomly add any remaining edges between unconnected vertices
 
-    # We have two algorithms - one specialized for dense matrices, the other for
-    # sparse matrices.  The running times are (let Z = (V * (V - 1)):
-    #     dense:  Z * log(Z) + E * log(Z) = O(V^2*log(V^2))
-    #     sparse: E * Z / (Z - 2 * E)     = O(E*V^2 / (V^2 - E))
+    # We have two algorithms - one specialized for dense graphs, the other for
+    # sparse graphs.  Let Z = V * (V - 1) / 2, T = V - 1 (the spanning tree
+    # edges) and N = the number of remaining edges.
+    #     sparse: draw random pairs until N new ones are found.  While i pairs
+    #             are taken, a draw succeeds with probability 1 - i / Z, so
+    #             the expected number of draws is the sum of Z / (Z - i) for
+    #             i = T to T + N - 1, i.e., Z * (H(Z - T) - H(Z - T - N)).
+    #     dense:  draw the X = Z - T - N pairs to leave out the same way and
+    #             then visit all Z pairs: Z * (H(Z - T) - H(Z - T - X)) + c*Z.
     #
-    # Empirically, sparse is faster than dense unless the density is less
-    # than about 0.5.
-    #
-    # However, the above estimate for sparse is actually a bit loose - it
-    # assumes every edge is as hard to insert as the last edge being inserted.
-    # The tight upper bound would be:
-    #     sparse: sum from i=0 to i=E-1 (inclusive) over 1 / prob_success
-    #             prob_success = 1 - 2 * i / (V^2 - V)
-    #
-    # I do not know how to reduce this summation so we can compare it with the
-    # dense algorithm, but empirically it is this tight bound for sparse is
-    # faster that the dense algorithm for all densities.
-
-    # Assume the loose upper-bound is correct and switch over to the dense
-    # algorithm when the density is quite high (empirically measured).
-    density = get_percent_of_max(num_verts, num_edges)
-    if density > 0.5 and False:
-        heap = []
-
-        # put all edges in the heap with some random key
-        for i in range(0, num_verts):
-            for j in range(i+1, num_verts):
-                heapq.heappush(heap, (__rnd.random(), i, j))
-
-        # use the minimum edges in the heap as the edges in our graph
-        while num_edges > 0:
-            (_, i, j) = heapq.heappop(heap)
-            if not spanning_tree.has_key((i, j)):
-                num_edges -= 1
-                print >> out, fmt % (i+1, j+1, __rnd.uniform(min_edge_len, max_edge_len))
+    # The sparse draws blow up as N approaches Z - T, while the dense draws
+    # stay below 2 * X since fewer than half the pairs are ever left out.
+    # Neither needs more memory than a hashtable of the chosen pairs (the old
+    # dense algorithm pushed all Z pairs onto a heap).  Pick whichever the
+    # model above expects to do less work (c is DENSE_VISIT_COST, measured
+    # relative to the cost of one draw).  The sparse algorithm is the default
+    # since it is the one which reproduces the graphs of our logged seeds.
+    if choose_generation_alg(alg, num_verts, num_verts - 1 + num_edges) == 'dense':
+        about += ' alg=dense'
+        # choose which of the pairs to leave out instead (fewer than half of
+        # them) and then emit every pair which is neither excluded nor in the
+        # spanning tree we already printed
+        skip = spanning_tree
+        num_excluded = edges_in_complete_undirected_graph(num_verts) - (num_verts - 1) - num_edges
+        while num_excluded > 0:
+            (i, j) = __pick_random_pair(num_verts)
+            if not skip.has_key((i, j)):
+                skip[(i, j)] = True
+                num_excluded -= 1
+        for i in range(1, num_verts):
+            for j in range(0, i):
+                if not skip.has_key((i, j)):
+                    print_edge(i+1, j+1, __rnd.uniform(min_edge_len, max_edge_len), fmt, out)
     else:
         while num_edges > 0:
-            # choose random vertices for an edge to connect
-            r1 = __rnd.randint(0, num_verts - 1)
-            r2 = __rnd.randint(0, num_verts - 1)
-            if r1 > r2:
-                i = r1
-                j = r2
-            else:
-                i = r2
-                j = r1
             # add the edge if it is new
-            if i!=j and not spanning_tree.has_key((i, j)):
+            (i, j) = __pick_random_pair(num_verts)
+            if not spanning_tree.has_key((i, j)):
                 spanning_tree[(i, j)] = True
-                print >> out, fmt % (i+1, j+1, __rnd.uniform(min_edge_len, max_edge_len))
+                print_edge(i+1, j+1, __rnd.uniform(min_edge_len, max_edge_len), fmt, out)
                 num_edges -= 1
 
     return about
 
-def gen_random_vertex_positions(num_verts, num_edges, num_dims, min_pos, max_pos, precision, out):
-    if edges_in_complete_undirected_graph(num_verts) != num_edges:
-        die('not yet implemented error: gen_random_vertex_positions only works for generating complete graphs')
+def __pick_random_pair(num_verts):
+    """Returns a random pair of distinct vertices (i, j) with i > j."""
+    while True:
+        # choose random vertices for an edge to connect
+        r1 = __rnd.randint(0, num_verts - 1)
+        r2 = __rnd.randint(0, num_verts - 1)
+        if r1 > r2:
+            return (r1, r2)
+        elif r2 > r1:
+            return (r2, r1)
+
+def harmonic(n):
+    """Returns an approximation of the nth harmonic number (H(0) = 0)."""
+    if n <= 0:
+        return 0.0
+    return log(n) + 0.5772156649 + 1.0 / (2 * n)
+
+def get_expected_draws(num_pairs, num_taken, num_wanted):
+    """Returns the expected number of random pairs which must be drawn to find
+    num_wanted new pairs when num_taken of num_pairs are already taken."""
+    num_free = num_pairs - num_taken
+    return num_pairs * (harmonic(num_free) - harmonic(num_free - num_wanted))
+
+def estimate_sparse_work(num_verts, num_edges):
+    """Estimates the work done to generate a graph by rejection sampling each
+    edge not in the spanning tree."""
+    z = edges_in_complete_undirected_graph(num_verts)
+    return get_expected_draws(z, num_verts - 1, num_edges - (num_verts - 1))
+
+def estimate_dense_work(num_verts, num_edges):
+    """Estimates the work done to generate a graph by rejection sampling the
+    pairs to leave out and then visiting every pair."""
+    z = edges_in_complete_undirected_graph(num_verts)
+    num_excluded = z - num_edges
+    return get_expected_draws(z, num_verts - 1, num_excluded) + DENSE_VISIT_COST * z
+
+def choose_generation_alg(alg, num_verts, num_edges):
+    """Returns 'sparse' or 'dense'.  If alg is 'auto', the algorithm which is
+    expected to do less work for a graph of this size is chosen."""
+    if alg != 'auto':
+        return alg
+    elif estimate_dense_work(num_verts, num_edges) < estimate_sparse_work(num_verts, num_edges):
+        return 'dense'
+    else:
+        return 'sparse'
+
+def make_batch_rng(seed, rng='legacy', stream=0):
+    """Returns a generator for stream number stream of seed: a NumPy
+    RandomState seeded with all 64 bits of seed (and the stream, if not 0) for
+    the legacy generator, otherwise a counter-based CounterRng."""
+    if rng == 'splitmix':
+        return CounterRng(seed, stream)
+    elif stream == 0:
+        return numpy.random.RandomState([seed & 0xFFFFFFFF, seed >> 32])
+    else:
+        return numpy.random.RandomState([seed & 0xFFFFFFFF, seed >> 32, stream])
+
+def draw_edge_weights(rnd, his, los, min_val, max_val):
+    """Returns random weights for the edges (his[k], los[k]) with his > los
+    (0-based).  With a counter-based generator, each weight only depends on
+    the seed and the edge (see get_edge_weight) rather than on the order in
+    which the edges are generated."""
+    if isinstance(rnd, CounterRng):
+        wrnd = CounterRng(rnd.seed, WEIGHT_STREAM)
+        return wrnd.uniform_at(pairs_before_row(his) + los, min_val, max_val)
+    else:
+        return rnd.uniform(min_val, max_val, len(his))
+
+def get_edge_weight(seed, u, v, min_val, max_val):
+    """Returns the weight which the -b and -j engines give the edge (u, v)
+    (1-based, as in the output) with --rng splitmix, i.e. any one edge's
+    weight can be recomputed without generating the graph."""
+    (i, j) = (max(u, v) - 1, min(u, v) - 1)
+    return min_val + (max_val - min_val) * random_at(get_stream_key(seed, WEIGHT_STREAM), pairs_before_row(i) + j)
+
+def write_edges(us, vs, ws, fmt, out):
+    """Writes the edges (us[k], vs[k], ws[k]) to out in BATCH_SIZE chunks
+    rather than with one print per edge."""
+    if isinstance(out, EdgeRecordWriter):
+        out.add_edges(us, vs, ws)
+        return
+    for s in xrange(0, len(us), BATCH_SIZE):
+        e = s + BATCH_SIZE
+        rows = zip(us[s:e].tolist(), vs[s:e].tolist(), ws[s:e].tolist())
+        out.write(''.join([fmt % r + '\n' for r in rows]))
+
+def iter_upper_triangle_blocks(num_verts, max_pairs):
+    """Yields (is, js) arrays which, in order, cover every pair i < j of a
+    num_verts vertex graph in row-major order.  No block has more than
+    max_pairs pairs (long rows are split across blocks)."""
+    i = 0
+    j = 1
+    while i < num_verts - 1:
+        ilist = []
+        jlist = []
+        n = 0
+        while i < num_verts - 1 and n < max_pairs:
+            take = min(num_verts - j, max_pairs - n)
+            ilist.append(numpy.repeat(numpy.int64(i), take))
+            jlist.append(numpy.arange(j, j + take, dtype=numpy.int64))
+            n += take
+            j += take
+            if j == num_verts:
+                i += 1
+                j = i + 1
+        yield (numpy.concatenate(ilist), numpy.concatenate(jlist))
+
+def sample_new_edge_keys(rnd, num_verts, keys, num_new):
+    """Returns keys with num_new distinct random edge keys appended to it.  An
+    edge (i, j) with i > j has key i * num_verts + j.  The new keys are drawn
+    in blocks and duplicates are removed by sorting, so the only per-edge
+    work done in Python is the final formatting."""
+    total = len(keys) + num_new
+    num_pairs = edges_in_complete_undirected_graph(num_verts)
+    while len(keys) < total:
+        # draw enough pairs to cover self-loops and collisions w/ known edges
+        need = total - len(keys)
+        free = 1.0 - len(keys) / float(num_pairs)
+        n = int(need / free * 1.1) + 64
+        r1 = rnd.randint(0, num_verts, n).astype(numpy.int64)
+        r2 = rnd.randint(0, num_verts, n).astype(numpy.int64)
+        ok = r1 != r2
+        r1 = r1[ok]
+        r2 = r2[ok]
+        cand = numpy.maximum(r1, r2) * num_verts + numpy.minimum(r1, r2)
+        keys = merge_new_keys(keys, cand, total)
+    return keys
+
+def merge_new_keys(keys, cand, total):
+    """Returns keys followed by the distinct candidate keys not already in keys
+    (in the order they were drawn), truncated to total keys."""
+    # keep the first occurrence of each key (existing keys come first so they
+    # are always kept) and preserve the order they were drawn in
+    merged = numpy.concatenate((keys, cand))
+    (_, first) = numpy.unique(merged, return_index=True)
+    first.sort()
+    return merged[first[:total]]
+
+def sample_new_pair_indices(rnd, lo, hi, indices, num_new):
+    """Like sample_new_edge_keys, but draws lower-triangle pair indices (see
+    pairs_before_row) uniformly from [lo, hi)."""
+    total = len(indices) + num_new
+    while len(indices) < total:
+        need = total - len(indices)
+        free = 1.0 - len(indices) / float(hi - lo)
+        n = int(need / free * 1.1) + 64
+        cand = lo + (rnd.random_sample(n) * (hi - lo)).astype(numpy.int64)
+        indices = merge_new_keys(indices, cand, total)
+    return indices
+
+def pairs_before_row(i):
+    """Returns the number of pairs (i', j) with j < i' < i, i.e., the index of
+    the first pair of row i when the lower triangle is laid out row by row.
+    Works on ints and on NumPy arrays."""
+    return i * (i - 1) // 2
+
+def pair_index_to_vertices(ts):
+    """Inverts pairs_before_row: returns arrays (is, js) with js < is for the
+    lower-triangle pair indices ts."""
+    i = ((1 + numpy.sqrt(1 + 8.0 * ts)) / 2).astype(numpy.int64)
+    # correct for any floating point error in the square root
+    i -= pairs_before_row(i) > ts
+    i += pairs_before_row(i + 1) <= ts
+    return (i, ts - pairs_before_row(i))
+
+def get_shard_bounds(num_verts, num_edges):
+    """Splits the rows of the lower triangle into consecutive blocks which are
+    each expected to hold about SHARD_SIZE edges.  Returns the list of the
+    first row of each block followed by num_verts.  The blocks only depend on
+    the size of the graph (not on how many processes generate them)."""
+    num_shards = max(1, int(ceil(num_edges / float(SHARD_SIZE))))
+    if num_shards == 1:
+        return [0, num_verts]
+
+    # row i > 0 holds one spanning tree edge and a share of the other edges
+    # proportional to its other i - 1 pairs
+    num_pairs = edges_in_complete_undirected_graph(num_verts)
+    frac = (num_edges - (num_verts - 1)) / float(num_pairs - (num_verts - 1))
+    rows = numpy.arange(num_verts, dtype=numpy.float64)
+    cost = numpy.cumsum(numpy.where(rows > 0, 1 + frac * (rows - 1), 0))
+    cuts = numpy.searchsorted(cost, numpy.arange(1, num_shards) * (cost[-1] / num_shards))
+    return [0] + sorted(set([c for c in cuts.tolist() if 0 < c < num_verts])) + [num_verts]
+
+def get_free_pairs_in_rows(a, b):
+    """Returns the number of pairs in rows [a, b) which are not spanning tree
+    edges (rows 1 and up each have one tree edge)."""
+    return pairs_before_row(b) - pairs_before_row(a) - max(0, b - max(a, 1))
+
+def allocate_shard_edges(rnd, bounds, num_new):
+    """Randomly splits num_new non-tree edges between the shards in proportion
+    to how many free pairs each holds (a multinomial split which is clamped so
+    no shard gets more edges than it has free pairs)."""
+    avail = [get_free_pairs_in_rows(bounds[s], bounds[s+1]) for s in range(len(bounds) - 1)]
+    left = sum(avail)
+    counts = []
+    for n in avail:
+        left -= n
+        if n + left == 0 or num_new == 0:
+            k = 0
+        else:
+            k = int(rnd.binomial(num_new, n / float(n + left)))
+        k = max(min(k, n, num_new), num_new - left)
+        counts.append(k)
+        num_new -= k
+    return counts
+
+# vertex positions shared (by forking) with the processes which generate shards
+__shard_coords = None
+
+def gen_shard(spec):
+    """Generates the edges in rows [a, b) of the lower triangle and writes them
+    to the file part_fn (which is returned).  The shard has its own random
+    stream derived from the seed and the shard's number.  If rec is not None,
+    it holds the (precision, weight type) of binary edge records to write."""
+    (seed, rng, shard, a, b, num_new, alg, min_val, max_val, fmt, rec, part_fn) = spec
+    rnd = make_batch_rng(seed, rng, shard + 1)
+    lo = pairs_before_row(a)
+    hi = pairs_before_row(b)
+    out = open(part_fn, 'wb')
+    if rec is not None:
+        out = EdgeRecordWriter(out, rec[0], rec[1])
+
+    # vertex positions: every pair is an edge weighted by its length
+    if __shard_coords is not None:
+        for s in xrange(lo, hi, BATCH_SIZE):
+            (us, vs) = pair_index_to_vertices(numpy.arange(s, min(s + BATCH_SIZE, hi), dtype=numpy.int64))
+            d = __shard_coords[us] - __shard_coords[vs]
+            write_edges(us + 1, vs + 1, numpy.sqrt((d * d).sum(axis=1)), fmt, out)
+        out.close()
+        return part_fn
+
+    # 1) connect each vertex to a random one of the previous vertices
+    children = numpy.arange(max(a, 1), b, dtype=numpy.int64)
+    parents = (rnd.random_sample(len(children)) * children).astype(numpy.int64)
+    tree = pairs_before_row(children) + parents
+
+    # 2) add this shard's share of the remaining edges
+    num_free = hi - lo - len(tree)
+    if num_new == num_free or alg == 'dense' or (alg == 'auto' and 2 * num_new > num_free):
+        # choose the pairs to leave out and keep every other pair
+        skip = sample_new_pair_indices(rnd, lo, hi, tree, num_free - num_new)[len(tree):]
+        skip.sort()
+        for s in xrange(lo, hi, BATCH_SIZE):
+            ts = numpy.arange(s, min(s + BATCH_SIZE, hi), dtype=numpy.int64)
+            if len(skip) > 0:
+                pos = numpy.minimum(numpy.searchsorted(skip, ts), len(skip) - 1)
+                ts = ts[skip[pos] != ts]
+            (us, vs) = pair_index_to_vertices(ts)
+            write_edges(us + 1, vs + 1, draw_edge_weights(rnd, us, vs, min_val, max_val), fmt, out)
+    else:
+        ts = sample_new_pair_indices(rnd, lo, hi, tree, num_new)
+        (us, vs) = pair_index_to_vertices(ts)
+        write_edges(us + 1, vs + 1, draw_edge_weights(rnd, us, vs, min_val, max_val), fmt, out)
+    out.close()
+    return part_fn
+
+def gen_sharded(num_verts, num_edges, min_val, max_val, precision, out, jobs, alg='auto', num_dims=None):
+    """Generates a graph as a series of shards (blocks of rows of the lower
+    triangle) with jobs processes and concatenates them to out.  Each shard has
+    its own random stream derived from the seed, so the graph generated for a
+    seed does not depend on jobs.  If num_dims is given, vertices are randomly
+    positioned as with -v (only complete graphs are supported); otherwise
+    edges get random weights as with -e."""
+    global __shard_coords
+    rnd = make_batch_rng(__RND_SEED, __RNG)
+    if num_dims is not None:
+        if edges_in_complete_undirected_graph(num_verts) != num_edges:
+            die('not yet implemented error: sharded generation of -v graphs only works for complete graphs')
+        __shard_coords = rnd.uniform(min_val, max_val, (num_verts, num_dims))
+        about = "m=%d n=%d d=%d min=%.1f max=%.1f prec=%d seed=%s gen=shard" % (num_verts, num_edges, num_dims,
+                                                                                min_val, max_val, precision, str(__RND_SEED))
+    else:
+        about = "m=%d n=%d min=%.1f max=%.1f prec=%d seed=%s gen=shard" % (num_verts, num_edges,
+                                                                           min_val, max_val, precision, str(__RND_SEED))
+    print_input_header(num_verts, num_edges, out)
+    fmt = '%u %u %.' + str(precision) + 'f'
+
+    bounds = get_shard_bounds(num_verts, num_edges)
+    counts = allocate_shard_edges(rnd, bounds, num_edges - (num_verts - 1))
+    if isinstance(out, BinaryGraphWriter):
+        rec = (out.prec, out.weight_type)
+    else:
+        rec = None
+    specs = [(__RND_SEED, __RNG, s, bounds[s], bounds[s+1], counts[s], alg, min_val, max_val, fmt, rec,
+              random_tmp_filename(10, 'shard')) for s in range(len(counts))]
 
+    # generate the shards and append them to the output in order
+    pool = None
+    try:
+        if jobs > 1:
+            pool = Pool(jobs)
+            parts = pool.imap(gen_shard, specs)
+        else:
+            parts = imap(gen_shard, specs)
+        out.flush()
+        for part_fn in parts:
+            fh = open(part_fn, 'rb')
+            if rec is not None:
+                out.append_records(fh)
+            else:
+                copyfileobj(fh, out, 1 << 20)
+            fh.close()
+            quiet_remove(part_fn)
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+        for spec in specs:
+            quiet_remove(spec[-1])
+        __shard_coords = None
+    return about
+
+def gen_random_edge_lengths_batched(num_verts, num_edges, min_edge_len, max_edge_len, precision, out, alg='auto'):
+    """Like gen_random_edge_lengths, but draws edges and weights in large
+    NumPy blocks.  The output has the same format, but a given seed yields a
+    different graph than the default engine."""
+    about = "m=%d n=%d min=%.1f max=%.1f prec=%d seed=%s gen=batch" % (num_verts, num_edges,
+                                                                       min_edge_len, max_edge_len, precision, str(__RND_SEED))
+    print_input_header(num_verts, num_edges, out)
+    fmt = '%u %u %.' + str(precision) + 'f'
+    rnd = make_batch_rng(__RND_SEED, __RNG)
+
+    # handle the complete graph case efficiently
+    if edges_in_complete_undirected_graph(num_verts) == num_edges:
+        for (us, vs) in iter_upper_triangle_blocks(num_verts, BATCH_SIZE):
+            write_edges(us + 1, vs + 1, draw_edge_weights(rnd, vs, us, min_edge_len, max_edge_len), fmt, out)
+        return about
+
+    # 1) connect each vertex to a random one of the previous vertices
+    children = numpy.arange(1, num_verts, dtype=numpy.int64)
+    parents = (rnd.random_sample(num_verts - 1) * children).astype(numpy.int64)
+    keys = children * num_verts + parents
+
+    # 2) randomly add any remaining edges between unconnected vertices (see
+    #    gen_random_edge_lengths for how the algorithm is chosen)
+    if choose_generation_alg(alg, num_verts, num_edges) == 'dense':
+        # choose the pairs to leave out (never a spanning tree edge) and then
+        # keep every other pair
+        num_excluded = edges_in_complete_undirected_graph(num_verts) - num_edges
+        skip = sample_new_edge_keys(rnd, num_verts, keys, num_excluded)[len(keys):]
+        skip.sort()
+        for (us, vs) in iter_upper_triangle_blocks(num_verts, BATCH_SIZE):
+            bkeys = vs * num_verts + us
+            pos = numpy.minimum(numpy.searchsorted(skip, bkeys), len(skip) - 1)
+            keep = skip[pos] != bkeys
+            (us, vs) = (us[keep], vs[keep])
+            write_edges(us + 1, vs + 1, draw_edge_weights(rnd, vs, us, min_edge_len, max_edge_len), fmt, out)
+        return about + ' alg=dense'
+
+    keys = sample_new_edge_keys(rnd, num_verts, keys, num_edges - (num_verts - 1))
+    us = keys // num_verts
+    vs = keys % num_verts
+    write_edges(us + 1, vs + 1, draw_edge_weights(rnd, us, vs, min_edge_len, max_edge_len), fmt, out)
+    return about
+
+def get_distance(p, q):
+    """Returns the Euclidean distance between points p and q."""
+    return sqrt(sum([(a-b)*(a-b) for (a, b) in zip(p, q)]))
+
+def get_pairs_within_radius(points, num_dims, min_pos, r):
+    """Returns a list of (distance, i, j) for every pair i < j whose points are
+    no more than r apart.  Points are bucketed into a grid of cells with sides
+    of length r so only pairs in neighboring cells are ever compared."""
+    # bucket each point by the grid cell it falls in
+    cells = {}
+    for i in range(len(points)):
+        if r > 0:
+            c = tuple([int((x - min_pos) / r) for x in points[i]])
+        else:
+            c = (0,) * num_dims
+        cells.setdefault(c, []).append(i)
+
+    # compare each cell with itself and with the neighboring cells which come
+    # after it (so each pair of cells is only considered once)
+    offsets = [o for o in product((-1, 0, 1), repeat=num_dims) if o > (0,) * num_dims]
+    r2 = r * r
+    pairs = []
+    def add_pairs_within_radius(i, js):
+        p = points[i]
+        for j in js:
+            d2 = sum([(a-b)*(a-b) for (a, b) in zip(p, points[j])])
+            if d2 <= r2:
+                pairs.append((sqrt(d2), min(i, j), max(i, j)))
+
+    for (c, members) in cells.iteritems():
+        for a in range(len(members)):
+            add_pairs_within_radius(members[a], members[a+1:])
+        for o in offsets:
+            neighbors = cells.get(tuple([x + y for (x, y) in zip(c, o)]))
+            if neighbors is not None:
+                for i in members:
+                    add_pairs_within_radius(i, neighbors)
+    return pairs
+
+def print_sparse_vertex_position_edges(points, parents, num_edges, num_dims, min_pos, max_pos, fmt, out):
+    """Prints a connected graph with num_edges edges over points.  Vertex i > 0
+    is connected to vertex parents[i-1] (a random spanning tree) and the
+    remaining edges are the shortest pairs not already in the tree, i.e. every
+    pair within some radius.  A grid spatial index keeps this close to
+    O(V log V) for sparse graphs instead of considering all O(V^2) pairs."""
+    num_verts = len(points)
+
+    # 1) make sure we end up with a connected graph
+    spanning_tree = {}
+    for i in range(1, num_verts):
+        j = parents[i-1]
+        spanning_tree[(j, i)] = True
+        print_edge(i+1, j+1, get_distance(points[i], points[j]), fmt, out)
+
+    num_edges -= (num_verts - 1)
+    if num_edges == 0:
+        return
+
+    # 2) add the shortest remaining pairs: pick a radius which should contain
+    #    about 20% more pairs than we need (assuming uniformly distributed
+    #    points) and grow it until it actually does
+    span = max_pos - min_pos
+    needed = num_edges + num_verts - 1
+    if span > 0 and num_dims > 0:
+        ball = pi ** (num_dims / 2.0) / gamma(num_dims / 2.0 + 1)
+        frac = 1.2 * needed / (ball * edges_in_complete_undirected_graph(num_verts))
+        r = span * frac ** (1.0 / num_dims)
+    else:
+        r = 0  # every pair is the same distance apart
+    while True:
+        r = min(r, span * sqrt(num_dims))  # no pair is further apart than this
+        pairs = [p for p in get_pairs_within_radius(points, num_dims, min_pos, r)
+                 if not spanning_tree.has_key((p[1], p[2]))]
+        if len(pairs) >= num_edges or r >= span * sqrt(num_dims):
+            break
+        r *= 1.5
+
+    # print the chosen edges in vertex order (not by weight, which would
+    # hand presorted input to the MST algorithms)
+    chosen = [(i, j, d) for (d, i, j) in heapq.nsmallest(num_edges, pairs)]
+    chosen.sort()
+    for (i, j, d) in chosen:
+        print_edge(i+1, j+1, d, fmt, out)
+
+def gen_random_vertex_positions(num_verts, num_edges, num_dims, min_pos, max_pos, precision, out):
     # generate all of the coordinates in one big array
     coords = [__rnd.uniform(min_pos,max_pos) for _ in range(num_verts*num_dims)]
 
     print_input_header(num_verts, num_edges, out)
-
-    # print the edge weights for each pair
     fmt = '%u %u %.' + str(precision) + 'f'
-    for i in range(0, num_verts):
-        io = i * num_dims
-        for j in range(i+1, num_verts):
-            jo = j * num_dims
-            print >> out, fmt % (i+1, j+1, sqrt(sum([(coords[io+o]-coords[jo+o])*(coords[io+o]-coords[jo+o]) for o in range(num_dims)])))
+
+    # generate a sparse graph from the nearby pairs of vertices
+    if edges_in_complete_undirected_graph(num_verts) != num_edges:
+        points = [tuple(coords[i*num_dims:(i+1)*num_dims]) for i in range(num_verts)]
+        parents = [__rnd.randint(0, i-1) for i in range(1, num_verts)]
+        print_sparse_vertex_position_edges(points, parents, num_edges, num_dims, min_pos, max_pos, fmt, out)
+    else:
+        # print the edge weights for each pair
+        for i in range(0, num_verts):
+            io = i * num_dims
+            for j in range(i+1, num_verts):
+                jo = j * num_dims
+                print_edge(i+1, j+1, sqrt(sum([(coords[io+o]-coords[jo+o])*(coords[io+o]-coords[jo+o]) for o in range(num_dims)])), fmt, out)
 
     return "m=%d n=%d d=%d min=%.1f max=%.1f prec=%d seed=%s" % (num_verts, num_edges, num_dims,
                                                                  min_pos, max_pos, precision, str(__RND_SEED))
 
+def gen_random_vertex_positions_batched(num_verts, num_edges, num_dims, min_pos, max_pos, precision, out):
+    """Like gen_random_vertex_positions, but computes the distances for a tile
+    of rows of the upper triangle at a time with NumPy.  Memory use is bounded
+    by the tile size (BATCH_SIZE pairs) regardless of the number of vertices."""
+    rnd = make_batch_rng(__RND_SEED, __RNG)
+    coords = rnd.uniform(min_pos, max_pos, (num_verts, num_dims))
+
+    print_input_header(num_verts, num_edges, out)
+    fmt = '%u %u %.' + str(precision) + 'f'
+
+    # generate a sparse graph from the nearby pairs of vertices
+    if edges_in_complete_undirected_graph(num_verts) != num_edges:
+        children = numpy.arange(1, num_verts)
+        parents = (rnd.random_sample(num_verts - 1) * children).astype(numpy.int64)
+        points = [tuple(p) for p in coords.tolist()]
+        print_sparse_vertex_position_edges(points, parents.tolist(), num_edges, num_dims, min_pos, max_pos, fmt, out)
+    else:
+        # print the edge weights for each pair, one tile of pairs at a time
+        for (us, vs) in iter_upper_triangle_blocks(num_verts, BATCH_SIZE):
+            d = coords[us] - coords[vs]
+            write_edges(us + 1, vs + 1, numpy.sqrt((d * d).sum(axis=1)), fmt, out)
+
+    return "m=%d n=%d d=%d min=%.1f max=%.1f prec=%d seed=%s gen=batch" % (num_verts, num_edges, num_dims,
+                                                                           min_pos, max_pos, precision, str(__RND_SEED))
+
 def is_input_for_part2(argv):
     return main(argv, False, True)
 
-def main(argv=sys.argv[1:], get_output_name_only=False, get_is_for_part2=False):
+def get_input_variant(argv):
+    """Returns a list of the non-default engine, algorithm and RNG argv
+    selects, i.e., why its Input would not identify the graph it generates
+    (empty if it would)."""
+    return main(argv, get_variant_only=True)
+
+def get_cache_key_args(argv):
+    """Returns a canonical string describing the graph argv would generate, or
+    None if argv does not specify a random seed (see input_cache.py)."""
+    return main(argv, get_cache_key_only=True)
+
+def main(argv=sys.argv[1:], get_output_name_only=False, get_is_for_part2=False, get_cache_key_only=False,
+         get_variant_only=False):
     usage = """usage: %prog [options] NUM_VERTICES
 Generates a connected graph with no self-loops or parallel edges.  Output is
 sent to the default filename (""" + get_path_to_generated_inputs() + """/with
 V-E-SEED.g unless -e or -v are specified in which case a random filename is
 used.)"""
     parser = OptionParser(usage)
+    parser.add_option("-a", "--gen-alg",
+                      metavar="ALG", choices=('auto', 'dense', 'sparse'),
+                      help="how to add edges beyond the spanning tree: sparse (draw random pairs), dense (draw the pairs to leave out) or auto (whichever is expected to be faster) [default: auto with -b, otherwise sparse so logged seeds reproduce the same graphs]")
+    parser.add_option("-B", "--binary",
+                      action="store_true", default=False,
+                      help="write the graph in the binary format (see binary_graph.py) rather than as text")
+    parser.add_option("-b", "--batch",
+                      action="store_true", default=False,
+                      help="generate with the batched NumPy engine (much faster for large graphs, but a seed yields a different graph than the default engine)")
     parser.add_option("-c", "--correctness",
                       action="store_true", default=False,
                       help="compute and log the correct output")
     parser.add_option("-d", "--dont-generate",
                       action="store_true", default=False,
                       help="add the input to the inputs list file but do not generate it")
+    parser.add_option("-j", "--jobs",
+                      metavar="N", type="int",
+                      help="generate with the sharded NumPy engine using N processes (a seed yields the same graph for any N, but not the same graph as the other engines) [default: do not shard]")
     parser.add_option("-l", "--inputs-list-file",
                       metavar="FILE",
                       help="set the file to store info about the new input to (default is usually fine)")
@@ -175,7 +705,7 @@ used.)"""
     parser.add_option("-n", "--num-edges",
                       help="number of edges to put in the graph [default: complete graph]")
     parser.add_option("-o", "--output-file",
-                      help="where to output the generated graph [default is inputs/[<STYLE>-]<NUM_VERTICES>-<NUM_EDGES>-<RANDOM_SEED>.g")
+                      help="where to output the generated graph [default is inputs/[<STYLE>-]<NUM_VERTICES>-<NUM_EDGES>-<RANDOM_SEED>.g (.gb with -B)")
     parser.add_option("-p", "--precision",
                       type="int", default=1,
                       help="number of decimal points to specify for edge weights [default: %default]")
@@ -185,8 +715,17 @@ used.)"""
     parser.add_option("-r", "--random-seed",
                       metavar="R", type="int", default=None,
                       help="what random seed to use [default: choose a truly random seed using urandom()]")
+    parser.add_option("--rng",
+                      metavar="RNG", choices=('legacy', 'splitmix'), default='legacy',
+                      help="random number generator: legacy (Python's Mersenne Twister, or NumPy's with -b and -j; reproduces the graphs of logged seeds) or splitmix (counter-based: with -b and -j, each edge's weight depends only on the seed and the edge) [default: %default]")
     parser.add_option("-s", "--style",
                       help="how to place edges [default: random with no self-loops or parallel edges]")
+    parser.add_option("-z", "--gzip",
+                      action="store_true", default=False,
+                      help="compress the graph with gzip (the default output file ends with .g.gz)")
+    parser.add_option("--gzip-level",
+                      metavar="LEVEL", type="int", default=DEFAULT_LEVEL,
+                      help="gzip compression level for -z, from 1 (fastest) to 9 (smallest) [default: %default]")
     parser.add_option("-t", "--dont-track",
                       action="store_true", default=False,
                       help="whether to log this input in our list of generated inputs")
@@ -197,7 +736,7 @@ used.)"""
                      help="range of edge weights (range inclusive) [default: [0.1,100000]]")
     group.add_option("-v", "--vertex-pos-range",
                      metavar="DIM,MIN,MAX",
-                     help="dimensionality of vertex positions and the range of each dimension (range inclusive) [not used by default; mutually exclusive with -e]")
+                     help="dimensionality of vertex positions and the range of each dimension (range inclusive); when -n is less than a complete graph, a random spanning tree is kept along with the shortest remaining pairs [not used by default; mutually exclusive with -e]")
     parser.add_option_group(group)
 
     (options, args) = parser.parse_args(argv)
@@ -221,12 +760,17 @@ used.)"""
 
     # initialize the random number generator
     global __RND_SEED
+    global __RNG
     global __rnd
     if options.random_seed is not None:
         __RND_SEED = options.random_seed
     else:
         __RND_SEED = unpack('Q', urandom(8))[0]  # generate a truly random 8-byte seed
-    __rnd = Random(__RND_SEED)
+    __RNG = options.rng
+    if __RNG == 'splitmix':
+        __rnd = CounterRandom(__RND_SEED)
+    else:
+        __rnd = Random(__RND_SEED)
 
     def print_if_not_quiet(msg):
         if not options.quiet:
@@ -264,32 +808,28 @@ used.)"""
     if options.edge_weight_range and options.vertex_pos_range:
         parser.error("option -e and -v are mutually exclusive")
 
-    # determine the output file to use
-    if options.output_file is None:
-        path = get_path_to_generated_inputs()
-        if options.vertex_pos_range or options.edge_weight_range:
-            options.output_file = path + 'other-' + str(__RND_SEED) + '.g'
-        else:
-            options.output_file = path + '%s%u-%u-%s.g' % (style_str, num_verts, num_edges, str(__RND_SEED))
+    if options.gzip:
+        if options.binary:
+            parser.error("option -B and -z are mutually exclusive")
+        if options.gzip_level < 1 or options.gzip_level > 9:
+            parser.error("--gzip-level must be between 1 and 9")
 
-    # special use of the method ... just return the name we would use
-    if get_output_name_only:
-        return options.output_file
+    # the binary header stores the seed as an unsigned 64-bit integer
+    if options.binary and options.random_seed is not None and not 0 <= options.random_seed < 2**64:
+        parser.error("-r must be between 0 and 2^64-1 when -B is given")
 
-    # open the desired output file
-    if options.output_file == 'stdout':
-        out = sys.stdout
-    elif not options.dont_generate:
-        if options.may_use_existing:
-            if os.path.exists(options.output_file):
-                print_if_not_quiet('skipping input generation: %s already exists' % ppinput(options.output_file))
-                return 0
-        try:
-            out = open(options.output_file, 'w')
-        except IOError, errstr:
-            die('generate_input: error: ' + errstr)
+    if options.batch and numpy is None:
+        parser.error("option -b requires numpy, which could not be imported")
 
-    # see if the user wants edge weights computed from vertex positions
+    if options.jobs is not None:
+        if options.jobs < 1:
+            parser.error("-j must be at least 1")
+        if options.batch:
+            parser.error("option -b and -j are mutually exclusive")
+        if numpy is None:
+            parser.error("option -j requires numpy, which could not be imported")
+
+    # determine the range of the edge weights (or vertex positions)
     if options.vertex_pos_range:
         (d, m1, m2) = options.vertex_pos_range.split(',', 3)
         try:
@@ -300,8 +840,9 @@ used.)"""
         if num_dims < 0:
             parser.error("option -v requires dimensionality to be a strictly positive integer")
 
-        if not options.dont_generate:
-            about = gen_random_vertex_positions(num_verts, num_edges, num_dims, min_pos, max_pos, options.precision, out)
+        if options.jobs is not None and num_edges != edges_in_complete_undirected_graph(num_verts):
+            parser.error("option -j only supports -v for complete graphs")
+
         dimensionality = num_dims
         min_val = min_pos
         max_val = max_pos
@@ -323,21 +864,120 @@ used.)"""
             min_edge_len = 0
             max_edge_len = 100000
 
-        print_if_not_quiet('density=%s pom=%s' % (str(get_density(num_verts, num_edges)), str(get_percent_of_max(num_verts, num_edges))))
-        if not options.dont_generate:
-            about = gen_random_edge_lengths(num_verts, num_edges, min_edge_len, max_edge_len, options.precision, out)
         dimensionality = 0
         min_val = min_edge_len
         max_val = max_edge_len
 
+    # determine which engine and algorithm generate the graph
+    if options.jobs is not None:
+        (engine, alg) = ('shard', options.gen_alg or 'auto')
+    elif options.batch:
+        (engine, alg) = ('batch', options.gen_alg or 'auto')
+    else:
+        (engine, alg) = ('legacy', options.gen_alg or 'sparse')
+
+    # anything but the default engine, algorithm and RNG may generate another
+    # graph from the same seed, which its logged Input could not reproduce
+    variant = []
+    if engine != 'legacy':
+        variant.append(engine)
+    if alg != 'sparse' and not options.vertex_pos_range:
+        variant.append(alg)
+    if __RNG != 'legacy':
+        variant.append(__RNG)
+    if get_variant_only:
+        return variant
+    if variant and not options.dont_track and not get_cache_key_only:
+        parser.error('-a, -b, -j and --rng generate graphs which cannot be tracked, so -t must be specified')
+
+    # special use of the method ... return a canonical description of
+    # everything which determines the generated graph (None if it is random)
+    if get_cache_key_only:
+        if options.random_seed is None:
+            return None
+        return 'v=%s m=%u n=%u d=%u min=%r max=%r prec=%u seed=%u rng=%s engine=%s alg=%s format=%s' % (
+            GENERATOR_VERSION, num_verts, num_edges, dimensionality, float(min_val), float(max_val),
+            options.precision, __RND_SEED, __RNG, engine, alg, 'binary' if options.binary else ('gzip' if options.gzip else 'text'))
+
+    # determine the output file to use
+    ext = '.gb' if options.binary else ('.g.gz' if options.gzip else '.g')
+    if options.output_file is None:
+        path = get_path_to_generated_inputs()
+        # variants are named apart from the graph the default generator makes
+        variant_str = ''.join(['-' + v for v in variant])
+        if options.vertex_pos_range or options.edge_weight_range:
+            options.output_file = path + 'other-' + str(__RND_SEED) + variant_str + ext
+        else:
+            options.output_file = path + '%s%u-%u-%s%s%s' % (style_str, num_verts, num_edges, str(__RND_SEED), variant_str, ext)
+    elif options.output_file == 'stdout' and options.binary:
+        parser.error("option -B cannot write to stdout (the header is written last)")
+
+    # special use of the method ... just return the name we would use
+    if get_output_name_only:
+        return options.output_file
+
+    # open the desired output file
+    if options.output_file == 'stdout':
+        out = sys.stdout
+        if options.gzip:
+            out = GzipGraphWriter(out, options.gzip_level, False)
+    elif not options.dont_generate:
+        if options.may_use_existing:
+            if os.path.exists(options.output_file):
+                print_if_not_quiet('skipping input generation: %s already exists' % ppinput(options.output_file))
+                return 0
+        try:
+            if options.gzip:
+                out = open_gzip_graph(options.output_file, options.gzip_level)
+            else:
+                out = open(options.output_file, 'wb' if options.binary else 'w')
+        except IOError, errstr:
+            die('generate_input: error: ' + errstr)
+
+    # see if the user wants edge weights computed from vertex positions
+    if options.vertex_pos_range:
+        if options.binary and not options.dont_generate:
+            max_dist = (max_pos - min_pos) * sqrt(num_dims)
+            out = BinaryGraphWriter(out, options.precision, num_dims, min_pos, max_pos, __RND_SEED, max_dist)
+
+        if options.dont_generate:
+            pass
+        elif engine == 'shard':
+            about = gen_sharded(num_verts, num_edges, min_pos, max_pos, options.precision, out,
+                                options.jobs, num_dims=num_dims)
+        else:
+            if engine == 'batch':
+                gen = gen_random_vertex_positions_batched
+            else:
+                gen = gen_random_vertex_positions
+            about = gen(num_verts, num_edges, num_dims, min_pos, max_pos, options.precision, out)
+    else:
+        print_if_not_quiet('density=%s pom=%s' % (str(get_density(num_verts, num_edges)), str(get_percent_of_max(num_verts, num_edges))))
+        if options.binary and not options.dont_generate:
+            out = BinaryGraphWriter(out, options.precision, 0, min_edge_len, max_edge_len, __RND_SEED)
+
+        if options.dont_generate:
+            pass
+        elif engine == 'shard':
+            about = gen_sharded(num_verts, num_edges, min_edge_len, max_edge_len, options.precision, out,
+                                options.jobs, alg)
+        else:
+            if engine == 'batch':
+                gen = gen_random_edge_lengths_batched
+            else:
+                gen = gen_random_edge_lengths
+            about = gen(num_verts, num_edges, min_edge_len, max_edge_len, options.precision, out, alg)
+
     mst_weight = -1
     if options.dont_generate:
         print_if_not_quiet('graph not saved (as requested)')
     else:
+        if __RNG != 'legacy':
+            about += ' rng=' + __RNG
         print_input_footer(num_verts, num_edges, about, out)
         print_if_not_quiet('graph saved to ' + ppinput(options.output_file))
         if out != sys.stdout:
-            out.close()
+            out.close()  # also ends the compressed stream if -z was given
 
         # generate output with correctness checker, if desired
         if options.correctness:
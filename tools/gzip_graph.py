@@ -0,0 +1,175 @@
+"""Reads and writes gzip-compressed text graphs (.g.gz).
+
+A compressed graph is the usual text format compressed as two gzip members:
+the graph itself followed by the footer line stored uncompressed (compression
+level 0).  gzip -d and GzipFile read it as one stream, but the footer can still
+be read from the last few bytes of the file without decompressing anything.
+"""
+
+from mstutil import quiet_remove, random_tmp_filename
+import gzip, os, struct, zlib
+
+GZIP_MAGIC = '\x1f\x8b'
+
+# text is compressed in chunks of about this many bytes
+CHUNK_SIZE = 1 << 20
+
+# the default compression level (1 is fastest, 9 is smallest)
+DEFAULT_LEVEL = 6
+
+# the most bytes the stored footer member (and its gzip framing) may take
+MAX_FOOTER_MEMBER_SIZE = 4096
+
+def is_gzip_graph(fn):
+    """Returns whether fn is a gzip-compressed file."""
+    try:
+        fh = open(fn, 'rb')
+        magic = fh.read(len(GZIP_MAGIC))
+        fh.close()
+        return magic == GZIP_MAGIC
+    except IOError:
+        return False
+
+class GzipGraphWriter:
+    """A file-like object which compresses the text written to it in large
+    chunks (rather than one small write at a time).  It works with print.
+    fh is closed along with the writer if close_fh is True."""
+    def __init__(self, fh, level=DEFAULT_LEVEL, close_fh=True):
+        self.fh = fh
+        self.close_fh = close_fh
+        self.gz = gzip.GzipFile(fileobj=fh, mode='wb', compresslevel=level)
+        self.pending = []
+        self.pending_sz = 0
+        self.softspace = 0
+
+    def write(self, s):
+        self.pending.append(s)
+        self.pending_sz += len(s)
+        if self.pending_sz >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending_sz > 0:
+            self.gz.write(''.join(self.pending))
+            self.pending = []
+            self.pending_sz = 0
+
+    def write_footer(self, footer):
+        """Ends the graph and appends footer (one line) as a stored member."""
+        self.flush()
+        self.gz.close()
+        self.gz = gzip.GzipFile(fileobj=self.fh, mode='wb', compresslevel=0)
+        self.gz.write(footer + '\n')
+
+    def close(self):
+        self.flush()
+        self.gz.close()
+        if self.close_fh:
+            self.fh.close()
+
+def open_gzip_graph(fn, level=DEFAULT_LEVEL):
+    """Returns a GzipGraphWriter which writes to the file fn."""
+    return GzipGraphWriter(open(fn, 'wb', CHUNK_SIZE), level)
+
+# the gzip member header fields GzipFile writes (the flag it may set is FNAME)
+GZIP_HEADER_SIZE = 10
+GZIP_FNAME = 0x08
+
+# a member's trailer: the CRC32 and the size (ISIZE) of its uncompressed data
+GZIP_TRAILER_SIZE = 8
+
+# the framing of the one stored deflate block which holds a footer: the block
+# header byte (final, stored) followed by LEN and its complement NLEN
+STORED_BLOCK_HEADER = '\x01'
+STORED_BLOCK_FRAMING = 5
+
+def __find_member_start(tail, data_start):
+    """Returns the offset in tail of the header of the gzip member whose
+    deflate data begins at data_start (None if no header ends there)."""
+    p = data_start - GZIP_HEADER_SIZE
+    if p >= 0 and tail[p:p+4] == GZIP_MAGIC + '\x08\x00':
+        return p
+    if data_start == 0 or tail[data_start-1] != '\x00':
+        return None
+
+    # the header ends with the (NUL-terminated) original file name
+    p = tail.rfind(GZIP_MAGIC + '\x08' + chr(GZIP_FNAME), 0, data_start - GZIP_HEADER_SIZE)
+    while p >= 0:
+        if tail.find('\x00', p + GZIP_HEADER_SIZE) == data_start - 1:
+            return p
+        p = tail.rfind(GZIP_MAGIC + '\x08' + chr(GZIP_FNAME), 0, p)
+    return None
+
+def read_gzip_footer(fn):
+    """Returns the footer line of the compressed graph fn (None if it does
+    not end with a stored footer member).
+
+    The last member is located from its trailer rather than by searching the
+    bytes before it (which are compressed and may look like a footer): ISIZE
+    gives the length of the footer, so its stored block starts ISIZE plus the
+    block framing before the trailer and the member's header must end there."""
+    fh = open(fn, 'rb')
+    fh.seek(0, os.SEEK_END)
+    sz = fh.tell()
+    fh.seek(max(0, sz - MAX_FOOTER_MEMBER_SIZE))
+    tail = fh.read()
+    fh.close()
+    if len(tail) < GZIP_HEADER_SIZE + STORED_BLOCK_FRAMING + GZIP_TRAILER_SIZE:
+        return None
+
+    (crc, isize) = struct.unpack('<iI', tail[-GZIP_TRAILER_SIZE:])
+    block = len(tail) - GZIP_TRAILER_SIZE - isize - STORED_BLOCK_FRAMING
+    if block < GZIP_HEADER_SIZE:
+        return None  # too long to be a footer
+    if tail[block] != STORED_BLOCK_HEADER or struct.unpack('<HH', tail[block+1:block+5]) != (isize, isize ^ 0xFFFF):
+        return None
+    if __find_member_start(tail, block) is None:
+        return None
+
+    # decompress just the last member and make sure it is one footer line
+    try:
+        footer = zlib.decompress(tail[block:-GZIP_TRAILER_SIZE], -zlib.MAX_WBITS)
+    except zlib.error:
+        return None
+    if len(footer) != isize or zlib.crc32(footer) != crc:
+        return None
+    if footer[0:2] != '# ' or footer[-1:] != '\n' or footer.find('\n') != len(footer) - 1:
+        return None
+    return footer.rstrip('\n')
+
+def open_graph(fn):
+    """Opens the text graph fn for reading whether or not it is compressed."""
+    if is_gzip_graph(fn):
+        return gzip.open(fn, 'rb')
+    else:
+        return open(fn, 'r')
+
+def get_tmpfs_path():
+    """Returns the directory to decompress graphs into: a tmpfs (in memory) if
+    one is available, otherwise /tmp."""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm/'
+    else:
+        return '/tmp/'
+
+def decompress_graph(fn, out_fn=None):
+    """Decompresses the graph fn to out_fn (default: a new file on a tmpfs)
+    and returns out_fn.  The caller is responsible for removing it."""
+    if out_fn is None:
+        out_fn = get_tmpfs_path() + os.path.basename(random_tmp_filename(10, 'input'))
+    gz = gzip.open(fn, 'rb')
+    out = open(out_fn, 'wb')
+    try:
+        try:
+            while True:
+                buf = gz.read(CHUNK_SIZE)
+                if not buf:
+                    break
+                out.write(buf)
+        finally:
+            out.close()
+            gz.close()
+    except:
+        quiet_remove(out_fn)
+        raise
+    return out_fn
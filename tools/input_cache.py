@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+"""A content-addressed cache of generated input graphs.
+
+Graphs are keyed by the SHA1 of generate_input.get_cache_key_args(), i.e. all
+of the generation parameters (including the seed and GENERATOR_VERSION), so
+only graphs generated with an explicit seed (-r) can be cached.  Each entry in
+the cache directory consists of:
+
+  <key>.g (or .gb or .g.gz)  the graph
+  <key>.sum         "<sha1 of the graph> <size in bytes>"
+  <key>.lock        lock file
+
+A graph is generated into a temporary file and renamed into place only after
+its checksum file is written, so a graph in the cache is always complete.
+Entries are generated under an exclusive lock on their lock file and then
+held with a shared lock while they are in use, so concurrent collectors share
+one copy and eviction never removes a graph which someone is using.  Least
+recently used entries are evicted when the cache grows beyond its size bound.
+"""
+
+from generate_input import get_cache_key_args, main as generate_input
+from mstutil import get_path_to_generated_inputs, quiet_remove
+from optparse import OptionParser
+import fcntl, hashlib, os, sys
+
+# the default bound on the total size of the graphs in the cache
+DEFAULT_MAX_CACHE_BYTES = 16 * 1024 * 1024 * 1024
+
+class InputCacheError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return self.msg
+
+def get_path_to_input_cache():
+    """Gets the path to the input cache directory (it is created if needed)."""
+    path = get_path_to_generated_inputs() + 'cache/'
+    if not os.path.exists(path):
+        try:
+            os.mkdir(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise  # someone else did not create it first
+    return path
+
+def compute_checksum(fn):
+    """Returns a 2-tuple of the SHA1 (hex) and size of the file fn."""
+    h = hashlib.sha1()
+    sz = 0
+    fh = open(fn, 'rb')
+    while True:
+        buf = fh.read(1 << 20)
+        if not buf:
+            break
+        h.update(buf)
+        sz += len(buf)
+    fh.close()
+    return (h.hexdigest(), sz)
+
+# extensions of the graphs in the cache
+GRAPH_EXTENSIONS = ('.g', '.gb', '.g.gz')
+
+def split_graph_filename(fn):
+    """Splits fn into its key and extension (which may be two parts long)."""
+    (key, ext) = os.path.splitext(fn)
+    if ext == '.gz':
+        (key, ext2) = os.path.splitext(key)
+        ext = ext2 + ext
+    return (key, ext)
+
+def get_sum_filename(graph_fn):
+    """Returns the name of the checksum file of a graph in the cache."""
+    return split_graph_filename(graph_fn)[0] + '.sum'
+
+class CachedInput:
+    """A graph in the cache which is in use.  The entry may not be evicted
+    until it is released."""
+    def __init__(self, path, lock_fh):
+        self.path = path
+        self.lock_fh = lock_fh
+
+    def release(self):
+        if self.lock_fh is not None:
+            fcntl.flock(self.lock_fh, fcntl.LOCK_UN)
+            self.lock_fh.close()
+            self.lock_fh = None
+
+class InputCache:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.path = get_path_to_input_cache() if path is None else path
+        self.max_bytes = max_bytes
+
+    def __get_entry_base(self, key):
+        return os.path.join(self.path, key)
+
+    def __is_entry_valid(self, graph_fn, verify):
+        """Returns whether the graph was completely published and still has
+        the size (and, if verify, the checksum) recorded when it was."""
+        try:
+            fh = open(get_sum_filename(graph_fn), 'r')
+            (sha1, sz) = fh.readline().split()
+            fh.close()
+            if os.path.getsize(graph_fn) != int(sz):
+                return False
+            return not verify or compute_checksum(graph_fn)[0] == sha1
+        except (IOError, OSError, ValueError):
+            return False
+
+    def __publish(self, tmp_fn, graph_fn):
+        """Atomically moves the generated graph tmp_fn into the cache."""
+        (sha1, sz) = compute_checksum(tmp_fn)
+        sum_fn = get_sum_filename(graph_fn)
+        fh = open(sum_fn + '.tmp', 'w')
+        print >> fh, '%s %u' % (sha1, sz)
+        fh.close()
+        os.rename(sum_fn + '.tmp', sum_fn)
+        os.rename(tmp_fn, graph_fn)
+
+    def get(self, argstr, verify=False, quiet=True):
+        """Returns a CachedInput for the graph generate_input.py would generate
+        from argstr (generating it if it is not already cached), or None if
+        argstr does not specify a random seed.  If verify is True, the checksum
+        of a cached graph is checked before it is used."""
+        args = argstr.split()
+        key_args = get_cache_key_args(args)
+        if key_args is None:
+            return None
+        key = hashlib.sha1(key_args).hexdigest()
+        if '-B' in args or '--binary' in args:
+            ext = '.gb'
+        elif '-z' in args or '--gzip' in args:
+            ext = '.g.gz'
+        else:
+            ext = '.g'
+        base = self.__get_entry_base(key)
+        graph_fn = base + ext
+
+        lock_fh = open(base + '.lock', 'a')
+        fcntl.flock(lock_fh, fcntl.LOCK_EX)
+        try:
+            if self.__is_entry_valid(graph_fn, verify):
+                os.utime(graph_fn, None)  # most recently used
+            else:
+                quiet_remove(graph_fn)
+                tmp_fn = '%s.tmp-%u' % (base, os.getpid())
+                try:
+                    extra = ['-t', '-o', tmp_fn] + (['-q'] if quiet else [])
+                    ret = generate_input(args + extra)
+                    if ret != 0:
+                        raise InputCacheError('input generation failed (%s): %s' % (str(ret), argstr))
+                    self.__publish(tmp_fn, graph_fn)
+                finally:
+                    quiet_remove(tmp_fn)
+                self.evict(keep=key)
+
+            # let others use (but not evict) the graph while we use it
+            fcntl.flock(lock_fh, fcntl.LOCK_SH)
+        except:
+            fcntl.flock(lock_fh, fcntl.LOCK_UN)
+            lock_fh.close()
+            raise
+        return CachedInput(graph_fn, lock_fh)
+
+    def get_entries(self):
+        """Returns a list of (mtime, size, key, graph_fn) for each graph in the
+        cache, least recently used first."""
+        entries = []
+        for fn in os.listdir(self.path):
+            (key, ext) = split_graph_filename(fn)
+            if ext in GRAPH_EXTENSIONS:
+                graph_fn = os.path.join(self.path, fn)
+                try:
+                    st = os.stat(graph_fn)
+                except OSError:
+                    continue  # evicted while we were looking
+                entries.append((st.st_mtime, st.st_size, key, graph_fn))
+        entries.sort()
+        return entries
+
+    def __remove_entry(self, key, graph_fn, wait):
+        """Removes an entry if it is not in use (or, if wait, once it is not in
+        use).  Returns whether it was removed."""
+        base = self.__get_entry_base(key)
+        lock_fh = open(base + '.lock', 'a')
+        try:
+            try:
+                fcntl.flock(lock_fh, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except IOError:
+                return False  # in use
+            quiet_remove(graph_fn)
+            quiet_remove(base + '.sum')
+            return True  # the lock file stays: someone may be waiting on it
+        finally:
+            lock_fh.close()
+
+    def evict(self, keep=None, max_bytes=None):
+        """Evicts the least recently used entries which are not in use until
+        the cache holds no more than max_bytes (default: this cache's bound).
+        The entry keep (e.g. the one just generated) is never evicted."""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = self.get_entries()
+        total = sum([e[1] for e in entries])
+        for (_, sz, key, graph_fn) in entries:
+            if total <= max_bytes:
+                break
+            if key != keep and self.__remove_entry(key, graph_fn, False):
+                total -= sz
+        return total
+
+    def verify(self):
+        """Removes any entries whose checksum does not match.  Returns a list
+        of the removed entries' graphs."""
+        bad = []
+        for (_, _, key, graph_fn) in self.get_entries():
+            if not self.__is_entry_valid(graph_fn, True):
+                if self.__remove_entry(key, graph_fn, True):
+                    bad.append(graph_fn)
+        return bad
+
+    def clear(self):
+        """Removes every entry (waiting for any which are in use)."""
+        for (_, _, key, graph_fn) in self.get_entries():
+            self.__remove_entry(key, graph_fn, True)
+
+def main(argv=sys.argv[1:]):
+    usage = """usage: %prog [options]
+Manages the cache of generated input graphs."""
+    parser = OptionParser(usage)
+    parser.add_option("-c", "--clear",
+                      action="store_true", default=False,
+                      help="remove every graph from the cache")
+    parser.add_option("-g", "--get",
+                      metavar="GEN_ARGS",
+                      help="print the path to the cached graph which generate_input.py GEN_ARGS would generate (generating it if needed); GEN_ARGS must include -r SEED")
+    parser.add_option("-l", "--list",
+                      action="store_true", default=False,
+                      help="list the graphs in the cache (least recently used first)")
+    parser.add_option("-s", "--max-size",
+                      metavar="MB", type="int",
+                      help="evict least recently used graphs until the cache is no larger than MB megabytes [default: %u]" % (DEFAULT_MAX_CACHE_BYTES / 1024 / 1024))
+    parser.add_option("-v", "--verify",
+                      action="store_true", default=False,
+                      help="check the checksum of every graph in the cache and remove any which are corrupt")
+    (options, args) = parser.parse_args(argv)
+    if len(args) > 0:
+        parser.error("too many arguments: none expected")
+
+    if options.max_size is not None:
+        ic = InputCache(max_bytes=options.max_size * 1024 * 1024)
+    else:
+        ic = InputCache()
+
+    if options.clear:
+        ic.clear()
+    if options.verify:
+        for fn in ic.verify():
+            print 'removed corrupt graph ' + fn
+    if options.max_size is not None:
+        ic.evict()
+    if options.list:
+        for (mtime, sz, _, graph_fn) in ic.get_entries():
+            print '%s\t%u\t%s' % (mtime, sz, graph_fn)
+
+    if options.get is not None:
+        try:
+            ci = ic.get(options.get)
+        except InputCacheError, e:
+            print >> sys.stderr, e
+            return -1
+        if ci is None:
+            parser.error("-g requires GEN_ARGS to include a random seed (-r)")
+        print ci.path
+        ci.release()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Columnar tables of results for the analysis scripts.
+
+load_table reads the results in a log file (and its journal) straight into one
+column per field without creating a Data object per result.  aggregate then
+summarizes a column for each group of rows (e.g., each (|V|, |E|)) with the
+statistics ResultAccumulator computes.
+
+The columns are numpy arrays and the aggregation is vectorized when numpy is
+installed; otherwise they are lists and each group is summarized by a
+ResultAccumulator.  If the result store is in use, load_table returns a
+StoredTable instead and aggregate groups its rows in SQL.
+"""
+
+from data import DataError, CounterResult, PerfResult, WeightResult, read_log_file
+from math import sqrt
+from result import MAX_DF, T_DISTRIBUTION, ResultAccumulator
+import resultdb
+import sys
+try:
+    import numpy
+except ImportError:
+    numpy = None  # columns are lists and aggregation is not vectorized
+
+# the columns of every table: (name, index of the field in a log file line)
+KEY_COLUMNS = (('num_verts', 4), ('num_edges', 5), ('seed', 6), ('run_num', 8))
+
+# the value columns of each type of result (a value which was not logged,
+# e.g. the phase times of older PerfResults, is NaN)
+VALUE_COLUMNS = {
+    PerfResult:    (('time_sec', 9), ('mst_weight', 10), ('wall_sec', 11), ('sys_sec', 12), ('maxrss_kb', 13),
+                    ('minflt', 14), ('majflt', 15), ('parse_sec', 16), ('compute_sec', 17), ('output_sec', 18)),
+    WeightResult:  (('mst_weight', 9),),
+    CounterResult: (('cycles', 9), ('instructions', 10), ('cache_misses', 11), ('branch_misses', 12)),
+}
+
+# the number of fields each type of result may have in a log file line
+NUM_FIELDS = {PerfResult:(11, 16, 19), WeightResult:(10,), CounterResult:(13,)}
+
+# seeds may not fit in a signed 64-bit integer
+COLUMN_TYPES = {'num_verts':'int64', 'num_edges':'int64', 'seed':'uint64', 'run_num':'int64'}
+
+def read_fields(cls_data, logfn, mustExist=False):
+    """Returns a list of the fields (strings) of each cls_data result in logfn
+    with the same results DataSet.read_from_file would return."""
+    db = resultdb.get_result_db()
+    if db is not None and db.refresh(cls_data, logfn):
+        return db.select_fields(cls_data, logfn)
+    num_fields = NUM_FIELDS[cls_data]
+    def check_fields(fields):
+        if len(fields) not in num_fields:
+            raise DataError('%s expected %s fields, got %u: %s' % (cls_data.__name__, ' or '.join(map(str, num_fields)), len(fields), ' '.join(fields)))
+        return fields
+    return read_log_file(logfn, check_fields, cls_data.key_from_list, mustExist).values()
+
+class ResultTable:
+    """The results in a log file with one column per field.  Each column is
+    converted from the logged text when it is first used."""
+    def __init__(self, cls_data, rows):
+        """rows is a list of the fields of each result (as read_fields returns)."""
+        self.cls_data = cls_data
+        self.columns = {}
+        self.indices = dict(KEY_COLUMNS + VALUE_COLUMNS[cls_data])
+        # pad the rows of results without the optional fields
+        width = max(NUM_FIELDS[cls_data])
+        for r in rows:
+            if len(r) < width:
+                r.extend(['nan'] * (width - len(r)))
+        if numpy is not None:
+            self.fields = numpy.array(rows, str).reshape((len(rows), width))
+        else:
+            self.fields = rows
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __getitem__(self, name):
+        col = self.columns.get(name)
+        if col is None:
+            i = self.indices[name]
+            try:
+                if numpy is not None:
+                    col = self.fields[:, i].astype(COLUMN_TYPES.get(name, 'float64'))
+                else:
+                    conv = int if COLUMN_TYPES.has_key(name) else float
+                    col = [conv(r[i]) for r in self.fields]
+            except ValueError, e:
+                raise DataError('Improper %s value encountered in a %s: %s' % (name, self.cls_data.__name__, e))
+            self.columns[name] = col
+        return col
+
+    def known(self, name):
+        """Returns a mask of the rows whose value of column name is known."""
+        col = self[name]
+        if numpy is not None:
+            return ~numpy.isnan(col)
+        return [v == v for v in col]  # NaN != NaN
+
+class StoredTable:
+    """The results in a log file which are in the result store db."""
+    def __init__(self, db, cls_data, logfn):
+        self.db = db
+        self.cls_data = cls_data
+        self.logfn = logfn
+
+def load_table(cls_data, logfn, mustExist=False):
+    """Returns a table of the cls_data results in logfn: a StoredTable if
+    the result store is in use (and can aggregate them), else a ResultTable."""
+    db = resultdb.get_result_db()
+    if db is not None and db.can_aggregate() and db.refresh(cls_data, logfn):
+        return StoredTable(db, cls_data, logfn)
+    return ResultTable(cls_data, read_fields(cls_data, logfn, mustExist))
+
+class GroupStats:
+    """The statistics of the values of one group: the number of values, their
+    mean and median, and the bounds of the confidence interval of the mean
+    (-1 if there is only one value)."""
+    __slots__ = ('n', 'mean', 'median', 'lower', 'upper')
+
+    def __init__(self, n, mean, median, lower, upper):
+        self.n = n
+        self.mean = mean
+        self.median = median
+        self.lower = lower
+        self.upper = upper
+
+class Summary:
+    """The statistics of each group of rows, in the order of the groups' keys.
+    Each of keys, n, mean, median, lower and upper is a list with an element
+    per group (each key is a tuple of the values of the grouped columns)."""
+    def __init__(self, keys, n, mean, median, lower, upper):
+        self.keys = keys
+        self.n = n
+        self.mean = mean
+        self.median = median
+        self.lower = lower
+        self.upper = upper
+
+    def __len__(self):
+        return len(self.keys)
+
+    def to_dict(self):
+        """Returns a dict mapping each group's key to its GroupStats."""
+        return dict([(self.keys[i], GroupStats(self.n[i], self.mean[i], self.median[i], self.lower[i], self.upper[i]))
+                     for i in range(len(self.keys))])
+
+def __aggregate_slowly(cols, vals, ci, mask):
+    """aggregate without numpy: a ResultAccumulator per group."""
+    results = {}
+    for i in range(len(vals)):
+        if mask[i]:
+            key = tuple([c[i] for c in cols])
+            r = results.get(key)
+            if r is None:
+                r = ResultAccumulator(vals[i])
+                r.defaultCI = ci
+                results[key] = r
+            else:
+                r.add_data(vals[i])
+    keys = sorted(results.keys())
+    rs = [results[k] for k in keys]
+    for r in rs:
+        r.compute_stats()
+    return Summary(keys, [len(r.values) for r in rs], [r.mean for r in rs], [r.med for r in rs],
+                   [r.lower99 for r in rs], [r.upper99 for r in rs])
+
+def __summarize_stored(groups, ci):
+    """Returns a Summary of the groups ResultDB.aggregate returns."""
+    if len([g for g in groups if g[1] > MAX_DF]) > 0:
+        print >> sys.stderr, "warning: limited t-table => overestimating error"
+    (keys, n, mean, median, lower, upper) = ([], [], [], [], [], [])
+    for (key, num, avg, med, sum_sq_dev) in groups:
+        if num > 1:
+            d = T_DISTRIBUTION[ci][min(num, MAX_DF)] * sqrt(sum_sq_dev / (num - 1)) / sqrt(num)
+            (lo, hi) = (avg - d, avg + d)
+        else:
+            (lo, hi) = (-1.0, -1.0)
+        keys.append(key)
+        n.append(num)
+        mean.append(avg)
+        median.append(med)
+        lower.append(lo)
+        upper.append(hi)
+    return Summary(keys, n, mean, median, lower, upper)
+
+def aggregate(table, by, value, ci, known=None):
+    """Returns a Summary of the values in column value of each group of rows
+    with the same values in the columns named by by (e.g., ('num_verts',
+    'num_edges')).  ci is the confidence level of the intervals (a key of
+    result.T_DISTRIBUTION).  Only rows whose value (and the value of column
+    known, if given) was logged are included.  The statistics match those of
+    a ResultAccumulator of each group."""
+    if isinstance(table, StoredTable):
+        groups = table.db.aggregate(table.cls_data, table.logfn, by, value, known)
+        return __summarize_stored(groups, ci)
+    cols = [table[name] for name in by]
+    vals = table[value]
+    if numpy is None:
+        mask = [k1 and k2 for (k1, k2) in zip(table.known(value), table.known(known or value))]
+        return __aggregate_slowly(cols, vals, ci, mask)
+    mask = table.known(value)
+    if known is not None:
+        mask &= table.known(known)
+    cols = [c[mask] for c in cols]
+    vals = vals[mask]
+    if len(vals) == 0:
+        return Summary([], [], [], [], [], [])
+
+    # sort the rows by group (the first column is the primary key) and then by
+    # value, so the median of each group is its middle row
+    order = numpy.lexsort([vals] + cols[::-1])
+    cols = [c[order] for c in cols]
+    vals = vals[order]
+    is_start = numpy.zeros(len(vals), bool)
+    is_start[0] = True
+    for c in cols:
+        is_start[1:] |= (c[1:] != c[:-1])
+    starts = numpy.flatnonzero(is_start)
+    n = numpy.diff(numpy.append(starts, len(vals)))
+
+    mean = numpy.add.reduceat(vals, starts) / n
+    median = vals[starts + n / 2]
+    dev = vals - numpy.repeat(mean, n)
+    multi = n > 1
+    var = numpy.add.reduceat(dev * dev, starts) / numpy.maximum(n - 1, 1)
+    if (n > MAX_DF).any():
+        print >> sys.stderr, "warning: limited t-table => overestimating error"
+    t = numpy.array([(v if v is not None else numpy.nan) for v in T_DISTRIBUTION[ci]])[numpy.minimum(n, MAX_DF)]
+    d = t * numpy.sqrt(var) / numpy.sqrt(n)
+    lower = numpy.where(multi, mean - d, -1.0)
+    upper = numpy.where(multi, mean + d, -1.0)
+
+    keys = zip(*[c[starts].tolist() for c in cols])
+    return Summary(keys, n.tolist(), mean.tolist(), median.tolist(), lower.tolist(), upper.tolist())
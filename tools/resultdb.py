@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+
+"""An optional SQLite store of the data in the log files (result/ and input/).
+
+Each type of data has a table with a column for each of its fields plus a log
+column naming the log file it belongs to (e.g., the revision of a PerfResult or
+the weight type of a WeightResult).  Seeds are stored as text since they may
+not fit in a signed 64-bit integer.  Rows are keyed like DataSet keys them, so
+adding data which is already in the store replaces it.
+
+The store is used when the MST_RESULT_DB environment variable names its file:
+data which is logged is then also added to it, and read_dataset() reads from it.
+The store remembers the state (inode, mtime and size) of each log file and its
+journal when they were last imported, and a log file which has changed since
+(e.g., results were logged without the store) is re-imported before it is read.
+Existing log files can be imported into it with this module's -i option.
+
+Rather than reading whole log files, the analysis tools push their work into
+SQL when the store is in use: data_collector only reads the keys of the
+results it has (read_keys), compare_revs only selects the times on the inputs
+both revisions were benchmarked on, and result_table.aggregate groups results
+by size (with the *_by_log_size indices).
+"""
+
+from data import DataError, DataSet, Input, CorrResult, CounterResult, InputSolution, MemResult, PerfResult, WeightResult, \
+                 get_log_dirs, get_log_stamp, is_log_filename
+from mstutil import get_path_to_project_root
+from optparse import OptionParser
+import os, sys
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None  # the store is optional
+
+# names the database file to use (the store is not used if it is not set)
+RESULT_DB_ENV = 'MST_RESULT_DB'
+
+INPUT_COLUMNS = [('prec', 'INTEGER'), ('dims', 'INTEGER'), ('min_val', 'REAL'), ('max_val', 'REAL'),
+                 ('num_verts', 'INTEGER'), ('num_edges', 'INTEGER'), ('seed', 'TEXT')]
+RESULT_COLUMNS = INPUT_COLUMNS + [('rev', 'TEXT'), ('run_num', 'INTEGER')]
+
+# maps each type of data to its table and the columns of its fields (in the
+# order from_list takes them; trailing columns may be NULL for PerfResults
+# which predate them)
+TABLES = {
+    InputSolution: ('inputs', INPUT_COLUMNS + [('mst_weight', 'REAL')]),
+    CorrResult:    ('corr', RESULT_COLUMNS + [('corr', 'INTEGER')]),
+    PerfResult:    ('perf', RESULT_COLUMNS + [('time_sec', 'REAL'), ('mst_weight', 'REAL'),
+                                              ('wall_sec', 'REAL'), ('sys_sec', 'REAL'), ('maxrss_kb', 'INTEGER'),
+                                              ('minflt', 'INTEGER'), ('majflt', 'INTEGER'),
+                                              ('parse_sec', 'REAL'), ('compute_sec', 'REAL'), ('output_sec', 'REAL')]),
+    WeightResult:  ('weight', RESULT_COLUMNS + [('mst_weight', 'REAL')]),
+    CounterResult: ('counters', RESULT_COLUMNS + [('cycles', 'INTEGER'), ('instructions', 'INTEGER'),
+                                                  ('cache_misses', 'INTEGER'), ('branch_misses', 'INTEGER')]),
+    MemResult:     ('mem', RESULT_COLUMNS + [('maxrss_kb', 'INTEGER'), ('timeline', 'TEXT')]),
+}
+
+# the types of data which aggregate() groups by size (see result_table.py)
+SIZE_INDEXED = (PerfResult, WeightResult)
+
+class ResultDBError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return self.msg
+
+def get_log_name(logfn):
+    """Returns the name a log file's data is stored under."""
+    return os.path.basename(logfn)
+
+class ResultDB:
+    def __init__(self, path):
+        if sqlite3 is None:
+            raise ResultDBError('the result store requires the sqlite3 module')
+        try:
+            self.conn = sqlite3.connect(path, timeout=60)
+            self.__create_tables()
+        except sqlite3.Error, e:
+            raise ResultDBError('unable to open the result store %s: %s' % (path, str(e)))
+
+    def __create_tables(self):
+        """Creates each table (and its indices) if it does not exist yet."""
+        c = self.conn
+        for (cls_data, (table, columns)) in TABLES.items():
+            names = [name for (name, _) in columns]
+            key = ['log'] + [name for (name, _) in INPUT_COLUMNS] + (['run_num'] if 'run_num' in names else [])
+            cols = ', '.join(['%s %s' % col for col in columns])
+            c.execute('CREATE TABLE IF NOT EXISTS %s (log TEXT NOT NULL, %s, PRIMARY KEY (%s))' % (table, cols, ', '.join(key)))
+            # the primary key indexes the rows of each log by Input (and run);
+            # the data which is aggregated by size is also indexed by size (the
+            # log of a revision's results is named after it, so for them it is
+            # the (rev, |V|, |E|, seed, run) index)
+            c.execute('DROP INDEX IF EXISTS %s_by_rev' % table)
+            c.execute('DROP INDEX IF EXISTS %s_by_size' % table)
+            if cls_data in SIZE_INDEXED:
+                c.execute('CREATE INDEX IF NOT EXISTS %s_by_log_size ON %s (log, num_verts, num_edges, seed, run_num)' % (table, table))
+        c.execute('CREATE TABLE IF NOT EXISTS log_stamps (tbl TEXT NOT NULL, log TEXT NOT NULL, stamp TEXT, PRIMARY KEY (tbl, log))')
+        c.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def add_data_list(self, data_list, logfn=None, cls_data=None, stamps=None):
+        """Adds the Data objects in data_list to the store in one transaction.
+        Each is stored under the log file it is logged to (logfn if given).
+        If stamps is given, the cls_data objects in data_list were just added
+        to logfn (there may be none, e.g., if it was just compacted) and stamps
+        is (stamp before, stamp after) that change: if the store was up to date
+        with the log file before, it is recorded as being up to date after."""
+        try:
+            self.conn.execute('BEGIN')
+            if stamps is not None and stamps[0] is None:
+                # logfn was just created, so data_list is all of its data
+                self.__replace(cls_data, logfn, data_list, stamps[1])
+            else:
+                self.__insert(data_list, logfn)
+                if stamps is not None:
+                    self.__update_stamp(cls_data, logfn, stamps[0], stamps[1])
+            self.conn.commit()
+        except sqlite3.Error, e:
+            self.conn.rollback()
+            raise ResultDBError('unable to add %u rows to the result store: %s' % (len(data_list), str(e)))
+
+    def __update_stamp(self, cls_data, logfn, old, new):
+        """Records the stamp of logfn as new if it was old."""
+        (table, _) = TABLES[cls_data]
+        self.conn.execute('UPDATE log_stamps SET stamp = ? WHERE tbl = ? AND log = ? AND stamp = ?',
+                          (new, table, get_log_name(logfn), old))
+
+    def __replace(self, cls_data, logfn, data_list, stamp):
+        """Replaces the data for logfn with data_list and records logfn's
+        stamp as stamp (without committing)."""
+        (table, _) = TABLES[cls_data]
+        log = get_log_name(logfn)
+        self.conn.execute('DELETE FROM %s WHERE log = ?' % table, (log,))
+        self.__insert(data_list, logfn)
+        self.conn.execute('INSERT OR REPLACE INTO log_stamps VALUES (?, ?, ?)', (table, log, stamp))
+
+    def __insert(self, data_list, logfn):
+        """Inserts the rows of add_data_list (without committing them)."""
+        by_table = {}
+        for data in data_list:
+            (table, columns) = TABLES[data.__class__]
+            values = str(data).split()
+            values += [None] * (len(columns) - len(values))
+            log = get_log_name(logfn if logfn is not None else data.get_path())
+            by_table.setdefault((table, len(columns)), []).append([log] + values)
+        for ((table, n), rows) in by_table.items():
+            sql = 'INSERT OR REPLACE INTO %s VALUES (%s)' % (table, ', '.join(['?'] * (n + 1)))
+            self.conn.executemany(sql, rows)
+
+    def __execute(self, sql, args):
+        """Returns all of the rows sql selects."""
+        try:
+            return self.conn.execute(sql, args).fetchall()
+        except sqlite3.Error, e:
+            raise ResultDBError('query failed: %s' % str(e))
+
+    def select_fields(self, cls_data, logfn):
+        """Returns a list of the fields (as they are logged) of each cls_data
+        object in logfn."""
+        (table, columns) = TABLES[cls_data]
+        sql = 'SELECT %s FROM %s WHERE log = ?' % (', '.join([name for (name, _) in columns]), table)
+        rows = self.__execute(sql, (get_log_name(logfn),))
+        # repr gives floats back with all of their digits
+        return [[repr(v) if isinstance(v, float) else str(v) for v in row if v is not None] for row in rows]
+
+    def read_dataset(self, cls_data, logfn):
+        """Returns a DataSet of the cls_data objects in logfn."""
+        dataset = {}
+        for fields in self.select_fields(cls_data, logfn):
+            data = cls_data.from_list(fields)
+            dataset[data.mykey()] = data
+        return DataSet(dataset)
+
+    def select_keys(self, cls_data, logfn):
+        """Returns a set of the keys (see mykey) of the cls_data objects in
+        logfn without reading anything but their primary key's index."""
+        (table, columns) = TABLES[cls_data]
+        names = [name for (name, _) in INPUT_COLUMNS]
+        has_runs = 'run_num' in [name for (name, _) in columns]
+        sql = 'SELECT %s FROM %s WHERE log = ?' % (', '.join(names + (['run_num'] if has_runs else [])), table)
+        inputs = {}
+        keys = set()
+        for row in self.__execute(sql, (get_log_name(logfn),)):
+            i = inputs.get(row[:7])
+            if i is None:
+                i = inputs[row[:7]] = Input(*row[:7])
+            keys.add((i, row[7]) if has_runs else i)
+        return keys
+
+    def select_values_on_common_inputs(self, cls_data, logfn1, logfn2, value):
+        """Returns a list of (log file, Input, value) for the value of each
+        cls_data result in logfn1 or logfn2 on the Inputs both have results
+        for.  Each log file is the name of logfn1 or logfn2."""
+        (table, _) = TABLES[cls_data]
+        names = ', '.join([name for (name, _) in INPUT_COLUMNS])
+        (log1, log2) = (get_log_name(logfn1), get_log_name(logfn2))
+        sql = ('SELECT log, %s, %s FROM %s JOIN (SELECT %s FROM %s WHERE log = ? INTERSECT SELECT %s FROM %s WHERE log = ?) ' +
+               'USING (%s) WHERE log IN (?, ?)') % (names, value, table, names, table, names, table, names)
+        inputs = {}
+        ret = []
+        for row in self.__execute(sql, (log1, log2, log1, log2)):
+            i = inputs.get(row[1:8])
+            if i is None:
+                i = inputs[row[1:8]] = Input(*row[1:8])
+            ret.append((row[0], i, row[8]))
+        return ret
+
+    def can_aggregate(self):
+        """Returns whether aggregate() is supported (it needs SQLite 3.25)."""
+        return sqlite3.sqlite_version_info >= (3, 25, 0)
+
+    def aggregate(self, cls_data, logfn, by, value, known=None):
+        """Returns a list of (key, n, mean, median, sum of squared deviations
+        from the mean) of the values in column value of each group of cls_data
+        results in logfn with the same values in the columns named by by (key
+        is a tuple of them), in the order of their keys.  Only rows whose value
+        (and column known, if given) is not NULL are included.  The median of
+        a group of n values is its (n/2)th smallest (counting from 0)."""
+        (table, _) = TABLES[cls_data]
+        by = ', '.join(by)
+        where = 'log = ? AND %s IS NOT NULL' % value + ('' if known is None else ' AND %s IS NOT NULL' % known)
+        # number each group's rows in order of value (to find its median) and
+        # give each row its group's size and mean (to sum the deviations)
+        sql = ('WITH r AS (SELECT %s, %s AS v, ROW_NUMBER() OVER (PARTITION BY %s ORDER BY %s) AS i, ' +
+               'COUNT(*) OVER (PARTITION BY %s) AS n, AVG(%s) OVER (PARTITION BY %s) AS mean FROM %s WHERE %s) ' +
+               'SELECT %s, MAX(n), MAX(mean), MAX(CASE WHEN i = n / 2 + 1 THEN v END), SUM((v - mean) * (v - mean)) ' +
+               'FROM r GROUP BY %s ORDER BY %s') % (by, value, by, value, by, value, by, table, where, by, by, by)
+        num_by = by.count(',') + 1
+        return [(tuple(row[:num_by]),) + tuple(row[num_by:]) for row in self.__execute(sql, (get_log_name(logfn),))]
+
+    def get_counts(self):
+        """Returns a list of (table, log, number of rows) for each log file."""
+        ret = []
+        for (table, _) in sorted(TABLES.values()):
+            for (log, n) in self.conn.execute('SELECT log, COUNT(*) FROM %s GROUP BY log ORDER BY log' % table):
+                ret.append((table, log, n))
+        return ret
+
+    def import_log_file(self, cls_data, logfn):
+        """Replaces the store's data for logfn with the data in logfn (and its
+        journal).  Returns the number of objects added."""
+        # the stamp is taken first so a change made while reading is noticed
+        stamp = get_log_stamp(logfn)
+        ds = DataSet.read_from_file(cls_data, logfn)
+        try:
+            self.conn.execute('BEGIN')
+            self.__replace(cls_data, logfn, ds.dataset.values(), stamp)
+            self.conn.commit()
+        except sqlite3.Error, e:
+            self.conn.rollback()
+            raise ResultDBError('unable to import %s into the result store: %s' % (logfn, str(e)))
+        return len(ds.dataset)
+
+    def refresh(self, cls_data, logfn):
+        """Re-imports logfn if it (or its journal) has changed since it was
+        last imported.  Returns whether the store has the data in logfn, i.e.,
+        False if logfn does not exist and no data was ever stored for it."""
+        (table, _) = TABLES[cls_data]
+        log = get_log_name(logfn)
+        stamp = get_log_stamp(logfn)
+        try:
+            if stamp is None:
+                return self.conn.execute('SELECT 1 FROM %s WHERE log = ? LIMIT 1' % table, (log,)).fetchone() is not None
+            row = self.conn.execute('SELECT stamp FROM log_stamps WHERE tbl = ? AND log = ?', (table, log)).fetchone()
+        except sqlite3.Error, e:
+            raise ResultDBError('query failed: %s' % str(e))
+        if row is None or row[0] != stamp:
+            self.import_log_file(cls_data, logfn)
+        return True
+
+    def import_tree(self, quiet=False):
+        """Imports every log file in result/ and input/.  Returns the number
+        of objects added."""
+        total = 0
+        for (d, cls_data) in sorted(get_log_dirs().items()):
+            path = get_path_to_project_root() + d
+            if not os.path.isdir(path):
+                continue
+            for fn in sorted(os.listdir(path)):
+                if not is_log_filename(cls_data, fn) or not os.path.isfile(path + fn):
+                    continue
+                try:
+                    n = self.import_log_file(cls_data, path + fn)
+                except DataError, e:
+                    print >> sys.stderr, 'skipping %s: %s' % (d + fn, str(e))
+                    continue
+                if not quiet:
+                    print 'imported %u rows from %s' % (n, d + fn)
+                total += n
+        return total
+
+__result_db = None
+def get_result_db():
+    """Returns the ResultDB named by RESULT_DB_ENV (None if it is not set or
+    sqlite3 is not available)."""
+    global __result_db
+    path = os.environ.get(RESULT_DB_ENV)
+    if not path:
+        return None
+    if sqlite3 is None:
+        print >> sys.stderr, 'warning: ignoring $%s (the sqlite3 module is not available)' % RESULT_DB_ENV
+        os.environ[RESULT_DB_ENV] = ''
+        return None
+    if __result_db is None:
+        __result_db = ResultDB(path)
+    return __result_db
+
+def read_dataset(cls_data, logfn, mustExist=False):
+    """Like DataSet.read_from_file, but the data is read from the result store
+    if one is in use (after re-importing logfn if it has changed)."""
+    db = get_result_db()
+    if db is not None and db.refresh(cls_data, logfn):
+        return db.read_dataset(cls_data, logfn)
+    return DataSet.read_from_file(cls_data, logfn, mustExist)
+
+def read_keys(cls_data, logfn):
+    """Returns a set of the keys (see mykey) of the cls_data objects in
+    logfn, which are read from the result store's index if one is in use."""
+    db = get_result_db()
+    if db is not None and db.refresh(cls_data, logfn):
+        return db.select_keys(cls_data, logfn)
+    return set(DataSet.read_from_file(cls_data, logfn).dataset.keys())
+
+def main(argv=sys.argv[1:]):
+    usage = """usage: %prog [options] DB
+Manages the SQLite result store DB (set $""" + RESULT_DB_ENV + """ to DB to use it)."""
+    parser = OptionParser(usage)
+    parser.add_option("-i", "--import",
+                      action="store_true", default=False, dest="import_tree",
+                      help="import the data in every log file in result/ and input/")
+    parser.add_option("-l", "--list",
+                      action="store_true", default=False,
+                      help="list how many rows the store has for each log file")
+    parser.add_option("-q", "--quiet",
+                      action="store_true", default=False,
+                      help="do not list each log file which is imported")
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("expected exactly one DB")
+
+    try:
+        db = ResultDB(args[0])
+        if options.import_tree:
+            print 'imported %u rows' % db.import_tree(options.quiet)
+        if options.list:
+            for (table, log, n) in db.get_counts():
+                print '%s\t%s\t%u' % (table, log, n)
+        db.close()
+    except ResultDBError, e:
+        print >> sys.stderr, 'error: ' + str(e)
+        return -1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
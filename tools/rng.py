@@ -0,0 +1,104 @@
+"""A counter-based random number generator (SplitMix64).
+
+The kth output of a stream is a pure function of the seed, the stream number
+and k: mix64(key + (k + 1) * GOLDEN) where key is derived from the seed and the
+stream.  Unlike random.Random (Mersenne Twister), any output can be computed
+without replaying the outputs before it, blocks of outputs can be computed
+with a few NumPy array operations, and independent streams (e.g., one per
+shard) need no coordination.
+
+Two interfaces are provided:
+  CounterRandom: the scalar random.Random methods used by generate_input.py
+  CounterRng:    the block numpy.random.RandomState methods it uses, plus
+                 random access (random_at, uniform_at)
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # only needed by CounterRng
+
+MASK64 = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+
+# scales the top 53 bits of an output to a float in [0, 1)
+TO_UNIT = 1.0 / (1 << 53)
+
+def mix64(z):
+    """SplitMix64's finalizer: a bijection on 64-bit integers."""
+    z = ((z ^ (z >> 30)) * MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * MIX2) & MASK64
+    return z ^ (z >> 31)
+
+def get_stream_key(seed, stream):
+    """Returns the key of stream number stream of seed."""
+    return mix64((seed & MASK64) ^ mix64((stream * GOLDEN) & MASK64))
+
+def random_at(key, k):
+    """Returns the kth output of the stream with key key as a float in [0, 1)."""
+    return (mix64((key + (k + 1) * GOLDEN) & MASK64) >> 11) * TO_UNIT
+
+class CounterRandom:
+    """A counter-based replacement for the random.Random methods used to
+    generate graphs (random, uniform and randint)."""
+    def __init__(self, seed, stream=0):
+        self.key = get_stream_key(seed, stream)
+        self.pos = 0
+
+    def random(self):
+        self.pos += 1
+        z = (self.key + self.pos * GOLDEN) & MASK64
+        z = ((z ^ (z >> 30)) * MIX1) & MASK64
+        z = ((z ^ (z >> 27)) * MIX2) & MASK64
+        return ((z ^ (z >> 31)) >> 11) * TO_UNIT
+
+    def uniform(self, a, b):
+        """Returns a float in [a, b] (like random.Random.uniform)."""
+        return a + (b - a) * self.random()
+
+    def randint(self, a, b):
+        """Returns an integer in [a, b] (like random.Random.randint)."""
+        return a + int(self.random() * (b - a + 1))
+
+class CounterRng:
+    """A counter-based replacement for the numpy.random.RandomState methods
+    used to generate graphs.  Outputs are computed a block at a time."""
+    def __init__(self, seed, stream=0):
+        self.seed = seed
+        self.key = get_stream_key(seed, stream)
+        self.pos = 0
+
+    def random_at(self, ks):
+        """Returns the outputs at positions ks (an array) as floats in [0, 1)
+        without changing the stream's position."""
+        z = numpy.asarray(ks, dtype=numpy.uint64) + numpy.uint64(1)
+        z = z * numpy.uint64(GOLDEN) + numpy.uint64(self.key)
+        z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(MIX1)
+        z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(MIX2)
+        z ^= z >> numpy.uint64(31)
+        return (z >> numpy.uint64(11)).astype(numpy.float64) * TO_UNIT
+
+    def uniform_at(self, ks, low, high):
+        """Returns floats in [low, high) for the outputs at positions ks."""
+        return low + (high - low) * self.random_at(ks)
+
+    def random_sample(self, size):
+        n = size if isinstance(size, (int, long)) else int(numpy.prod(size))
+        ks = numpy.arange(self.pos, self.pos + n, dtype=numpy.uint64)
+        self.pos += n
+        return self.random_at(ks).reshape(size)
+
+    def uniform(self, low, high, size):
+        return low + (high - low) * self.random_sample(size)
+
+    def randint(self, low, high, size):
+        """Returns integers in [low, high) (like RandomState.randint)."""
+        return low + (self.random_sample(size) * (high - low)).astype(numpy.int64)
+
+    def binomial(self, n, p):
+        """Returns a binomial(n, p) sample.  It is drawn by a RandomState seeded
+        with the next output, so it too is a function of the seed."""
+        z = int(self.random_sample(1)[0] * (1 << 53))
+        return numpy.random.RandomState([z & 0xFFFFFFFF, z >> 32]).binomial(n, p)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+"""Runs a benchmark suite: named families of workloads defined in an INI file
+(see conf/suites/).  Each section other than [suite] is a family:
+
+  type         ratio:     graphs with |E| edges for each |E|/|V| ratio
+                          (keys: edges, ratios)
+               complete:  complete graphs (keys: vertices or edges)
+               geometric: vertices placed in a unit cube of dims dimensions
+                          with edges weighted by distance, i.e. the loc-N
+                          workloads of part 2, so their MST weights are logged
+                          (keys: dims, vertices and optionally edges)
+               fan:       a fan of edge densities for each |V| as generated by
+                          generate_fanned_input.py (keys: vertices,
+                          max_density, density_step, zero)
+  reps         number of different inputs (seeds) of each size
+  runs         number of measured runs on each input
+  warmup       number of unlogged warmup runs on each input
+  time_budget  seconds after which no more runs are started on an input
+
+Lists of sizes are comma separated numbers or LO-HI/STEP ranges (inclusive).
+Keys in [DEFAULT] apply to every family.  The seed of each input is derived
+from the seed in [suite], the family and the input's size, so a suite always
+benchmarks the same graphs.
+"""
+
+from ConfigParser import ConfigParser, Error as ConfigError
+from data import InputSolution
+from generate_fanned_input import get_edges_from_density
+from generate_input import edges_in_complete_undirected_graph
+from mstutil import get_path_to_tools_root, quiet_remove, random_tmp_filename
+from optparse import OptionParser
+from math import ceil, sqrt
+import hashlib, os, sys
+
+FAMILY_TYPES = ('ratio', 'complete', 'geometric', 'fan')
+
+class SuiteError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return self.msg
+
+def get_path_to_suites():
+    return get_path_to_tools_root() + 'conf/suites/'
+
+def get_suite_filename(name):
+    """Returns the file which defines the suite name (a path or the name of a
+    suite in conf/suites/)."""
+    if os.path.exists(name):
+        return name
+    return get_path_to_suites() + name + '.suite'
+
+def parse_list(s, conv=int):
+    """Parses a comma separated list of numbers and LO-HI/STEP ranges."""
+    ret = []
+    for part in s.split(','):
+        part = part.strip()
+        if '-' in part[1:]:
+            (lohi, _, step) = part.partition('/')
+            (lo, hi) = lohi.split('-', 1)
+            (lo, hi, step) = (conv(lo), conv(hi), conv(step or '1'))
+            if step <= 0:
+                raise ValueError('step must be positive: ' + part)
+            v = lo
+            while v <= hi:
+                ret.append(v)
+                v += step
+        else:
+            ret.append(conv(part))
+    return ret
+
+def vertices_in_complete_undirected_graph(num_edges):
+    return int(ceil((sqrt(8.0 * num_edges + 1.0) + 1.0) / 2.0))
+
+def derive_seed(suite_seed, family, num_verts, num_edges, rep):
+    """Returns the random seed of an input in a suite."""
+    h = hashlib.sha1('%s:%s:%u:%u:%u' % (suite_seed, family, num_verts, num_edges, rep)).hexdigest()
+    return int(h[:16], 16) >> 1
+
+class Family:
+    """A named family of workloads in a suite."""
+    def __init__(self, name, cfg, suite_seed):
+        self.name = name
+        self.cfg = cfg
+        self.suite_seed = suite_seed
+        self.type = self.get('type')
+        if self.type not in FAMILY_TYPES:
+            raise SuiteError('%s: type must be one of %s' % (name, ', '.join(FAMILY_TYPES)))
+        self.reps = self.get('reps', int, 1)
+        self.runs = self.get('runs', int, 1)
+        self.warmup = self.get('warmup', int, 0)
+        self.time_budget = self.get('time_budget', float, None)
+        if self.reps < 1 or self.runs < 1 or self.warmup < 0:
+            raise SuiteError('%s: reps and runs must be at least 1 and warmup must not be negative' % name)
+
+    def get(self, key, conv=str, default=ConfigError):
+        """Returns the value of key converted by conv (default if key is not
+        set; it is an error for key to be missing if no default is given)."""
+        if not self.cfg.has_option(self.name, key):
+            if default is ConfigError:
+                raise SuiteError('%s: missing %s' % (self.name, key))
+            return default
+        try:
+            return conv(self.cfg.get(self.name, key))
+        except ValueError, e:
+            raise SuiteError('%s: invalid %s: %s' % (self.name, key, str(e)))
+
+    def get_list(self, key, conv=int, default=ConfigError):
+        return self.get(key, lambda s : parse_list(s, conv), default)
+
+    def get_sizes(self):
+        """Returns a list of (|V|, |E|) of the inputs in this family."""
+        sizes = []
+        if self.type == 'ratio':
+            for e in self.get_list('edges'):
+                for r in self.get_list('ratios', float):
+                    v = int(e / r)
+                    if v > 1 and e < edges_in_complete_undirected_graph(v):
+                        sizes.append((v, e))
+        elif self.type == 'complete':
+            if self.cfg.has_option(self.name, 'vertices'):
+                verts = self.get_list('vertices')
+            else:
+                verts = [vertices_in_complete_undirected_graph(e) for e in self.get_list('edges')]
+            sizes = [(v, edges_in_complete_undirected_graph(v)) for v in verts]
+        elif self.type == 'geometric':
+            verts = self.get_list('vertices')
+            edges = self.get_list('edges', int, [None] * len(verts))
+            if len(edges) != len(verts):
+                raise SuiteError('%s: vertices and edges must have the same length' % self.name)
+            sizes = [(v, edges_in_complete_undirected_graph(v) if e is None else e) for (v, e) in zip(verts, edges)]
+        else:
+            max_density = self.get('max_density', float, 1.0)
+            step = self.get('density_step', float, 0.25)
+            zero = self.get('zero', lambda s : s.lower() in ('1', 'yes', 'true', 'on'), False)
+            if step <= 0.0:
+                raise SuiteError('%s: density_step must be positive' % self.name)
+            densities = [max_density - i * step for i in range(int(max_density / step + 1e-9) + 1)]
+            densities = [max(0.0, d) for d in densities if d > 1e-9 or zero]
+            for v in self.get_list('vertices'):
+                for d in densities:
+                    sizes.append((v, get_edges_from_density(v, d)))
+        return sizes
+
+    def get_inputs(self):
+        """Returns an InputSolution (without an MST weight) for each input."""
+        if self.type == 'geometric':
+            (prec, dims, min_val, max_val) = (15, self.get('dims', int), 0, 1)
+            if dims < 1:
+                raise SuiteError('%s: dims must be at least 1' % self.name)
+        else:
+            (prec, dims, min_val, max_val) = (1, 0, 0, 100000)
+        inputs = []
+        for (v, e) in self.get_sizes():
+            for rep in range(self.reps):
+                seed = derive_seed(self.suite_seed, self.name, v, e, rep)
+                inputs.append(InputSolution(prec, dims, min_val, max_val, v, e, seed))
+        return inputs
+
+    def make_run_test_args(self):
+        args = '-n %u -w %u' % (self.runs, self.warmup)
+        if self.time_budget is not None:
+            args += ' -b %s' % str(self.time_budget)
+        return args
+
+def read_suite(fn):
+    """Returns a list of the Families in the suite defined in fn."""
+    cfg = ConfigParser()
+    try:
+        if len(cfg.read(fn)) == 0:
+            raise SuiteError('unable to read suite file ' + fn)
+        suite_seed = cfg.get('suite', 'seed') if cfg.has_option('suite', 'seed') else '0'
+        return [Family(name, cfg, suite_seed) for name in cfg.sections() if name != 'suite']
+    except ConfigError, e:
+        raise SuiteError('%s: %s' % (fn, str(e)))
+
+def run_family(family, run_test_args):
+    """Generates (or reuses) the inputs of family and benchmarks each of them
+    with one run_test.py batch.  Returns run_test.py's exit code."""
+    inputs_fn = random_tmp_filename(10, 'suite-' + family.name) + '.inputs'
+    try:
+        fh = open(inputs_fn, 'w')
+        inputs = family.get_inputs()
+        if len(inputs) > 0:
+            print >> fh, inputs[0].header_row()
+        for i in inputs:
+            print >> fh, str(i)
+        fh.close()
+        cmd = 'run_test.py -I %s %s %s' % (inputs_fn, family.make_run_test_args(), run_test_args)
+        return os.system(get_path_to_tools_root() + cmd)
+    finally:
+        quiet_remove(inputs_fn)
+
+def main(argv=sys.argv[1:]):
+    usage = """usage: %prog [options] SUITE
+Generates the inputs of each family of workloads in SUITE (a suite file or the
+name of one in conf/suites/) and benchmarks them with run_test.py.
+
+Example: a full performance sweep of a tracked revision, logging results:
+    %prog -r 2f8dfb5239 -t 0 full"""
+    parser = OptionParser(usage)
+    parser.add_option("-a", "--run-test-args",
+                      metavar="ARGS", default="",
+                      help="extra arguments to pass to run_test.py (e.g., '-k -c')")
+    parser.add_option("-f", "--family",
+                      metavar="NAME", action="append",
+                      help="only run the family NAME (may be given more than once)")
+    parser.add_option("-l", "--list",
+                      action="store_true", default=False,
+                      help="list each family's inputs rather than running them")
+    parser.add_option("-r", "--rev",
+                      help="SHA1 of the git revision to build the mst binary from [default: use the mst binary in src/ and do not log]")
+    parser.add_option("-t", "--trial-num",
+                      type="int", default=-1,
+                      help="run/trial identifier of the first run on each input [default: do not log]")
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("expected exactly one SUITE")
+
+    try:
+        families = read_suite(get_suite_filename(args[0]))
+        if options.family:
+            unknown = [f for f in options.family if f not in [family.name for family in families]]
+            if len(unknown) > 0:
+                parser.error('unknown family: ' + ', '.join(unknown))
+            families = [family for family in families if family.name in options.family]
+
+        if options.list:
+            for family in families:
+                inputs = family.get_inputs()
+                print '[%s] %s: %u inputs (run_test.py %s)' % (family.name, family.type, len(inputs), family.make_run_test_args())
+                for i in inputs:
+                    print '    ' + i.input().make_args_for_generate_input()
+            return 0
+
+        run_test_args = options.run_test_args
+        if options.rev is not None:
+            run_test_args += ' -r %s' % options.rev
+        if options.trial_num >= 0:
+            run_test_args += ' -t %u' % options.trial_num
+        failed = []
+        for family in families:
+            print '==================================================\nfamily %s (%s)' % (family.name, family.type)
+            if run_family(family, run_test_args) != 0:
+                failed.append(family.name)
+    except SuiteError, e:
+        print >> sys.stderr, 'error: ' + str(e)
+        return -1
+
+    if len(failed) > 0:
+        print >> sys.stderr, 'failed families: ' + ', '.join(failed)
+        return -1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,19 @@
 #!/usr/bin/env python
 
+from build_cache import BuildCache, BuildCacheError, DEFAULT_MAKE_ARGS
 from check_output import check, CheckerError, extract_answer
-from data import DataError, DataSet, PerfResult, WeightResult, CORRECT, INCORRECT
+from data import CounterResult, DataError, DataSet, InputSolution, MemResult, PerfResult, WeightResult, CORRECT, INCORRECT
 from data import extract_input_footer, ExtractInputFooterError, ppinput
-from generate_input import main as generate_input, is_input_for_part2
+from generate_input import main as generate_input, get_input_variant, is_input_for_part2
+from gzip_graph import decompress_graph, is_gzip_graph
+from input_cache import InputCache, InputCacheError
 from mstutil import get_path_to_mst_binary, get_path_to_tools_root, quiet_remove, random_tmp_filename
 from optparse import OptionParser
+from result import ResultAccumulator, MAX_DF, T_DISTRIBUTION
 from socket import gethostname
-import os, sys
+from timing import get_perf_stat_argv, get_phase_times_env, is_perf_stat_available, read_counters, read_phase_times
+from timing import run_and_time, TimingError, COUNTERS, PHASES
+import os, sys, time
 
 # include-with-submit # note: this file has been automatically altered for submission to reduce dependencies
 # include-with-submit #       on functionality not strictly needed for the 'random' binary to work
@@ -32,7 +38,16 @@ def print_benchmark(input_graph, out, rev, trial_num, for_time):
     print msg + ', out=%s)' % out
     return ret
 
-def benchmark(mst_binary, input_graph, out, rev, trial_num, for_time):
+def benchmark(mst_binary, input_graph, out, rev, trial_num, for_time, counters=False, sample_ms=None):
+    """Runs mst on input_graph and logs the result.  Returns the RunStats of the
+    run (None if mst could not be run or its output could not be read).  If
+    counters is True, a timed run is wrapped in perf stat and its hardware
+    counters are logged instead of its time (perf adds its own overhead).
+    Likewise, if sample_ms is not None, its RSS is sampled every sample_ms
+    milliseconds and its memory use is logged instead of its time."""
+    counters = counters and for_time
+    if not for_time:
+        sample_ms = None
     rel_input_graph = ppinput(input_graph)
     if not print_benchmark(rel_input_graph, out, rev, trial_num, for_time):
         trial_num = -1  # cancel logging
@@ -44,28 +59,39 @@ def benchmark(mst_binary, input_graph, out, rev, trial_num, for_time):
         if out == '/dev/null':
             out = random_tmp_filename(10, 'weight-for-time')
             kill_out = True
-
-        save_cmd = '> ' + out
     else:
-        # save just the first line of output so we can get the weight
+        # save the output so we can get the weight (from its first line)
         out = random_tmp_filename(10, 'weight')
-        save_cmd = '| head -n 1 > ' + out
         kill_out = True
 
-    # run mst (and time it)
-    time_file = random_tmp_filename(10, 'time')
-    cmd = '/usr/bin/time -f %%U -o %s %s %s %s' % (time_file, mst_binary, input_graph, save_cmd)
-    ret = os.system(cmd)
-    if ret != 0:
-        print >> sys.stderr, "mst exited with error: " + cmd
-        quiet_remove(time_file)
-        return
+    # run mst (and time it and each of its phases)
+    err = random_tmp_filename(10, 'phases')
+    argv = [mst_binary, input_graph]
+    if counters:
+        counters_fn = random_tmp_filename(10, 'counters')
+        argv = get_perf_stat_argv(counters_fn) + argv
     try:
-        time_sec = extract_answer(time_file)
-    except CheckerError, e:
-        print >> sys.stderr, "failed to read time file: " + str(e)
+        try:
+            stats = run_and_time(argv, out, err, get_phase_times_env(), sample_ms)
+            (phases, err_lines) = read_phase_times(err)
+            if counters:
+                counts = read_counters(counters_fn)
+        finally:
+            quiet_remove(err)
+            if counters:
+                quiet_remove(counters_fn)
+    except (TimingError, IOError), e:
+        print >> sys.stderr, "unable to run mst: " + str(e)
         return
-    quiet_remove(time_file)
+    sys.stderr.write(''.join(err_lines))
+    if len(phases) != len(PHASES):
+        phases = {}  # mst did not report them (e.g., it is from an older revision)
+    if stats.exit_code() != 0:
+        print >> sys.stderr, "mst exited with error %d: %s %s" % (stats.exit_code(), mst_binary, input_graph)
+        if kill_out:
+            quiet_remove(out)
+        return
+    time_sec = stats.user_sec
 
     # try to get the weight (if we output the result somewhere)
     mst_weight = -1.0
@@ -82,9 +108,14 @@ def benchmark(mst_binary, input_graph, out, rev, trial_num, for_time):
         str_mst_weight = ''
 
     # check to see if we are supposed to log the result
-    print ('benchmark result ===> time=%.2f'+str_mst_weight) % time_sec
+    str_phases = ''.join(['  %s=%.6f' % (p, phases[p]) for p in PHASES if phases.has_key(p)])
+    if counters:
+        str_phases += ''.join(['  %s=%s' % (c, 'n/a' if counts[c] is None else counts[c]) for c in COUNTERS])
+    if sample_ms is not None:
+        str_phases += '  rss_samples=%u peak_sampled_rss=%uKB' % (len(stats.timeline), max([0] + [kb for (_, kb) in stats.timeline]))
+    print ('benchmark result ===> time=%.6f  %s' + str_phases + str_mst_weight) % (time_sec, str(stats))
     if trial_num < 0 and for_time:
-        return
+        return stats
 
     # extract properties of the graph
     try:
@@ -93,35 +124,144 @@ def benchmark(mst_binary, input_graph, out, rev, trial_num, for_time):
         raise CheckerError("run test error: unable to extract the input footer for %s: %s" % (rel_input_graph, str(e)))
 
     # log the result
-    if for_time:
-        data = PerfResult(ti.num_verts, ti.num_edges, ti.seed, rev, trial_num, time_sec, mst_weight)
-        try:
-            DataSet.add_data_to_log_file(data)
-        except DataError, e:
-            print >> sys.stderr, "Unable to log result to file %s (was trying to log %s): %s" % (data.get_path(), str(data), str(e))
+    if counters:
+        c = [(-1 if counts[name] is None else counts[name]) for name in COUNTERS]
+        data = CounterResult(ti.num_verts, ti.num_edges, ti.seed, rev, trial_num, c[0], c[1], c[2], c[3])
+    elif sample_ms is not None:
+        data = MemResult(ti.num_verts, ti.num_edges, ti.seed, rev, trial_num, stats.maxrss_kb, stats.timeline)
+    elif for_time:
+        data = PerfResult(ti.num_verts, ti.num_edges, ti.seed, rev, trial_num, time_sec, mst_weight,
+                          wall_sec=stats.wall_sec, sys_sec=stats.sys_sec, maxrss_kb=stats.maxrss_kb,
+                          minflt=stats.minflt, majflt=stats.majflt,
+                          parse_sec=phases.get('parse'), compute_sec=phases.get('compute'), output_sec=phases.get('output'))
     else:
         data = WeightResult(ti.dims, ti.num_verts, ti.seed, rev, trial_num, mst_weight)
+    log_result(data)
+    return stats
+
+# results waiting to be logged (None unless results are being logged in a batch)
+__pending_results = None
+
+def log_result(data):
+    """Logs data now, or when flush_results() is called if results are being
+    logged in a batch."""
+    if __pending_results is not None:
+        __pending_results.append(data)
+        return
+    try:
+        DataSet.add_data_to_log_file(data)
+    except DataError, e:
+        print >> sys.stderr, "Unable to log result to file %s (was trying to log %s): %s" % (data.get_path(), str(data), str(e))
+
+def start_batch():
+    """Holds results until flush_results() is called."""
+    global __pending_results
+    if __pending_results is None:
+        __pending_results = []
+
+def flush_results():
+    """Logs the results held since start_batch() (one update per log file)."""
+    global __pending_results
+    if __pending_results:
         try:
-            DataSet.add_data_to_log_file(data)
+            DataSet.add_data_list_to_log_files(__pending_results)
         except DataError, e:
-            print >> sys.stderr, "Unable to log result to file %s (was trying to log %s): %s" % (data.get_path(), str(data), str(e))
+            print >> sys.stderr, "Unable to log %u results: %s" % (len(__pending_results), str(e))
+    __pending_results = None
+
+# the fewest measured runs the confidence interval is computed from
+MIN_RUNS_FOR_CI = 3
+
+class Samples:
+    """The user times of the measured runs of a benchmark."""
+    def __init__(self, ci):
+        self.ci = ci
+        self.acc = None
 
-def test_mst(is_test_perf, mst_binary, input_graph, out, do_log, rev, trial_num):
+    def add(self, stats):
+        """Adds the time of a run (stats is None if the run failed)."""
+        if stats is None:
+            return
+        if self.acc is None:
+            self.acc = ResultAccumulator(stats.user_sec)
+            self.acc.defaultCI = self.ci
+        else:
+            self.acc.add_data(stats.user_sec)
+
+    def count(self):
+        return 0 if self.acc is None else len(self.acc.values)
+
+    def is_ci_narrower_than(self, rel_width):
+        """Returns whether the confidence interval of the mean is narrower than
+        rel_width times the mean."""
+        if self.count() < MIN_RUNS_FOR_CI:
+            return False
+        self.acc.compute_stats()
+        width = self.acc.upper99 - self.acc.lower99
+        return width <= rel_width * self.acc.mean
+
+    def summary(self):
+        self.acc.compute_stats()
+        fmt = 'benchmark summary ===> runs=%u median=%.6f mean=%.6f %u%% CI=[%.6f, %.6f]'
+        return fmt % (self.count(), self.acc.med, self.acc.mean, self.ci, self.acc.lower99, self.acc.upper99)
+
+def test_mst(is_test_perf, mst_binary, input_graph, out, do_log, rev, trial_num, counters=False, sample_ms=None):
     trial_num = -1 if not do_log else trial_num
-    benchmark(mst_binary, input_graph, out, rev, trial_num, is_test_perf)
+    return benchmark(mst_binary, __get_uncompressed_input(input_graph), out, rev, trial_num, is_test_perf, counters, sample_ms)
 
 __input_graph_to_cleanup = None
 __files_to_cleanup = []
+__cached_input = None
+__decompressed_input = None  # (compressed graph, decompressed copy)
+def __remove_decompressed_input():
+    global __decompressed_input
+    if __decompressed_input is not None:
+        quiet_remove(__decompressed_input[1])
+        __decompressed_input = None
+
+def __get_uncompressed_input(input_graph):
+    """Returns input_graph, or a decompressed copy of it (on a tmpfs if one is
+    available) if it is compressed since mst only reads uncompressed graphs.
+    The copy is reused until a different graph is requested."""
+    global __decompressed_input
+    if not is_gzip_graph(input_graph):
+        return input_graph
+    if __decompressed_input is None or __decompressed_input[0] != input_graph:
+        __remove_decompressed_input()
+        __decompressed_input = (input_graph, decompress_graph(input_graph))
+    return __decompressed_input[1]
+def __release_cached_input():
+    global __cached_input
+    if __cached_input is not None:
+        __cached_input.release()
+        __cached_input = None
+
 def __cleanup_and_exit(code=0):
+    flush_results()
     for fn in __files_to_cleanup:
         quiet_remove(fn)
     if __input_graph_to_cleanup is not None:
         quiet_remove(__input_graph_to_cleanup)
+    __release_cached_input()
+    __remove_decompressed_input()
     sys.exit(code)
 
-def __generate_input_graph(argstr, cleanup_generated_input):
-    """Generate a graph from the specified string of arguments and return the file it is saved in."""
-    global __input_graph_to_cleanup
+def __generate_input_graph(argstr, cleanup_generated_input, use_cache=False):
+    """Generate a graph from the specified string of arguments and return the
+    file it is saved in.  If use_cache is True and argstr specifies a seed,
+    the graph comes from the input cache instead (and is never deleted)."""
+    global __input_graph_to_cleanup, __cached_input
+
+    __release_cached_input()
+    if use_cache:
+        try:
+            __cached_input = InputCache().get(argstr)
+        except (InputCacheError, IOError, OSError), e:
+            print 'error: aborting test (cached input generation failed): %s: %s' % (str(e), argstr)
+            __cleanup_and_exit(-1)
+        if __cached_input is not None:
+            __input_graph_to_cleanup = None
+            return __cached_input.path
 
     try:
         if cleanup_generated_input:
@@ -142,6 +282,24 @@ def __generate_input_graph(argstr, cleanup_generated_input):
         __cleanup_and_exit(ret)
     return input_graph
 
+INPUT_SEP = '--------------------------------------------------'
+
+def read_inputs(fn):
+    """Reads the inputs to benchmark in batch mode from fn.  Returns a list of
+    (input_graph, gen_input_args) (one of which is None) for each input."""
+    if fn.endswith('.inputs'):
+        ds = DataSet.read_from_file(InputSolution, fn, True)
+        return [(None, i.input().make_args_for_generate_input() + ' --may-use-existing')
+                for i in sorted(ds.dataset.values(), key=lambda d : d.sort_key())]
+    inputs = []
+    fh = open(fn, 'r')
+    for line in fh:
+        line = line.strip()
+        if len(line) > 0 and line[0] != '#':
+            inputs.append((line, None))
+    fh.close()
+    return inputs
+
 def main():
     usage = """usage: %prog [options]
 Tests the performance of the MST implementation.  Alternatively, when -g is used
@@ -153,6 +311,12 @@ computation only):
   edge,NUM_VERTICES: random uniform edge weights [0, 1]
   locN,NUM_VERTICES: randomly position vertices in N-dimensional space with axis ranges [0,1]"""
     parser = OptionParser(usage)
+    parser.add_option("-B", "--mst-binary",
+                      metavar="FILE",
+                      help="use FILE as the mst binary (it must have been built from the revision given by -r) rather than building it")
+    parser.add_option("-p", "--perf-counters",
+                      action="store_true", default=False,
+                      help="run mst under perf stat and log its hardware counters (cycles, instructions, cache and branch misses) instead of its time; ignored if perf stat is unavailable")
     parser.add_option("-c", "--check",
                       action="store_true", default=False,
                       help="whether to check output using check_output.py (only for the first run; exits if the check fails)")
@@ -165,15 +329,27 @@ computation only):
     parser.add_option("-G", "--generate-temp-input",
                       metavar="GEN_ARGS",
                       help="same as -g, but delete the graph after this script is done")
+    parser.add_option("-k", "--cache",
+                      action="store_true", default=False,
+                      help="get the graph for -g or -G from the input cache (see input_cache.py) if GEN_ARGS includes a random seed (-r)")
     parser.add_option("-i", "--input-file",
                       metavar="FILE",
                       help="FILE which describes the graph to use as input")
+    parser.add_option("-I", "--inputs",
+                      metavar="FILE",
+                      help="benchmark each input in FILE in turn: a .inputs file (each input is generated like -g) or a list of graph files (one per line); results are logged once all inputs are done")
     parser.add_option("-l", "--inputs-list-file",
                       metavar="FILE",
                       help="specifies where to log correctness info (which inputs list log file) [default: inferred]")
+    parser.add_option("--make-args",
+                      metavar="ARGS", default=DEFAULT_MAKE_ARGS,
+                      help="arguments to pass to make when building the mst binary for -r (see build_cache.py) [default: %default]")
+    parser.add_option("-m", "--mem-timeline",
+                      metavar="MS", type="float",
+                      help="sample the RSS of mst every MS milliseconds and log its memory use (max RSS and the samples) instead of its time")
     parser.add_option("-n", "--num-runs",
-                      metavar="N", type="int", default=1,
-                      help="number of runs to execute [default: %default]")
+                      metavar="N", type="int",
+                      help="number of runs to execute (the maximum number of runs if -s is used) [default: 1, or %u with -s]" % MAX_DF)
     parser.add_option("-o", "--output-file",
                       metavar="FILE",
                       help="where to save the output MST (stdout prints to stdout) [default: do not save output]")
@@ -185,6 +361,18 @@ computation only):
     parser.add_option("-x", "--dont-log",
                       action="store_true", default=False,
                       help="do not log the result")
+    parser.add_option("-w", "--warmup",
+                      metavar="N", type="int", default=0,
+                      help="number of warmup runs to execute on the (first) input before the measured runs (they are not logged) [default: %default]")
+    parser.add_option("-s", "--stop-at-ci-width",
+                      metavar="W", type="float",
+                      help="run on the same input until the confidence interval of the time is narrower than W times the mean (e.g., 0.02 for +/-1%)")
+    parser.add_option("-b", "--time-budget",
+                      metavar="SEC", type="float",
+                      help="do not start another run on an input once SEC seconds have passed since its first (warmup) run")
+    parser.add_option("--ci",
+                      metavar="PERCENT", type="int", default=95,
+                      help="confidence level of the interval used by -s and reported after multiple runs (90, 95 or 99) [default: %default]")
     parser.add_option("-t", "--trial-num",
                       type="int", default=-1,
                       help="run/trial identifier [default: do not log the trial, so ignore it]")
@@ -202,13 +390,29 @@ computation only):
             options.generate_input = options.generate_temp_input
             cleanup_generated_input = True
 
+    # whether results (or correctness results) will be logged
+    will_log = options.rev is not None and options.rev.lower() != 'current' and options.trial_num >= 0 and \
+               (options.check or options.check_exit_0 or not options.dont_log)
+
     # get the input file
     is_test_perf = True
     gen_input_args = None
-    if options.generate_input is not None and options.input_file is not None:
-        parser.error("-g and -i are mutually exclusive")
+    batch = None
+    input_graph = None
+    if len([o for o in (options.generate_input, options.input_file, options.inputs) if o is not None]) > 1:
+        parser.error("-g, -i and -I are mutually exclusive")
+    elif options.inputs is not None:
+        try:
+            batch = read_inputs(options.inputs)
+        except (DataError, IOError), e:
+            parser.error('unable to read %s: %s' % (options.inputs, str(e)))
     elif options.input_file is not None:
         input_graph = options.input_file
+        if will_log:
+            try:
+                extract_input_footer(input_graph)
+            except ExtractInputFooterError, e:
+                parser.error('results on %s cannot be logged: %s' % (input_graph, str(e)))
     elif options.generate_input is not None:
         s = options.generate_input.split(',',2)
         gen_type = s[0]
@@ -229,27 +433,60 @@ computation only):
         else:
             is_test_perf = False
 
-        input_graph = __generate_input_graph(gen_input_args, cleanup_generated_input)
+        # results are logged under the graph's Input, which must identify it
+        if will_log:
+            variant = get_input_variant(gen_input_args.split())
+            if variant:
+                parser.error('results on graphs generated with %s cannot be logged (omit -t or -r)' % ', '.join(variant))
+
+        input_graph = __generate_input_graph(gen_input_args, cleanup_generated_input, options.cache)
     else:
-        parser.error("at least one of -g and -i must be used to specify the input graph")
+        parser.error("at least one of -g, -i and -I must be used to specify the input graph")
 
+    if options.num_runs is None:
+        options.num_runs = 1 if options.stop_at_ci_width is None else MAX_DF
     if options.num_runs < 1:
         parser.error("-n must be at least 1")
+    if options.warmup < 0:
+        parser.error("-w must not be negative")
+    if options.stop_at_ci_width is not None and options.stop_at_ci_width <= 0:
+        parser.error("-s must be positive")
+    if not T_DISTRIBUTION.has_key(options.ci) or options.ci == 9995:
+        parser.error("--ci must be 90, 95 or 99")
 
     if options.trial_num < 0:
         options.dont_log = True
+    if options.mem_timeline is not None and options.mem_timeline <= 0:
+        parser.error("-m must be positive")
+    if options.mem_timeline is not None and options.perf_counters:
+        parser.error("-m and -p are mutually exclusive")
+    if options.perf_counters and not is_perf_stat_available():
+        print >> sys.stderr, 'warning: perf stat is unavailable (or cannot count events here): not collecting counters'
+        options.perf_counters = False
 
     # get the mst binary we want to test with
-    mst_binary = random_tmp_filename(10, 'mst')
-    __files_to_cleanup.append(mst_binary)
     if options.rev is None or options.rev.lower() == 'current':
         options.dont_log = True  # no logging allowed on binaries which aren't checked in to the repo
         options.trial_num = -1
         options.rev = ""         # tells the script to just use the current revision
-    cmd = 'copy_and_build_from_rev.sh %s %s %s' % (get_path_to_mst_binary(), mst_binary, options.rev)
-    if options.quiet:
-        cmd += ' > /dev/null'
-    ret = os.system(get_path_to_tools_root() + cmd) # exclude-from-submit
+    if options.mst_binary is not None:
+        mst_binary = options.mst_binary
+        ret = 0 if os.access(mst_binary, os.X_OK) else -1
+    elif options.rev != "":
+        # binaries built from committed revisions are cached
+        try:
+            mst_binary = BuildCache().get(options.rev, options.make_args, options.quiet) # exclude-from-submit
+            ret = 0
+        except (BuildCacheError, IOError, OSError), e:
+            print 'error: ' + str(e)
+            ret = -1
+    else:
+        mst_binary = random_tmp_filename(10, 'mst')
+        __files_to_cleanup.append(mst_binary)
+        cmd = 'copy_and_build_from_rev.sh %s %s %s' % (get_path_to_mst_binary(), mst_binary, options.rev)
+        if options.quiet:
+            cmd += ' > /dev/null'
+        ret = os.system(get_path_to_tools_root() + cmd) # exclude-from-submit
     # include-with-submit ret = 0
     # include-with-submit mst_binary = './mst'
     if ret != 0:
@@ -261,7 +498,39 @@ computation only):
     if options.check_exit_0:
         options.check = True
         check_fail_exit_code = 0
+    if not options.check and options.inputs_list_file:
+        print >> sys.stderr, 'warning: -l does nothing unless -c is also specified'
 
+    if batch is None:
+        if benchmark_input(options, mst_binary, input_graph, gen_input_args, is_test_perf, cleanup_generated_input) != CORRECT:
+            __cleanup_and_exit(check_fail_exit_code)  # incorrectness already reported by check()
+        __cleanup_and_exit()
+
+    # benchmark each input in the batch, logging all of the results at the end
+    start_batch()
+    first_trial_num = options.trial_num
+    num_incorrect = 0
+    for (i, (input_graph, gen_input_args)) in enumerate(batch):
+        print '%s\ninput %u of %u' % (INPUT_SEP, i + 1, len(batch))
+        options.trial_num = first_trial_num
+        if gen_input_args is not None:
+            is_test_perf = not is_input_for_part2(gen_input_args.split())
+            input_graph = __generate_input_graph(gen_input_args, cleanup_generated_input, options.cache)
+        else:
+            is_test_perf = True
+        if benchmark_input(options, mst_binary, input_graph, gen_input_args, is_test_perf, cleanup_generated_input) != CORRECT:
+            num_incorrect += 1
+    print INPUT_SEP
+    if num_incorrect > 0:
+        print 'the output was incorrect for %u of %u inputs' % (num_incorrect, len(batch))
+        __cleanup_and_exit(check_fail_exit_code)
+    __cleanup_and_exit()
+
+def benchmark_input(options, mst_binary, input_graph, gen_input_args, is_test_perf, cleanup_generated_input):
+    """Does the warmup runs and measured runs requested by options on one
+    input.  If gen_input_args is not None, the input is regenerated for each
+    run (unless -s is used).  Returns CORRECT unless the output was checked
+    and found to be incorrect."""
     # prepare the output file
     if options.output_file:
         out = options.output_file
@@ -272,12 +541,18 @@ computation only):
             __files_to_cleanup.append(out)
             out_is_temporary = True
         else:
-            if options.inputs_list_file:
-                print >> sys.stderr, 'warning: -l does nothing unless -c is also specified'
             out = "/dev/null"
 
+    # warm up (caches, page cache, frequency scaling) on the input
+    start = time.time()
+    for i in range(options.warmup):
+        print 'warmup run %u of %u' % (i + 1, options.warmup)
+        test_mst(is_test_perf, mst_binary, input_graph, "/dev/null", False, options.rev, -1)
+        print ''
+
     # do the first run (and check the output if requested)
-    test_mst(is_test_perf, mst_binary, input_graph, out, not options.dont_log, options.rev, options.trial_num)
+    samples = Samples(options.ci)
+    samples.add(test_mst(is_test_perf, mst_binary, input_graph, out, not options.dont_log, options.rev, options.trial_num, options.perf_counters, options.mem_timeline))
     if options.check:
         rev = None if options.rev is "" else options.rev
         run = None if options.trial_num < 0 else options.trial_num
@@ -291,22 +566,30 @@ computation only):
             quiet_remove(out)
 
         if ret != CORRECT:
-            __cleanup_and_exit(check_fail_exit_code)  # incorrectness already reported by check()
+            return ret  # incorrectness already reported by check()
         else:
             print 'Correct - output checks out!'
 
     # remaining runs, if any
     for _ in range(options.num_runs-1):
+        if options.stop_at_ci_width is not None and samples.is_ci_narrower_than(options.stop_at_ci_width):
+            print '\nstopping: the %u%% confidence interval is within +/-%.2f%% of the mean' % (options.ci, 50.0 * options.stop_at_ci_width)
+            break
+        if options.time_budget is not None and time.time() - start >= options.time_budget:
+            print '\nstopping: the time budget of %.1f seconds has run out' % options.time_budget
+            break
         print '' # empty line
         if options.trial_num >= 0:
             options.trial_num += 1
-        if gen_input_args is not None:
+        if gen_input_args is not None and options.stop_at_ci_width is None:
             if __input_graph_to_cleanup is not None:
                 quiet_remove(__input_graph_to_cleanup)
-            input_graph = __generate_input_graph(gen_input_args, cleanup_generated_input)
-        test_mst(is_test_perf, mst_binary, input_graph, "/dev/null", not options.dont_log, options.rev, options.trial_num)
+            input_graph = __generate_input_graph(gen_input_args, cleanup_generated_input, options.cache)
+        samples.add(test_mst(is_test_perf, mst_binary, input_graph, "/dev/null", not options.dont_log, options.rev, options.trial_num, options.perf_counters, options.mem_timeline))
 
-    __cleanup_and_exit()
+    if samples.count() > 1:
+        print '\n' + samples.summary()
+    return CORRECT
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,116 @@
+"""Runs data collection jobs (shell commands) on a pool of workers.
+
+Timing jobs each get a worker of their own which is pinned to one CPU (with
+taskset, so the job's children, e.g. mst, inherit the affinity).  No other
+job ever runs on those CPUs, so timing jobs do not interfere with each other
+or with the other jobs (e.g. correctness checks), which run concurrently on
+the remaining CPUs.  At least one CPU is always left for the other jobs.
+"""
+
+from multiprocessing import cpu_count
+from Queue import Queue
+import subprocess, sys, threading
+
+class SchedulerError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return self.msg
+
+def parse_cpu_list(s):
+    """Parses a list of CPUs like '1,2,4-7' into a sorted list of ints.  The
+    CPUs must exist on this machine."""
+    cpus = set()
+    try:
+        for part in s.split(','):
+            if '-' in part:
+                (lo, hi) = part.split('-', 1)
+                cpus.update(range(int(lo), int(hi) + 1))
+            else:
+                cpus.add(int(part))
+    except ValueError:
+        raise SchedulerError('invalid CPU list: ' + s)
+    if len(cpus) == 0 or min(cpus) < 0:
+        raise SchedulerError('invalid CPU list: ' + s)
+    if max(cpus) >= cpu_count():
+        raise SchedulerError('CPU %u does not exist (there are %u CPUs)' % (max(cpus), cpu_count()))
+    return sorted(cpus)
+
+def get_default_timing_cpus(num_workers):
+    """Returns the CPUs to pin num_workers timing workers to: CPU 0 is left
+    for the OS and other jobs."""
+    n = cpu_count()
+    if num_workers >= n:
+        raise SchedulerError('cannot run %u timing jobs in parallel on %u CPUs (one must be left for other jobs)' % (num_workers, n))
+    return range(1, 1 + num_workers)
+
+class Job:
+    """A shell command to run.  ret is its exit status once it has run."""
+    def __init__(self, cmd, desc, timing):
+        self.cmd = cmd
+        self.desc = desc
+        self.timing = timing
+        self.ret = None
+
+class Scheduler:
+    def __init__(self, timing_cpus):
+        """Timing jobs run on one worker per CPU in timing_cpus.  Other jobs
+        run on one worker per remaining CPU (there must be at least one)."""
+        self.timing_cpus = list(timing_cpus)
+        self.other_cpus = [c for c in range(cpu_count()) if c not in self.timing_cpus]
+        if len(self.other_cpus) == 0:
+            raise SchedulerError('no CPU is left for other jobs: timing jobs may use at most %u of the %u CPUs' % (cpu_count() - 1, cpu_count()))
+        self.timing_jobs = Queue()
+        self.other_jobs = Queue()
+        self.jobs = []
+        self.lock = threading.Lock()
+        self.num_done = 0
+
+    def add(self, job):
+        self.jobs.append(job)
+        if job.timing:
+            self.timing_jobs.put(job)
+        else:
+            self.other_jobs.put(job)
+
+    def __run_job(self, job, cpus):
+        cmd = 'taskset -c %s %s' % (','.join([str(c) for c in cpus]), job.cmd)
+        p = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=True)
+        output = p.communicate()[0]
+        job.ret = p.returncode
+
+        # print all of a job's output at once so jobs' outputs do not interleave
+        self.lock.acquire()
+        try:
+            self.num_done += 1
+            status = 'done' if job.ret == 0 else 'FAILED (exit code %d)' % job.ret
+            print '[%u/%u] %s: %s' % (self.num_done, len(self.jobs), status, job.desc)
+            sys.stdout.write(output)
+            sys.stdout.flush()
+        finally:
+            self.lock.release()
+
+    def __worker(self, queue, cpus):
+        while True:
+            job = queue.get()
+            if job is None:
+                return
+            self.__run_job(job, cpus)
+
+    def run(self):
+        """Runs all of the jobs which have been added and waits for them to
+        finish.  Returns a list of the jobs which failed."""
+        workers = [(self.timing_jobs, [c]) for c in self.timing_cpus]
+        workers += [(self.other_jobs, self.other_cpus) for _ in self.other_cpus]
+        threads = []
+        for (queue, cpus) in workers:
+            queue.put(None)  # one stop marker per worker
+        for (queue, cpus) in workers:
+            t = threading.Thread(target=self.__worker, args=(queue, cpus))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+        for t in threads:
+            while t.isAlive():
+                t.join(1.0)  # a timeout keeps Ctrl-C working
+        return [j for j in self.jobs if j.ret != 0]
@@ -0,0 +1,229 @@
+"""Runs a program and measures the resources it used.
+
+The program is launched directly (not through a shell or /usr/bin/time) and
+reaped with os.wait4() so its rusage is read straight from the kernel.  Times
+have microsecond resolution.
+
+The program's resident set size can also be sampled while it runs (from
+/proc/<pid>/status) to get a timeline of its memory use.  Hardware performance
+counters can also be collected by wrapping the program in
+perf stat (when perf is installed and the kernel lets us use the counters).
+"""
+
+import os, re, subprocess, sys, tempfile, time
+
+# mst writes the time of each phase to stderr if this is set in its environment
+PHASE_TIMES_ENV = 'MST_PHASE_TIMES'
+
+# the phases mst reports (in order)
+PHASES = ('parse', 'compute', 'output')
+
+__PHASE_RE = re.compile(r'^mst-phase (\w+) ([0-9.]+)$')
+
+# the hardware counters collected by perf stat (in order)
+COUNTERS = ('cycles', 'instructions', 'cache-misses', 'branch-misses')
+
+# whether perf stat can count COUNTERS here (None until it is first checked)
+__perf_stat_available = None
+
+class TimingError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return self.msg
+
+class RunStats:
+    """Resources used by one run of a program.  timeline is a list of (seconds
+    since the start, RSS in KB) samples if its memory use was sampled."""
+    def __init__(self, status, wall_sec, user_sec, sys_sec, maxrss_kb, minflt, majflt, timeline=None):
+        self.status = status
+        self.wall_sec = wall_sec
+        self.user_sec = user_sec
+        self.sys_sec = sys_sec
+        self.maxrss_kb = maxrss_kb
+        self.minflt = minflt
+        self.majflt = majflt
+        self.timeline = timeline
+
+    def exit_code(self):
+        """Returns the program's exit code (or -N if it was killed by signal N)."""
+        if os.WIFSIGNALED(self.status):
+            return -os.WTERMSIG(self.status)
+        return os.WEXITSTATUS(self.status)
+
+    def __str__(self):
+        return 'wall=%.6f user=%.6f sys=%.6f maxrss=%uKB minflt=%u majflt=%u' % \
+            (self.wall_sec, self.user_sec, self.sys_sec, self.maxrss_kb, self.minflt, self.majflt)
+
+def run_and_time(argv, out_fn=None, err_fn=None, env=None, sample_ms=None):
+    """Runs argv with its stdout redirected to out_fn (default: /dev/null) and
+    its stderr to err_fn (default: not redirected) and returns a RunStats
+    describing the run.  env replaces the environment if it is not None.  If
+    sample_ms is not None, the RSS of argv is sampled every sample_ms
+    milliseconds (the wall time is then only accurate to about sample_ms).
+
+    argv is started by a small helper process (this module run as a script)
+    rather than forked from this one: the max RSS of a process includes the
+    RSS of the process it was forked from, so the RSS of the harness (e.g.,
+    after it generated a large graph) would otherwise be reported instead."""
+    helper = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+    cmd = [sys.executable, '-S', helper, out_fn or '/dev/null', err_fn or '-',
+           '-' if sample_ms is None else str(sample_ms)] + list(argv)
+    try:
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, close_fds=True, env=env)
+    except OSError, e:
+        raise TimingError('unable to run the timing helper: %s' % str(e))
+    res = p.communicate()[0]
+    if p.returncode != 0:
+        raise TimingError('unable to run %s' % argv[0])
+    try:
+        lines = res.splitlines()
+        v = lines[0].split()
+        timeline = None
+        if sample_ms is not None:
+            timeline = [(float(t), int(kb)) for (t, kb) in [line.split() for line in lines[1:]]]
+        return RunStats(int(v[0]), float(v[1]), float(v[2]), float(v[3]), int(v[4]), int(v[5]), int(v[6]), timeline)
+    except (IndexError, ValueError):
+        raise TimingError('unexpected output from the timing helper: %s' % res)
+
+def read_vm_rss(pid):
+    """Returns the current RSS of process pid in KB (None if it has exited)."""
+    try:
+        fh = open('/proc/%u/status' % pid, 'r')
+        try:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+        finally:
+            fh.close()
+    except IOError:
+        pass
+    return None  # gone (a zombie has no VmRSS)
+
+def wait_and_sample_rss(pid, start, sample_ms):
+    """Waits for the child pid to exit, sampling its RSS every sample_ms
+    milliseconds.  Returns a 3-tuple of the samples, its exit status and its
+    rusage."""
+    timeline = []
+    while True:
+        (done, status, ru) = os.wait4(pid, os.WNOHANG)
+        if done == pid:
+            return (timeline, status, ru)
+        rss = read_vm_rss(pid)
+        if rss is not None:
+            timeline.append((time.time() - start, rss))
+        time.sleep(sample_ms / 1000.0)
+
+def run_and_time_here(argv, out_fn, err_fn, sample_ms=None):
+    """Like run_and_time, but argv is forked from this process."""
+    try:
+        out = open(out_fn, 'w')
+        err = None if err_fn is None else open(err_fn, 'w')
+    except IOError, e:
+        raise TimingError('unable to open output file: %s' % str(e))
+    try:
+        try:
+            start = time.time()
+            p = subprocess.Popen(argv, stdout=out, stderr=err, close_fds=True)
+        except OSError, e:
+            raise TimingError('unable to run %s: %s' % (argv[0], str(e)))
+        if sample_ms is None:
+            timeline = None
+            (_, status, ru) = os.wait4(p.pid, 0)
+        else:
+            (timeline, status, ru) = wait_and_sample_rss(p.pid, start, sample_ms)
+        wall = time.time() - start
+        p.returncode = status  # already reaped; keep Popen from waiting on it
+    finally:
+        out.close()
+        if err is not None:
+            err.close()
+    return RunStats(status, wall, ru.ru_utime, ru.ru_stime, ru.ru_maxrss, ru.ru_minflt, ru.ru_majflt, timeline)
+
+def get_phase_times_env():
+    """Returns a copy of this process' environment which asks mst to report
+    the time of each phase."""
+    env = dict(os.environ)
+    env[PHASE_TIMES_ENV] = '1'
+    return env
+
+def read_phase_times(err_fn):
+    """Reads the phase times mst wrote to err_fn.  Returns a 2-tuple: a dict
+    mapping each phase to its time in seconds (empty if mst did not report
+    phase times, e.g. if it was built from an older revision) and a list of
+    the other lines in err_fn."""
+    phases = {}
+    others = []
+    fh = open(err_fn, 'r')
+    for line in fh:
+        m = __PHASE_RE.match(line)
+        if m is not None and m.group(1) in PHASES:
+            phases[m.group(1)] = float(m.group(2))
+        else:
+            others.append(line)
+    fh.close()
+    return (phases, others)
+
+def get_perf_stat_argv(counters_fn):
+    """Returns the argv prefix which runs a program under perf stat so that it
+    writes the values of COUNTERS to counters_fn."""
+    return ['perf', 'stat', '-x', ',', '-e', ','.join(COUNTERS), '-o', counters_fn, '--']
+
+def read_counters(counters_fn):
+    """Reads the counter values perf stat wrote to counters_fn.  Returns a dict
+    mapping each counter in COUNTERS to its value (None if it was not counted,
+    e.g. because the CPU or a virtual machine does not support it)."""
+    counts = dict([(c, None) for c in COUNTERS])
+    fh = open(counters_fn, 'r')
+    for line in fh:
+        if line[0:1] == '#' or len(line.strip()) == 0:
+            continue
+        fields = line.strip().split(',')
+        # the event name follows the value (and, in newer versions, its unit)
+        for field in fields[1:3]:
+            event = field.split(':')[0]
+            if counts.has_key(event):
+                try:
+                    counts[event] = int(fields[0])
+                except ValueError:
+                    pass  # <not counted> or <not supported>
+                break
+    fh.close()
+    return counts
+
+def is_perf_stat_available():
+    """Returns whether perf stat is installed and can count at least one of
+    COUNTERS (it may be forbidden by kernel.perf_event_paranoid)."""
+    global __perf_stat_available
+    if __perf_stat_available is None:
+        fd, counters_fn = tempfile.mkstemp(prefix='perf-check-')
+        os.close(fd)
+        try:
+            try:
+                null = open(os.devnull, 'w')
+                try:
+                    ret = subprocess.call(get_perf_stat_argv(counters_fn) + ['true'], stdout=null, stderr=null)
+                finally:
+                    null.close()
+                counts = read_counters(counters_fn)
+                __perf_stat_available = ret == 0 and len([v for v in counts.values() if v is not None]) > 0
+            except (OSError, IOError):
+                __perf_stat_available = False  # perf is not installed
+        finally:
+            os.remove(counters_fn)
+    return __perf_stat_available
+
+if __name__ == "__main__":
+    # timing helper: OUT_FN ERR_FN SAMPLE_MS ARGV... (ERR_FN is - to leave stderr
+    # alone; SAMPLE_MS is - to not sample the RSS)
+    (out_fn, err_fn, sample_ms) = sys.argv[1:4]
+    try:
+        stats = run_and_time_here(sys.argv[4:], out_fn, None if err_fn == '-' else err_fn,
+                                  None if sample_ms == '-' else float(sample_ms))
+    except TimingError, e:
+        print >> sys.stderr, 'timing error: ' + str(e)
+        sys.exit(1)
+    print '%d %.6f %.6f %.6f %u %u %u' % (stats.status, stats.wall_sec, stats.user_sec, stats.sys_sec,
+                                          stats.maxrss_kb, stats.minflt, stats.majflt)
+    for (t, kb) in stats.timeline or []:
+        print '%.6f %u' % (t, kb)